@@ -0,0 +1,76 @@
+"""
+Cold-start benchmark: how long a fresh interpreter takes to import the API app.
+
+    python benchmarks/import_time.py                  # median of 5 runs + slowest modules
+    python benchmarks/import_time.py --max-ms 800     # exit 1 if the median regresses past 800 ms
+
+Each run is a new process (`python -X importtime -c "import main"`), so nothing
+is served from a warm sys.modules. Output is also written to bench_output.txt.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run_once(module: str):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise SystemExit(completed.stderr)
+    return elapsed_ms, completed.stderr
+
+
+def slowest_modules(importtime_output: str, top: int):
+    """Top-level packages by cumulative import time (microseconds) from -X importtime."""
+    totals = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        package = name.strip().split(".")[0]
+        totals[package] = max(totals.get(package, 0), int(cumulative))
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    run_once(args.module)  # warm the bytecode cache; we measure import work, not compilation
+    timings, last_output = [], ""
+    for _ in range(args.runs):
+        elapsed_ms, last_output = run_once(args.module)
+        timings.append(elapsed_ms)
+
+    median = statistics.median(timings)
+    lines = [
+        f"import {args.module}: median {median:.0f} ms, min {min(timings):.0f} ms, max {max(timings):.0f} ms ({args.runs} runs)",
+        "slowest top-level packages (cumulative):",
+    ]
+    lines += [f"  {name:<30} {micros / 1000:8.1f} ms" for name, micros in slowest_modules(last_output, args.top)]
+    report = "\n".join(lines)
+    print(report)
+    (ROOT / "bench_output.txt").write_text(report + "\n")
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL: median {median:.0f} ms exceeds budget of {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,93 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 import uvicorn
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from src.config.settings import setting
-from src.worker.celery_worker import celery_app
-# from src.config.mqtt_client import start_mqtt
+from src.config import mongo_db
 from src.app.plc_module.router import router
+from src.app.retention_module.router import router as retention_router
+from src.app.alarm_module.router import router as alarm_router
+from src.app.websocket.web_app import router as websocket_router
+from src.app.admin_module.router import router as admin_router
+from src.core.profiling import ServerTimingMiddleware, TimedJSONResponse
+
+logger = logging.getLogger(__name__)
+
+
+async def create_indexes():
+    from src.core.search import ensure_search_indexes
+    from src.app.retention_module.controller import ensure_retention_indexes
+    from src.app.alarm_module.controller import ensure_alarm_indexes
+    from src.app.plc_module.pipeline import ensure_dedup_index, ensure_rollup_indexes
+
+    await ensure_search_indexes(mongo_db.plc_collection, "plc_id")
+    await ensure_search_indexes(mongo_db.iothub_device_collection, "device_id")
+    await mongo_db.iothub_device_collection.create_index("partition")
+    # plc_message is write-heavy: prefix index only, and only prefix search is offered on it
+    await ensure_search_indexes(mongo_db.message_collection, "plc_id", ngram=False)
+    await ensure_retention_indexes()
+    await ensure_alarm_indexes()
+    await ensure_rollup_indexes()
+    await ensure_dedup_index()
+
+
+def log_task_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from src.app.alarm_module.controller import refresh_rules_periodically
+    from src.app.websocket.web_app import relay_alarms
+    from src.core.profiling import collect_runtime_metrics
+
+    # Index builds are idempotent; don't hold up readiness waiting for them
+    indexes = asyncio.create_task(create_indexes(), name="create_indexes")
+    indexes.add_done_callback(log_task_failure)
+    background_tasks = [
+        indexes,
+        asyncio.create_task(relay_alarms()),
+        asyncio.create_task(refresh_rules_periodically()),
+        asyncio.create_task(collect_runtime_metrics()),
+    ]
+    # Single-process mode: this process owns MQTT and the hot state table itself
+    ingest_inline = setting.MQTT_ENABLED and not setting.INGEST_PROCESS
+    if ingest_inline:
+        from src.config.mqtt_client import start_mqtt
+        from src.core.shared_state import create_hot_state
+
+        create_hot_state()
+        await asyncio.to_thread(start_mqtt)
+    try:
+        yield
+    finally:
+        from src.core.shared_state import close_hot_state
+
+        if ingest_inline:
+            from src.config.mqtt_client import stop_mqtt
+
+            stop_mqtt()
+        close_hot_state()
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await mongo_db.close()
 
 
 app = FastAPI(
     title=setting.TITLE,
     docs_url="/plc" if setting.DEBUG else None,
     debug=setting.DEBUG,
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse,
 )
-celery = celery_app
+
+if setting.DEBUG or setting.PROFILING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,11 +101,49 @@ app.add_middleware(
 # app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.include_router(router, prefix="/plc", tags=["Plc"])
-# @app.on_event("startup")
-# def startup_event():
-#     start_mqtt()
+app.include_router(retention_router, prefix="/retention", tags=["Retention"])
+app.include_router(alarm_router, prefix="/alarms", tags=["Alarms"])
+app.include_router(websocket_router, prefix="/ws")
+app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+
+
+def __getattr__(name):
+    # `main.celery` kept for `celery -A main.celery`, without importing Celery into every API process
+    if name == "celery":
+        from src.worker.celery_worker import celery_app
+
+        return celery_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def serve():
+    """
+    Run the API. With WEB_CONCURRENCY > 1 a dedicated ingest process owns MQTT
+    and publishes latest values through shared memory, and is restarted if it
+    dies; the uvicorn workers are stateless readers. Auto-reload is a development convenience (DEBUG only,
+    single process).
+    """
+    workers = 1 if setting.DEBUG else max(1, setting.WEB_CONCURRENCY)
+    ingest = None
+    if workers > 1 and setting.MQTT_ENABLED:
+        from src.worker.ingest_process import IngestSupervisor
 
+        ingest = IngestSupervisor()
+        ingest.start()
+        # Inherited by the uvicorn workers so none of them connects to the broker
+        os.environ["INGEST_PROCESS"] = "true"
+    try:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=int(setting.HOST_PORT),
+            reload=setting.DEBUG,
+            workers=workers,
+        )
+    finally:
+        if ingest is not None:
+            ingest.stop()
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=int(setting.HOST_PORT), reload=True)
+    serve()
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from src.config.settings import setting
+from src.core.profiling import sample_stacks, trace_allocations
+
+router = APIRouter()
+
+# One profiler at a time: overlapping runs would profile each other
+_profiling = asyncio.Lock()
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if setting.ADMIN_TOKEN:
+        if x_admin_token != setting.ADMIN_TOKEN:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+    elif not setting.DEBUG:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+
+@router.get('/profile', response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile(
+        seconds: float = Query(10, gt=0, le=120),
+        interval: float = Query(0.005, ge=0.001, le=1),
+    ):
+    """Sample this process' stacks; the body is collapsed-stack text for a flamegraph."""
+    if _profiling.locked():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running")
+    async with _profiling:
+        return await asyncio.to_thread(sample_stacks, seconds, interval)
+
+
+@router.get('/tracemalloc', response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def allocations(
+        seconds: float = Query(10, gt=0, le=300),
+        frames: int = Query(25, ge=1, le=100),
+    ):
+    """Memory allocated and still held after `seconds`, per stack, in bytes (collapsed format)."""
+    if _profiling.locked():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running")
+    async with _profiling:
+        return await trace_allocations(seconds, frames)
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi.encoders import jsonable_encoder
+from pymongo import DESCENDING, UpdateOne
+from redis.exceptions import WatchError
+from src.config.mongo_db import alarm_rule_collection, alarm_event_collection
+from src.config.redis_client import get_async_redis, get_redis
+from src.config.settings import setting
+from src.app.alarm_module.engine import ALARM_CHANNEL, decode_tags, engine
+from src.app.alarm_module.schema import AlarmRuleSchema, AlarmRuleDeviceSchema, AlarmEventSchema
+
+logger = logging.getLogger(__name__)
+
+# Per-device hash of tag -> dumped TagState, for samples evaluated by Celery workers
+ALARM_STATE_KEY = "plc:alarm:state"
+ALARM_STATE_TTL = 7 * 24 * 3600
+# Attempts at a conflict-free read-evaluate-write of a batch's alarm state
+ALARM_STATE_RETRIES = 5
+
+
+async def load_rule_documents() -> List[Dict]:
+    rules = []
+    async for rule in alarm_rule_collection.find():
+        rule["id"] = str(rule.pop("_id"))
+        rules.append(rule)
+    return rules
+
+
+async def refresh_rules():
+    """Reload the engine's rule index from Mongo."""
+    engine.load_rules(await load_rule_documents())
+
+
+async def ensure_fresh_rules():
+    """Reload rules if this process has not done so within ALARM_RULES_REFRESH seconds."""
+    if time.monotonic() - engine.loaded_at >= setting.ALARM_RULES_REFRESH:
+        try:
+            await refresh_rules()
+        except Exception as e:
+            logger.error(f"Could not refresh alarm rules: {e}")
+
+
+async def refresh_rules_periodically():
+    """Keep rules current in processes that evaluate samples outside the async pipeline (MQTT)."""
+    while True:
+        await ensure_fresh_rules()
+        await asyncio.sleep(setting.ALARM_RULES_REFRESH)
+
+
+def evaluate_sample(
+        plc_id: str,
+        message,
+        received_at: Optional[datetime] = None,
+        tags: Optional[Dict[str, float]] = None,
+    ) -> List[Dict]:
+    """
+    Run one raw sample through the engine and publish any transitions right
+    away; the caller persists the returned events (see store_alarm_events).
+    Synchronous so it can run inline in the MQTT callback thread.
+    """
+    tags = decode_tags(message) if tags is None else tags
+    if not tags:
+        return []
+    events = engine.evaluate(plc_id, tags, received_at)
+    if events:
+        publish_alarm_events(events)
+    return events
+
+
+async def evaluate_shared_samples(samples: List[Tuple[str, Optional[datetime], Dict[str, float]]]) -> List[List[Dict]]:
+    """
+    evaluate_sample for processes that don't own the devices, such as Celery
+    prefork children: any child may get a device's next batch, so the tag
+    state of every device in the batch is loaded from Redis, the samples are
+    evaluated in order and the state is written back in one MULTI. The keys
+    are WATCHed, and a batch that raced another process for the same device
+    is evaluated again from the state that process saved.
+
+    `samples` are (plc_id, received_at, decoded tags); returns the events of
+    each sample.
+    """
+    names: Dict[str, set] = {}
+    for plc_id, _, tags in samples:
+        names.setdefault(plc_id, set()).update(tags)
+    names = {plc_id: sorted(tags) for plc_id, tags in names.items() if tags}
+    if not names:
+        return [[] for _ in samples]
+    keys = {plc_id: f"{ALARM_STATE_KEY}:{plc_id}" for plc_id in names}
+    try:
+        redis = get_async_redis()
+        for _ in range(ALARM_STATE_RETRIES):
+            async with redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(*keys.values())
+                saved = {plc_id: await pipe.hmget(keys[plc_id], tags) for plc_id, tags in names.items()}
+                # No awaits from here to pop_state: the process-wide engine only holds this batch's state
+                for plc_id, tags in names.items():
+                    engine.restore_state(plc_id, {
+                        name: json.loads(state) if state else None for name, state in zip(tags, saved[plc_id])
+                    })
+                events = [engine.evaluate(plc_id, tags, received_at) if tags else [] for plc_id, received_at, tags in samples]
+                pipe.multi()
+                for plc_id, tags in names.items():
+                    state = engine.pop_state(plc_id, tags)
+                    if state:
+                        pipe.hset(keys[plc_id], mapping={name: json.dumps(dumped) for name, dumped in state.items()})
+                        pipe.expire(keys[plc_id], ALARM_STATE_TTL)
+                try:
+                    await pipe.execute()
+                except WatchError:
+                    continue
+            await publish_alarm_events_async([event for sample_events in events for event in sample_events])
+            return events
+        logger.error(f"Alarm state of {sorted(names)} kept changing under this batch, evaluating with local state")
+    except Exception as e:
+        logger.error(f"Could not load alarm state of {sorted(names)}, evaluating with local state: {e}")
+    events = [engine.evaluate(plc_id, tags, received_at) if tags else [] for plc_id, received_at, tags in samples]
+    await publish_alarm_events_async([event for sample_events in events for event in sample_events])
+    return events
+
+
+def publish_alarm_events(events: List[Dict]):
+    try:
+        redis = get_redis()
+        for event in events:
+            redis.publish(ALARM_CHANNEL, json.dumps(jsonable_encoder(event)))
+    except Exception as e:
+        logger.error(f"Could not publish {len(events)} alarm events: {e}")
+
+
+async def publish_alarm_events_async(events: List[Dict]):
+    if not events:
+        return
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            for event in events:
+                pipe.publish(ALARM_CHANNEL, json.dumps(jsonable_encoder(event)))
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Could not publish {len(events)} alarm events: {e}")
+
+
+async def store_alarm_events(events: List[Dict], idempotent: bool = False) -> int:
+    """
+    Persist alarm events. With `idempotent`, events are upserted on their
+    natural key so reprocessing the same samples (replay) never duplicates them.
+    """
+    if not events:
+        return 0
+    for event in events:
+        if isinstance(event.get("created_at"), str):
+            event["created_at"] = datetime.fromisoformat(event["created_at"])
+    if idempotent:
+        operations = [
+            UpdateOne(
+                {k: event[k] for k in ("rule_id", "plc_id", "tag", "created_at", "state")},
+                {"$setOnInsert": event},
+                upsert=True,
+            )
+            for event in events
+        ]
+        result = await alarm_event_collection.bulk_write(operations, ordered=False)
+        return result.upserted_count
+    result = await alarm_event_collection.insert_many(events, ordered=False)
+    return len(result.inserted_ids)
+
+
+async def ensure_alarm_indexes():
+    await alarm_event_collection.create_index([("plc_id", 1), ("created_at", DESCENDING)])
+    await alarm_event_collection.create_index([("created_at", DESCENDING)])
+
+
+async def save_rule(payload: AlarmRuleSchema, rule_id: Optional[str] = None) -> Tuple[Optional[AlarmRuleDeviceSchema], str]:
+    try:
+        document = jsonable_encoder(payload)
+        if rule_id:
+            result = await alarm_rule_collection.replace_one({"_id": ObjectId(rule_id)}, document)
+            if not result.matched_count:
+                return None, "Alarm rule not found"
+        else:
+            rule_id = str((await alarm_rule_collection.insert_one(document)).inserted_id)
+        await refresh_rules()
+        return AlarmRuleDeviceSchema(id=rule_id, **payload.dict()), "Alarm rule saved successfully"
+    except InvalidId:
+        return None, "Invalid rule id"
+    except Exception as e:
+        logger.error(f"Error in save_rule: {e}")
+        return None, "An error occurred"
+
+
+async def get_rules() -> Tuple[List[AlarmRuleDeviceSchema], str]:
+    rules = []
+    async for rule in alarm_rule_collection.find():
+        rule["id"] = str(rule.pop("_id"))
+        rules.append(AlarmRuleDeviceSchema(**rule))
+    return rules, "Alarm rules fetched successfully"
+
+
+async def delete_rule(rule_id: str) -> Tuple[int, str]:
+    try:
+        result = await alarm_rule_collection.delete_one({"_id": ObjectId(rule_id)})
+    except InvalidId:
+        return 0, "Invalid rule id"
+    if not result.deleted_count:
+        return 0, "Alarm rule not found"
+    await refresh_rules()
+    return result.deleted_count, "Alarm rule deleted successfully"
+
+
+async def get_events(plc_id: Optional[str] = None, limit: int = 100) -> Tuple[List[AlarmEventSchema], str]:
+    query = {"plc_id": plc_id} if plc_id else {}
+    events = []
+    async for event in alarm_event_collection.find(query).sort("created_at", DESCENDING).limit(limit):
+        event["id"] = str(event.pop("_id"))
+        events.append(AlarmEventSchema(**event))
+    return events, "Alarm events fetched successfully"
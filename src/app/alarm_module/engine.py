@@ -0,0 +1,215 @@
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ALARM_CHANNEL = "plc:alarms"
+WILDCARD = "*"
+
+
+def decode_tags(message) -> Dict[str, float]:
+    """
+    Numeric tag values from a raw telemetry payload: a JSON object of
+    tag -> value (optionally nested under "tags"), or a bare number as "value".
+    """
+    if isinstance(message, (str, bytes)):
+        try:
+            message = json.loads(message)
+        except ValueError:
+            return {}
+    if isinstance(message, dict):
+        message = message.get("tags", message)
+    if isinstance(message, bool):
+        return {}
+    if isinstance(message, (int, float)):
+        return {"value": float(message)}
+    if not isinstance(message, dict):
+        return {}
+    return {
+        str(tag): float(value)
+        for tag, value in message.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+class AlarmRule:
+    __slots__ = (
+        "id", "plc_id", "tag", "kind", "high", "low", "max_rate",
+        "stuck_seconds", "deadband", "severity", "message",
+    )
+
+    def __init__(
+            self,
+            id: str,
+            tag: str,
+            kind: str,
+            plc_id: str = WILDCARD,
+            high: Optional[float] = None,
+            low: Optional[float] = None,
+            max_rate: Optional[float] = None,
+            stuck_seconds: Optional[float] = None,
+            deadband: float = 0.0,
+            severity: str = "warning",
+            message: str = "",
+            **_,
+        ):
+        self.id = id
+        self.plc_id = plc_id or WILDCARD
+        self.tag = tag
+        self.kind = kind
+        self.high = high
+        self.low = low
+        self.max_rate = max_rate
+        self.stuck_seconds = stuck_seconds
+        self.deadband = deadband or 0.0
+        self.severity = severity
+        self.message = message
+
+
+class TagState:
+    """Last observation of one device tag plus the rules currently in alarm on it."""
+
+    __slots__ = ("value", "ts", "changed_at", "active")
+
+    def __init__(self, value: float, ts: float):
+        self.value = value
+        self.ts = ts
+        self.changed_at = ts
+        self.active: Optional[set] = None
+
+    def dump(self) -> List:
+        return [self.value, self.ts, self.changed_at, sorted(self.active) if self.active else None]
+
+    @classmethod
+    def load(cls, saved: List) -> "TagState":
+        value, ts, changed_at, active = saved
+        state = cls(value, ts)
+        state.changed_at = changed_at
+        state.active = set(active) if active else None
+        return state
+
+
+class AlarmEngine:
+    """
+    Evaluates samples against rules indexed by (plc_id, tag), so each sample
+    costs O(rules on that tag). Alarms are edge-triggered: an event is produced
+    only when a rule goes from normal to active ("raised") or back ("cleared").
+    """
+
+    def __init__(self):
+        self._rules: Dict[Tuple[str, str], List[AlarmRule]] = {}
+        self._state: Dict[Tuple[str, str], TagState] = {}
+        self.loaded_at = 0.0
+
+    def load_rules(self, rules: Iterable[Dict]):
+        index: Dict[Tuple[str, str], List[AlarmRule]] = {}
+        for rule in rules:
+            compiled = AlarmRule(**rule)
+            index.setdefault((compiled.plc_id, compiled.tag), []).append(compiled)
+        # Swap in one assignment; threads evaluating concurrently see old or new index, never a mix
+        self._rules = index
+        self.loaded_at = time.monotonic()
+
+    def rules_for(self, plc_id: str, tag: str) -> List[AlarmRule]:
+        rules = self._rules
+        exact = rules.get((plc_id, tag))
+        wildcard = rules.get((WILDCARD, tag))
+        if exact and wildcard:
+            return exact + wildcard
+        return exact or wildcard or []
+
+    def restore_state(self, plc_id: str, saved: Dict[str, Optional[List]]):
+        """Replace the state of the given tags with dumped TagStates; None forgets a tag."""
+        for tag, state in saved.items():
+            if state is None:
+                self._state.pop((plc_id, tag), None)
+            else:
+                self._state[(plc_id, tag)] = TagState.load(state)
+
+    def snapshot_state(self, plc_id: str) -> List[List]:
+        """[tag, dumped TagState] pairs for every tag of the device; tags needn't be valid Mongo field names."""
+        return [[tag, state.dump()] for (device, tag), state in self._state.items() if device == plc_id]
+
+    def pop_state(self, plc_id: str, tags: Iterable[str]) -> Dict[str, List]:
+        """Dumped state of the given tags, removed from this engine."""
+        popped = {}
+        for tag in tags:
+            state = self._state.pop((plc_id, tag), None)
+            if state is not None:
+                popped[tag] = state.dump()
+        return popped
+
+    def evaluate(self, plc_id: str, tags: Dict[str, float], at: Optional[datetime] = None) -> List[Dict]:
+        at = at or datetime.utcnow()
+        ts = at.timestamp()
+        events = []
+        for tag, value in tags.items():
+            rules = self.rules_for(plc_id, tag)
+            if not rules:
+                continue
+            key = (plc_id, tag)
+            state = self._state.get(key)
+            if state is None:
+                state = self._state[key] = TagState(value, ts)
+                previous = None
+            else:
+                previous = (state.value, state.ts)
+            for rule in rules:
+                active = self._check(rule, state, value, ts, previous)
+                was_active = state.active is not None and rule.id in state.active
+                if active is None or active == was_active:
+                    continue
+                if active:
+                    state.active = state.active or set()
+                    state.active.add(rule.id)
+                else:
+                    state.active.discard(rule.id)
+                events.append(self._event(rule, plc_id, tag, value, at, "raised" if active else "cleared"))
+            if previous is not None and value != state.value:
+                state.changed_at = ts
+            state.value = value
+            state.ts = ts
+        return events
+
+    @staticmethod
+    def _check(rule: AlarmRule, state: TagState, value: float, ts: float, previous) -> Optional[bool]:
+        """True/False for the rule's new state, None when it cannot be decided yet."""
+        active = state.active is not None and rule.id in state.active
+        band = rule.deadband
+        if rule.kind == "threshold":
+            if active:
+                # Hysteresis: stay raised until the value is back inside the limits by `deadband`
+                return not (
+                    (rule.high is None or value <= rule.high - band)
+                    and (rule.low is None or value >= rule.low + band)
+                )
+            return (rule.high is not None and value > rule.high) or (rule.low is not None and value < rule.low)
+        if rule.kind == "rate":
+            if previous is None or rule.max_rate is None or ts <= previous[1]:
+                return None
+            rate = abs(value - previous[0]) / (ts - previous[1])
+            return rate > (rule.max_rate - band if active else rule.max_rate)
+        if rule.kind == "stuck":
+            if previous is None or rule.stuck_seconds is None:
+                return None
+            if value != state.value:
+                return False
+            return ts - state.changed_at >= rule.stuck_seconds
+        return None
+
+    @staticmethod
+    def _event(rule: AlarmRule, plc_id: str, tag: str, value: float, at: datetime, transition: str) -> Dict:
+        return {
+            "rule_id": rule.id,
+            "plc_id": plc_id,
+            "tag": tag,
+            "kind": rule.kind,
+            "severity": rule.severity,
+            "state": transition,
+            "value": value,
+            "message": rule.message or f"{rule.kind} alarm {transition} on {plc_id}/{tag}",
+            "created_at": at,
+        }
+
+
+engine = AlarmEngine()
@@ -0,0 +1,43 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from src.app.alarm_module import controller as alarm_controller
+from src.app.alarm_module.schema import AlarmRuleSchema
+from src.config.response import ResponseModel
+
+router = APIRouter()
+
+
+@router.post('/rules')
+async def add_rule(payload: AlarmRuleSchema):
+    result, message = await alarm_controller.save_rule(payload)
+    if not result:
+        raise HTTPException(status_code=400, detail=message)
+    return ResponseModel(data=result, message=message)
+
+
+@router.put('/rules/{rule_id}')
+async def update_rule(rule_id: str, payload: AlarmRuleSchema):
+    result, message = await alarm_controller.save_rule(payload, rule_id)
+    if not result:
+        raise HTTPException(status_code=404, detail=message)
+    return ResponseModel(data=result, message=message)
+
+
+@router.get('/rules')
+async def get_rules():
+    result, message = await alarm_controller.get_rules()
+    return ResponseModel(data=result, message=message)
+
+
+@router.delete('/rules/{rule_id}')
+async def delete_rule(rule_id: str):
+    result, message = await alarm_controller.delete_rule(rule_id)
+    if not result:
+        raise HTTPException(status_code=404, detail=message)
+    return ResponseModel(data=result, message=message)
+
+
+@router.get('/events')
+async def get_events(plc_id: Optional[str] = None, limit: int = Query(100, ge=1, le=1000)):
+    result, message = await alarm_controller.get_events(plc_id, limit)
+    return ResponseModel(data=result, message=message)
@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class AlarmRuleSchema(BaseModel):
+    plc_id: str = Field(default="*", title="PLC ID", description="Device the rule applies to, '*' for every device")
+    tag: str = Field(title="Tag", description="Tag name inside the telemetry payload")
+    kind: Literal["threshold", "rate", "stuck"] = Field(title="Kind", description="threshold, rate (of change) or stuck (value)")
+    high: Optional[float] = Field(default=None, title="High", description="threshold: raise above this value")
+    low: Optional[float] = Field(default=None, title="Low", description="threshold: raise below this value")
+    max_rate: Optional[float] = Field(default=None, title="Max Rate", description="rate: max change per second")
+    stuck_seconds: Optional[float] = Field(default=None, title="Stuck Seconds", description="stuck: raise after the value is unchanged this long")
+    deadband: float = Field(default=0.0, ge=0, title="Deadband", description="Hysteresis before an active alarm clears")
+    severity: Literal["info", "warning", "critical"] = Field(default="warning", title="Severity", description="Alarm severity")
+    message: str = Field(default="", title="Message", description="Text attached to raised / cleared events")
+
+    class Config:
+        form_model = True
+        json_schema_extra = {
+            "example": {
+                "plc_id": "PLC1",
+                "tag": "temperature",
+                "kind": "threshold",
+                "high": 80,
+                "deadband": 2,
+                "severity": "critical",
+                "message": "Boiler over temperature"
+            }
+        }
+
+
+class AlarmRuleDeviceSchema(AlarmRuleSchema):
+    id: str = Field(default="", title="ID", description="ID of the rule")
+
+
+class AlarmEventSchema(BaseModel):
+    id: str = Field(default="", title="ID", description="ID of the event")
+    rule_id: str = Field(default="", title="Rule ID", description="Rule that fired")
+    plc_id: str = Field(default="", title="PLC ID", description="Device the sample came from")
+    tag: str = Field(default="", title="Tag", description="Tag that triggered the rule")
+    kind: str = Field(default="", title="Kind", description="Rule kind")
+    severity: str = Field(default="", title="Severity", description="Alarm severity")
+    state: str = Field(default="", title="State", description="raised or cleared")
+    value: Optional[float] = Field(default=None, title="Value", description="Sample value at the transition")
+    message: str = Field(default="", title="Message", description="Alarm text")
+    created_at: Optional[datetime] = Field(default=None, title="Created At", description="Sample timestamp")
@@ -7,17 +7,35 @@ from src.app.plc_module.schema import (
     PlcIotHubCreateSchema, 
     PlcIotHubUpdateSchema, 
     PlcIotHubDeviceSchema,
-    PlcMessageSchema
+    PlcMessageSchema,
+    BulkItemResultSchema,
+    LiveValueSchema,
+    TagTrendSchema,
+    TrendSchema,
     )
 from fastapi.encoders import jsonable_encoder
-from pymongo.errors import DuplicateKeyError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from typing import Optional, List, Dict, Union, Tuple   
-from datetime import datetime
+from datetime import datetime, timedelta
+import math
+from urllib.parse import quote, urlencode
 from src.core.pagination import AsyncPaginator
-from pymodbus.client import ModbusTcpClient
+from src.core.search import build_search_query, ensure_search_indexes, search_fields, trie_insert, trie_remove
+from src.config.settings import setting
+from src.app.retention_module.controller import load_archived_page
+from src.worker.sharding import partition_for
+from src.core.shared_state import get_hot_state
+from src.core.recent_store import recent_store, to_epoch
+from src.core.ingest_client import fetch_ingest
+from src.core.profiling import timed
+from src.app.alarm_module.engine import decode_tags
 
 class ModbusClient:
     def __init__(self, host: str, port: int = 502):
+        # Imported here so the API doesn't load pymodbus until a command is sent
+        from pymodbus.client import ModbusTcpClient
+
         self.client = ModbusTcpClient(host, port)
 
     def connect(self):
@@ -49,10 +67,21 @@ class ModbusClient:
             return None, f"Error: {str(e)}"
 
 
+def device_fields(key_field: str, key: str) -> Dict:
+    """Derived fields stored with a registry document: search keys and, for IoT devices, the shard partition."""
+    fields = search_fields(key_field, key)
+    if key_field == "device_id":
+        fields["partition"] = partition_for(key)
+    return fields
+
+
 async def add_plc(payload: PlcCreateSchema):
     try:
         await  plc_collection.create_index('plc_id', unique=True)
-        insert_result = await plc_collection.insert_one(jsonable_encoder(payload))
+        await ensure_search_indexes(plc_collection, 'plc_id')
+        insert_result = await plc_collection.insert_one(
+            {**jsonable_encoder(payload), **search_fields('plc_id', payload.plc_id)}
+        )
         if not insert_result.inserted_id:
             return None, "Failed to add PLC"
         created_plc = await plc_collection.find_one({"_id": insert_result.inserted_id})
@@ -60,6 +89,7 @@ async def add_plc(payload: PlcCreateSchema):
             return None, "Failed to retrieve added PLC"
         created_plc["id"] = str(created_plc["_id"])
         del created_plc["_id"]
+        trie_insert(plc_collection, 'plc_id', payload.plc_id)
 
         return PlcDeviceShema(**created_plc), "PLC added successfully"
     except DuplicateKeyError:
@@ -70,15 +100,20 @@ async def add_plc(payload: PlcCreateSchema):
     
 async def add_iot_hub_device(payload: PlcIotHubCreateSchema):
     try:
-        await  iothub_collection.create_index('device_id', unique=True)
-        insert_result = await iothub_collection.insert_one(jsonable_encoder(payload))
+        await  iothub_device_collection.create_index('device_id', unique=True)
+        await ensure_search_indexes(iothub_device_collection, 'device_id')
+        await iothub_device_collection.create_index('partition')
+        insert_result = await iothub_device_collection.insert_one(
+            {**jsonable_encoder(payload), **device_fields('device_id', payload.device_id)}
+        )
         if not insert_result.inserted_id:
             return None, "Failed to add PLC"
-        created_plc = await iothub_collection.find_one({"_id": insert_result.inserted_id})
+        created_plc = await iothub_device_collection.find_one({"_id": insert_result.inserted_id})
         if not created_plc:
             return None, "Failed to retrieve added PLC"
         created_plc["id"] = str(created_plc["_id"])
         del created_plc["_id"]
+        trie_insert(iothub_device_collection, 'device_id', payload.device_id)
 
         return PlcIotHubDeviceSchema(**created_plc), "PLC added successfully"
     except DuplicateKeyError:
@@ -99,31 +134,120 @@ async def plc_update_by_id(
             update_data = {
                 k: v for k, v in payload.dict(exclude_unset=True).items() if v
             }
-            result = await collection.update_one(
-                {"plc_id": plc_id}, {"$set": update_data}
+            if "plc_id" in update_data:
+                update_data.update(search_fields("plc_id", update_data["plc_id"]))
+            updated_plc = await collection.find_one_and_update(
+                {"plc_id": plc_id},
+                {"$set": update_data},
+                return_document=ReturnDocument.AFTER,
             )
 
-            if result.modified_count == 0:
+            if updated_plc is None:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="PLC record not found",
                 )
 
-            updated_plc = await collection.find_one({"plc_id": plc_id})
+            if update_data.get("plc_id", plc_id) != plc_id:
+                trie_remove(collection, "plc_id", plc_id)
+                trie_insert(collection, "plc_id", update_data["plc_id"])
             updated_plc["id"] = str(updated_plc["_id"])
             del updated_plc["_id"]
             return PlcDeviceShema(**updated_plc), "Update data successfully"
         except Exception as e:
             return None, str(e)
 
-async def delete_plc_data(plc_id: str):
+async def bulk_upsert(
+        collection,
+        key_field: str,
+        payloads: List,
+        insert_only: bool = False,
+    ) -> Tuple[List[BulkItemResultSchema], str]:
+    """
+    Upsert many devices keyed on `key_field` in a single unordered bulk_write.
+    Every item gets its own result; a failing item does not abort the batch.
+    With `insert_only`, existing devices are left untouched and reported as
+    conflicts instead of being overwritten.
+    """
+    results = [BulkItemResultSchema(index=i, key=getattr(item, key_field, None) or "") for i, item in enumerate(payloads)]
+    operations, positions = [], []
+    for i, item in enumerate(payloads):
+        key = getattr(item, key_field, None)
+        if not key:
+            results[i].status = "error"
+            results[i].error = f"{key_field} is required"
+            continue
+        document = {k: v for k, v in jsonable_encoder(item).items() if k != "id"}
+        if insert_only:
+            update = {
+                "$setOnInsert": {
+                    **{k: v for k, v in document.items() if k != key_field},
+                    **device_fields(key_field, key),
+                },
+            }
+        else:
+            provided = item.dict(exclude_unset=True).keys()
+            update = {
+                "$set": {
+                    **{k: v for k, v in document.items() if k in provided},
+                    **device_fields(key_field, key),
+                },
+            }
+            defaults = {k: v for k, v in document.items() if k not in provided and k != key_field}
+            if defaults:
+                update["$setOnInsert"] = defaults
+        operations.append(UpdateOne({key_field: key}, update, upsert=True))
+        positions.append(i)
+
+    if not operations:
+        return results, "No valid items to write"
+
+    try:
+        await collection.create_index(key_field, unique=True)
+        await ensure_search_indexes(collection, key_field)
+        write_result = await collection.bulk_write(operations, ordered=False)
+        upserted_ids = write_result.upserted_ids or {}
+        write_errors = []
+    except BulkWriteError as e:
+        upserted_ids = {op["index"]: op["_id"] for op in e.details.get("upserted", [])}
+        write_errors = e.details.get("writeErrors", [])
+    except Exception as e:
+        for i in positions:
+            results[i].status = "error"
+            results[i].error = str(e)
+        return results, "Bulk write failed"
+
+    failed = {}
+    for error in write_errors:
+        failed[error["index"]] = error.get("errmsg", "Write failed")
+
+    for op_index, i in enumerate(positions):
+        if op_index in failed:
+            results[i].status = "error"
+            results[i].error = failed[op_index]
+        elif op_index in upserted_ids:
+            results[i].status = "inserted"
+            results[i].id = str(upserted_ids[op_index])
+            trie_insert(collection, key_field, results[i].key)
+        elif insert_only:
+            results[i].status = "conflict"
+            results[i].error = f"A device with this {key_field} already exists"
+        else:
+            results[i].status = "updated"
+
+    error_count = sum(1 for result in results if result.status in ("error", "conflict"))
+    return results, f"Processed {len(results)} items, {error_count} failed"
+
+async def delete_plc_data(plc_id: str) -> Tuple[int, str]:
     try:
         result = await plc_collection.delete_one({"plc_id": plc_id})
-        if result:
-            return result.deleted_count
-        return 0
+        trie_remove(plc_collection, "plc_id", plc_id)
+        if result and result.deleted_count:
+            return result.deleted_count, "PLC deleted successfully"
+        return 0, "PLC not found"
     except Exception as e:
         print(e)
+        return 0, str(e)
 
 async def get_list(
         collection=plc_collection,
@@ -134,6 +258,7 @@ async def get_list(
         sort_by: Optional[List[str]] = ["-created_at"],
         fields: Optional[List[str]] = [],
         search: Optional[str] = None,
+        search_mode: Optional[str] = None,
         from_date: Optional[datetime] = None,
         to_date: Optional[datetime] = None,
         is_pagination: bool = True,
@@ -144,14 +269,9 @@ async def get_list(
     Get PLC List with optional search, pagination, and date filtering
     """
     max_allowed_days = 90
-    search_query = {}
-
-    if search:
-        search_query = {
-            "$or": [
-                {"plc_id": {"$regex": search, "$options": "i"}},
-            ]
-        }
+    search_query = await build_search_query(
+        "plc_id", search, mode=search_mode or setting.SEARCH_MODE, trie_source=plc_collection
+    )
 
     if from_date and to_date:
         if (to_date - from_date).days > max_allowed_days:
@@ -170,7 +290,7 @@ async def get_list(
             collection=collection,
             schema=PlcDeviceShema,
             request=request,
-            filter={"search": search},
+            filter={"search": search, "search_mode": search_mode},
             page=page,
             limit=limit,
             search_query=search_query,
@@ -223,15 +343,85 @@ async def get_list(
 
     return records, "Plc list fetched successfully"
 
+async def get_live_values(plc_id: Optional[str] = None) -> Tuple[List[LiveValueSchema], str]:
+    """
+    Latest value per device from the shared memory table filled by the ingest
+    process; falls back to the newest stored message when the table isn't up.
+    """
+    table = get_hot_state()
+    if table is not None:
+        if plc_id:
+            found = table.get(plc_id)
+            values = [LiveValueSchema(plc_id=plc_id, message=found[0], updated_at=found[1])] if found else []
+        else:
+            values = [
+                LiveValueSchema(plc_id=key, message=message, updated_at=updated_at)
+                for key, message, updated_at in table.items()
+            ]
+        return values, "Live values fetched successfully"
+
+    if not plc_id:
+        return [], "Live values are not available: no ingest process is publishing them"
+    latest = await message_collection.find_one({"plc_id": plc_id}, sort=[("created_at", -1)])
+    if not latest:
+        return [], "No values received for this PLC yet"
+    return [LiveValueSchema(
+        plc_id=plc_id, message=str(latest.get("message", "")), updated_at=latest.get("created_at"), source="mongo"
+    )], "Latest stored value fetched successfully"
+
+async def get_trend(
+        plc_id: str,
+        tag: Optional[str] = None,
+        minutes: float = 10,
+    ) -> Tuple[TrendSchema, str]:
+    """
+    Recent values of one device as columns (times, values) per tag. Served from
+    the in-memory ring buffers when they hold the whole window, otherwise
+    decoded from plc_message. The rings live in the process that receives
+    telemetry: with a separate ingest process they are queried there.
+    """
+    since = datetime.utcnow() - timedelta(minutes=minutes)
+    if setting.INGEST_PROCESS:
+        params = {"since": to_epoch(since)}
+        if tag:
+            params["tag"] = tag
+        columns = await fetch_ingest(f"/trend/{quote(plc_id, safe='')}?{urlencode(params)}")
+    else:
+        columns = recent_store.query(plc_id, since, tag=tag)
+        if columns is not None:
+            columns = {name: (times.tolist(), values.tolist()) for name, (times, values) in columns.items()}
+    if columns is not None:
+        return TrendSchema(plc_id=plc_id, tags=[
+            TagTrendSchema(tag=name, times=times, values=values)
+            for name, (times, values) in columns.items()
+        ]), "Trend fetched successfully"
+
+    trends: Dict[str, TagTrendSchema] = {}
+    cursor = message_collection.find(
+        {"plc_id": plc_id, "created_at": {"$gte": since}}, {"message": 1, "created_at": 1, "_id": 0}
+    ).sort("created_at", 1)
+    async for doc in cursor:
+        ts = to_epoch(doc["created_at"])
+        for name, value in decode_tags(doc.get("message")).items():
+            if tag and name != tag:
+                continue
+            trend = trends.get(name)
+            if trend is None:
+                trend = trends[name] = TagTrendSchema(tag=name)
+            trend.times.append(ts)
+            trend.values.append(value)
+    return TrendSchema(plc_id=plc_id, source="mongo", tags=sorted(trends.values(), key=lambda t: t.tag)), "Trend fetched successfully"
+
 async def send_command_to_plc(plc_ip: str, register_address: int, value: int):
     """Send a command to the PLC via Modbus."""
     try:
         get_plc = await plc_collection.find_one({"plc_id": plc_ip})
         if not get_plc:
             raise HTTPException(status_code=404, detail="PLC not found")
-        modbus = ModbusClient(host=get_plc["ip_address"], port=get_plc["port"])
-        success, message = modbus.write_register(register_address, value)
-        modbus.close()
+        with timed("device"):
+            modbus = ModbusClient(host=get_plc["ip_address"], port=get_plc["port"])
+            success, message = modbus.write_register(register_address, value)
+            modbus.close()
         return success, message
     except Exception as e:
         return False, str(e)
@@ -246,6 +436,7 @@ async def get_plc_list(
         sort_by: Optional[List[str]] = ["-created_at"],
         fields: Optional[List[str]] = [],
         search: Optional[str] = None,
+        search_mode: Optional[str] = None,
         from_date: Optional[datetime] = None,
         to_date: Optional[datetime] = None,
         is_pagination: bool = True,
@@ -256,14 +447,9 @@ async def get_plc_list(
     Get PLC List with optional search, pagination, and date filtering
     """
     max_allowed_days = 90
-    search_query = {}
-
-    if search:
-        search_query = {
-            "$or": [
-                {"plc_id": {"$regex": search, "$options": "i"}},
-            ]
-        }
+    search_query = await build_search_query(
+        "device_id", search, mode=search_mode or setting.SEARCH_MODE, trie_source=iothub_device_collection
+    )
 
     if from_date and to_date:
         if (to_date - from_date).days > max_allowed_days:
@@ -282,7 +468,7 @@ async def get_plc_list(
             collection=collection,
             schema=PlcIotHubDeviceSchema,
             request=request,
-            filter={"search": search},
+            filter={"search": search, "search_mode": search_mode},
             page=page,
             limit=limit,
             search_query=search_query,
@@ -337,6 +523,13 @@ async def get_plc_list(
 
 
 
+def _message_schema(doc: Dict) -> PlcMessageSchema:
+    """plc_message document, live or archived, as returned by the message list."""
+    if "_id" in doc:
+        doc["id"] = str(doc.pop("_id"))
+    return PlcMessageSchema(**doc)
+
+
 async def get_message_list(
         collection=message_collection,
         is_active: Optional[int] = None,
@@ -346,6 +539,7 @@ async def get_message_list(
         sort_by: Optional[List[str]] = ["-created_at"],
         fields: Optional[List[str]] = [],
         search: Optional[str] = None,
+        search_mode: Optional[str] = None,
         from_date: Optional[datetime] = None,
         to_date: Optional[datetime] = None,
         is_pagination: bool = True,
@@ -356,14 +550,10 @@ async def get_message_list(
     Get PLC List with optional search, pagination, and date filtering
     """
     max_allowed_days = 90
-    search_query = {}
-
-    if search:
-        search_query = {
-            "$or": [
-                {"plc_id": {"$regex": search, "$options": "i"}},
-            ]
-        }
+    search_query = await build_search_query(
+        "plc_id", search, mode=search_mode or setting.SEARCH_MODE, trie_source=plc_collection,
+        substring=False,
+    )
 
     if from_date and to_date:
         if (to_date - from_date).days > max_allowed_days:
@@ -377,26 +567,43 @@ async def get_message_list(
             }
         )
 
+    # Ranges older than the retention window live in the archive, not in plc_message
+    with_archive = bool(from_date and to_date)
+
     if is_pagination:
         paginator = AsyncPaginator(
             collection=collection,
             schema=PlcMessageSchema,
             request=request,
-            filter={"search": search},
+            filter={"search": search, "search_mode": search_mode},
             page=page,
             limit=limit,
             search_query=search_query,
         )
         paginated_result = await paginator.get_paginated_results()
 
-        for record in paginated_result["result"]:
-            plc_data = await collection.find_one(
-                {"plc_id": record.plc_id}
+        if with_archive:
+            live_total = await collection.count_documents(search_query)
+            skip = (page - 1) * limit
+            # Archived rows come after the live ones; fetch only the part of the page they fill
+            archived, archived_total = await load_archived_page(
+                from_date, to_date,
+                skip=max(0, skip - live_total),
+                limit=max(0, skip + limit - max(skip, live_total)),
+                search=search,
+                # plc_message only has prefix search; match archived rows the same way
+                search_mode="prefix",
             )
-            if plc_data:
-                plc_data["id"] = str(plc_data["_id"])
-                del plc_data["_id"]
-                record = PlcMessageSchema(**plc_data)
+            paginated_result["result"].extend(_message_schema(doc) for doc in archived)
+        if with_archive and archived_total:
+            total_items = live_total + archived_total
+            total_pages = math.ceil(total_items / limit)
+            paginated_result.update({
+                "total_items": total_items,
+                "total_pages": total_pages,
+                "next_page_url": paginator.build_pagination_url(page + 1) if page < total_pages else None,
+                "previous_page_url": paginator.build_pagination_url(page - 1) if page > 1 else None,
+            })
 
         return paginated_result, "Plc list fetched successfully"
 
@@ -416,21 +623,18 @@ async def get_message_list(
     if projection:
         query_cursor = query_cursor.project(projection)
 
-    records = []
-    async for doc in query_cursor:
-        doc["id"] = str(doc["_id"])
-        del doc["_id"]
-        records.append(PlcMessageSchema(**doc))
+    # Unpaginated lists are capped; a range can span 90 days of live and archived data
+    max_items = setting.MESSAGE_LIST_MAX_ITEMS
+    records = [_message_schema(doc) async for doc in query_cursor.limit(max_items)]
+
+    # Archived data is always older than what is still in plc_message
+    if with_archive and len(records) < max_items:
+        archived, _ = await load_archived_page(
+            from_date, to_date, skip=0, limit=max_items - len(records), search=search, search_mode="prefix",
+        )
+        records.extend(_message_schema(doc) for doc in archived)
 
     if not records:  # Handle empty result case
         return [], "No records found"
 
-    # Fetch PLC data for each record
-    for i, record in enumerate(records):
-        plc_data = await plc_collection.find_one({"plc_id": record.plc_id})
-        if plc_data:
-            plc_data["id"] = str(plc_data["_id"])
-            del plc_data["_id"]
-            records[i] = PlcMessageSchema(**plc_data)
-
     return records, "Plc messsage fetched successfully"
\ No newline at end of file
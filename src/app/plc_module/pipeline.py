@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple, Union
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from src.config.mongo_db import message_collection, rollup_collection
+from src.core.dedup import dedup_key
+from src.core.metrics import metrics
+from src.core.search import search_fields
+from src.app.alarm_module.controller import ensure_fresh_rules, evaluate_shared_samples, store_alarm_events
+from src.app.alarm_module.engine import decode_tags
+
+ROLLUP_SECONDS = 60
+DUPLICATE_KEY = 11000
+
+# (plc_id, tag, bucket start) -> [count, sum, min, max]
+RollupPartials = Dict[Tuple[str, str, datetime], List[float]]
+
+
+def build_message_document(
+        plc_id: str,
+        message: str,
+        received_at: Optional[Union[datetime, str]] = None,
+        message_id: Optional[str] = None,
+        seq: Optional[int] = None,
+        **extra,
+    ) -> Dict:
+    """Shape a raw telemetry sample into a plc_message document."""
+    if isinstance(received_at, str):
+        received_at = datetime.fromisoformat(received_at)
+    document = {
+        "plc_id": plc_id,
+        "message": message,
+        "created_at": received_at or datetime.utcnow(),
+        **search_fields("plc_id", plc_id, ngram=False),
+        **extra,
+    }
+    if message_id is not None:
+        document["message_id"] = message_id
+        document["dedup_key"] = dedup_key(plc_id, message_id)
+    if seq is not None:
+        document["seq"] = seq
+    return document
+
+
+def bucket_start(at: datetime) -> datetime:
+    """Start of the ROLLUP_SECONDS bucket containing `at`."""
+    since_midnight = at - at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return at - since_midnight % timedelta(seconds=ROLLUP_SECONDS)
+
+
+def accumulate_rollups(partials: RollupPartials, plc_id: str, tags: Dict[str, float], at: datetime):
+    bucket = bucket_start(at)
+    for tag, value in tags.items():
+        aggregate = partials.get((plc_id, tag, bucket))
+        if aggregate is None:
+            partials[(plc_id, tag, bucket)] = [1, value, value, value]
+        else:
+            aggregate[0] += 1
+            aggregate[1] += value
+            if value < aggregate[2]:
+                aggregate[2] = value
+            if value > aggregate[3]:
+                aggregate[3] = value
+
+
+async def write_rollups(partials: RollupPartials, replace: bool = False) -> int:
+    """
+    Merge partial aggregates into plc_rollup_1m. Live ingest merges
+    ($inc/$min/$max); `replace` overwrites buckets that were aggregated
+    completely (replay), which makes rewriting them idempotent.
+    """
+    operations = []
+    for (plc_id, tag, bucket), (count, total, low, high) in partials.items():
+        key = {"plc_id": plc_id, "tag": tag, "bucket": bucket}
+        if replace:
+            update = {"$set": {"count": count, "sum": total, "min": low, "max": high}}
+        else:
+            update = {"$inc": {"count": count, "sum": total}, "$min": {"min": low}, "$max": {"max": high}}
+        operations.append(UpdateOne(key, update, upsert=True))
+    if not operations:
+        return 0
+    await rollup_collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+async def ensure_rollup_indexes():
+    await rollup_collection.create_index(
+        [("plc_id", ASCENDING), ("tag", ASCENDING), ("bucket", ASCENDING)], unique=True
+    )
+
+
+async def ingest_messages(samples: List[Dict], batch_id: Optional[str] = None) -> int:
+    """
+    Decode, evaluate alarms for, roll up and store a batch of samples (dicts
+    of build_message_document kwargs). Samples already evaluated where they
+    were received carry their events under "alarms" and are only persisted here.
+
+    With `batch_id` (the Celery task id, which a redelivery keeps), samples
+    without a message id are keyed by their position in the batch, so a
+    redelivered batch is recognised by the dedup_key index and its alarms and
+    rollups are not counted twice. A worker lost between the insert and those
+    writes loses them for that batch instead: derived data is at most once.
+    """
+    await ensure_fresh_rules()
+    documents, decoded, alarms, unevaluated = [], [], [], []
+    for index, sample in enumerate(samples):
+        sample = dict(sample)
+        events = sample.pop("alarms", None)
+        document = build_message_document(**sample)
+        if batch_id is not None and "dedup_key" not in document:
+            document["dedup_key"] = f"{document['plc_id']}|batch:{batch_id}:{index}"
+        tags = decode_tags(document["message"])
+        if events is None:
+            unevaluated.append(index)
+        alarms.append(events)
+        documents.append(document)
+        decoded.append(tags)
+    if not documents:
+        return 0
+    if unevaluated:
+        # Whichever worker process runs this batch, the devices' alarm state is the shared one
+        evaluated = await evaluate_shared_samples([
+            (documents[index]["plc_id"], documents[index]["created_at"], decoded[index]) for index in unevaluated
+        ])
+        for index, events in zip(unevaluated, evaluated):
+            alarms[index] = events
+
+    duplicates = await insert_messages(documents)
+    # Only stored messages count towards alarms and rollups, so a redelivery can't inflate them
+    await store_alarm_events([
+        event for index, events in enumerate(alarms) if index not in duplicates for event in events
+    ])
+    partials = {}
+    for index, (document, tags) in enumerate(zip(documents, decoded)):
+        if index not in duplicates:
+            accumulate_rollups(partials, document["plc_id"], tags, document["created_at"])
+    await write_rollups(partials)
+    return len(documents) - len(duplicates)
+
+
+async def insert_messages(documents: List[Dict]) -> Set[int]:
+    """
+    Insert plc_message documents, returning the positions rejected by the
+    unique dedup_key index: duplicates that got past the in-memory filter,
+    e.g. redelivered to a different process or after a restart.
+    """
+    try:
+        await message_collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        metrics.inc("ingest_duplicates_total", len(errors), source="mongo")
+        return {error["index"] for error in errors}
+    return set()
+
+
+async def ensure_dedup_index():
+    await message_collection.create_index(
+        "dedup_key", unique=True, partialFilterExpression={"dedup_key": {"$exists": True}}
+    )
@@ -1,13 +1,22 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, Request, HTTPException
+import os
+from typing import Annotated, List, Optional
+from fastapi import APIRouter, Body, Depends, Request, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 from src.app.plc_module import controller as plc_controller
 from src.config.mongo_db import plc_collection, message_collection, iothub_device_collection
 from src.config.response import ResponseModel
+from src.config.settings import setting
+from src.core.cache import ResponseCache, cached_json_response
+from src.core.ingest_client import fetch_ingest
+from src.core.metrics import metrics, render_exports
 from src.app.plc_module.schema import PlcCreateSchema, PlcUpdateSchema, FilterSchema, PlcCommandSchema, PlcIotHubCreateSchema
 
 router = APIRouter()
 
+plc_list_cache = ResponseCache("plc-devices")
+iot_device_list_cache = ResponseCache("iot-devices")
+
 
   
 
@@ -19,38 +28,79 @@ router = APIRouter()
 @router.post('/add-iot-device')
 async def add_iot_hub_device(payload: PlcIotHubCreateSchema):
     result, message = await plc_controller.add_iot_hub_device(payload)
+    if result:
+        await iot_device_list_cache.invalidate()
     return {"message": message, "result": result if result else None}
 
 
 
+@router.post('/bulk-add-iot-devices')
+async def bulk_add_iot_hub_devices(
+        payload: Annotated[List[PlcIotHubCreateSchema], Body(max_length=setting.BULK_MAX_ITEMS)],
+    ):
+    result, message = await plc_controller.bulk_upsert(iothub_device_collection, "device_id", payload, insert_only=True)
+    await iot_device_list_cache.invalidate()
+    return {"message": message, "result": result}
+
+
 @router.put('/update-plc/{plc_id}')
 async def update_plc(plc_id: str, payload: PlcUpdateSchema):
     result, message = await plc_controller.plc_update_by_id(plc_collection,plc_id, payload)
+    if result:
+        await plc_list_cache.invalidate()
     return {"message": message, "result": result if result else None}
 
 
+@router.put('/bulk-update-plcs')
+async def bulk_update_plcs(payload: Annotated[List[PlcUpdateSchema], Body(max_length=setting.BULK_MAX_ITEMS)]):
+    result, message = await plc_controller.bulk_upsert(plc_collection, "plc_id", payload)
+    await plc_list_cache.invalidate()
+    return {"message": message, "result": result}
+
+
 @router.delete('/delete-plc/{plc_id}')
 async def delete_plc(plc_id: str):
     result, message = await plc_controller.delete_plc_data(plc_id)
+    await plc_list_cache.invalidate()
     return {"message": message, "result": result if result else None}
 
 
 @router.get('/get-all-plcs')
 async def get_all(request: Request, filter: FilterSchema = Depends()):
-    result,msg = await plc_controller.get_list(request=request,**filter.dict())
-    return ResponseModel(data=result, message=msg)
+    async def build():
+        result,msg = await plc_controller.get_list(request=request,**filter.dict())
+        return ResponseModel(data=result, message=msg)
+    return await cached_json_response(request, plc_list_cache, filter, build)
 
 
 @router.get('/get-all-iot-plcs')
 async def get_all(request: Request, filter: FilterSchema = Depends()):
-    result, msg = await plc_controller.get_plc_list(request=request,**filter.dict())
-    return ResponseModel(data=result, message=msg)
+    async def build():
+        result, msg = await plc_controller.get_plc_list(request=request,**filter.dict())
+        return ResponseModel(data=result, message=msg)
+    return await cached_json_response(request, iot_device_list_cache, filter, build)
 
 @router.get('/get-all-iot-plcs_message')
 async def get_all(request: Request, filter: FilterSchema = Depends()):
     result, msg = await plc_controller.get_message_list(request=request,**filter.dict())
     return ResponseModel(data=result, message=msg)
 
+@router.get('/live')
+async def get_live_values():
+    result, msg = await plc_controller.get_live_values()
+    return ResponseModel(data=result, message=msg)
+
+
+@router.get('/live/{plc_id}')
+async def get_live_value(plc_id: str):
+    result, msg = await plc_controller.get_live_values(plc_id)
+    return ResponseModel(data=result[0] if result else None, message=msg)
+
+@router.get('/trend/{plc_id}')
+async def get_trend(plc_id: str, tag: Optional[str] = None, minutes: float = Query(10, gt=0, le=24 * 60)):
+    result, msg = await plc_controller.get_trend(plc_id, tag, minutes)
+    return ResponseModel(data=result, message=msg)
+
 @router.post('/send-command')
 async def send_command(payload: PlcCommandSchema):
     result, message = await plc_controller.send_command_to_plc(payload.plc_id, payload.command, payload.value)
@@ -58,3 +108,13 @@ async def send_command(payload: PlcCommandSchema):
         raise HTTPException(status_code=400, detail=message)
     return {"message": message, "result": result}
 
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics():
+    # Each process keeps its own registry; label series by process and merge in the ingest process's
+    exports = [metrics.export(process=f"api-{os.getpid()}")]
+    if setting.INGEST_PROCESS:
+        ingest = await fetch_ingest("/metrics.json")
+        if ingest:
+            exports.append(ingest)
+    return render_exports(*exports)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 from fastapi import Query
@@ -7,6 +7,9 @@ class FilterSchema(BaseModel):
     page: int = Query(1, ge=1, description="Page number, starts from 1")
     limit: int = Query(10, ge=1, le=100, description="Number of items per page")
     search: Optional[str] = Query(description="Search query for PLC", default=None)
+    search_mode: Optional[Literal["prefix", "ngram", "trie"]] = Query(
+        description="Search strategy: prefix, ngram (substring) or trie", default=None
+    )
     from_date: Optional[datetime] = Query(description="From date for the PLC", default=None)
     to_date: Optional[datetime] = Query(description="To date for the PLC", default=None)
     is_active: Optional[int] = Query(description="Status of the PLC", default=None)
@@ -115,8 +118,11 @@ class PlcIotHubDeviceSchema(PlcIoTHubSchema):
         }
 
 class PlcMessageSchema(BaseModel):
-    message_id: str = Field(default="", title="Message ID", description="Message ID")
+    id: str = Field(default="", title="ID", description="ID of the stored message")
+    plc_id: str = Field(default="", title="PLC ID", description="Device the message came from")
+    message_id: Optional[str] = Field(default="", title="Message ID", description="Message ID")
     message: str = Field(default="", title="Message", description="Message")
+    created_at: Optional[datetime] = Field(default=None, title="Created At", description="When the message was received")
 
     class Config:
         form_model = True
@@ -125,4 +131,30 @@ class PlcMessageSchema(BaseModel):
                 "message_id": "message_id",
                 "message": "message"
             }
-        }
\ No newline at end of file
+        }
+
+class BulkItemResultSchema(BaseModel):
+    index: int = Field(title="Index", description="Position of the item in the request array")
+    key: str = Field(default="", title="Key", description="plc_id / device_id of the item")
+    status: str = Field(default="pending", title="Status", description="inserted, updated, conflict or error")
+    id: Optional[str] = Field(default=None, title="ID", description="ID of a newly inserted record")
+    error: Optional[str] = Field(default=None, title="Error", description="Error message for a failed item")
+
+
+class LiveValueSchema(BaseModel):
+    plc_id: str = Field(title="PLC ID", description="Device the value belongs to")
+    message: str = Field(default="", title="Message", description="Latest raw telemetry payload")
+    updated_at: Optional[datetime] = Field(default=None, title="Updated At", description="When the payload was received")
+    source: str = Field(default="shared_memory", title="Source", description="shared_memory, or mongo when the hot state table is unavailable")
+
+
+class TagTrendSchema(BaseModel):
+    tag: str = Field(title="Tag", description="Tag name")
+    times: List[float] = Field(default=[], title="Times", description="Sample times, epoch seconds (UTC)")
+    values: List[float] = Field(default=[], title="Values", description="Sample values, aligned with times")
+
+
+class TrendSchema(BaseModel):
+    plc_id: str = Field(title="PLC ID", description="Device the trend belongs to")
+    source: str = Field(default="memory", title="Source", description="memory, or mongo when the window isn't held in memory")
+    tags: List[TagTrendSchema] = Field(default=[], title="Tags", description="One column pair per tag")
@@ -1,48 +1,103 @@
 import asyncio
+import concurrent.futures
 import logging
 from datetime import datetime
-from azure.iot.device.aio import IoTHubDeviceClient
+from typing import Dict, List, Optional
 from src.worker.celery_worker import celery_app
-from src.config.mongo_db import message_collection, iothub_device_collection
+from src.worker.locks import SingletonLock, singleton
+from src.worker.sharding import coordinator, default_worker_id, partition_for
+from src.config.settings import setting
+from src.worker.runtime import run_async
+from src.config.mongo_db import iothub_device_collection, message_collection, plc_collection
+from src.core.dedup import deduplicator, message_identity, parse_payload
+from src.app.plc_module.pipeline import ingest_messages
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # ---------------------- RECEIVE MESSAGES FROM IOT HUB ----------------------
-@celery_app.task
-def receive_message():
-    """Receives messages from all IoT devices asynchronously"""
-    asyncio.run(receive_message_async())  # Safe execution within Celery
+@celery_app.task(bind=True)
+def receive_message(self):
+    """Receives messages from the IoT devices in this worker's shard"""
+    # Broadcast task: every worker node gets each tick and polls only the partitions it owns
+    worker_id = self.request.hostname or default_worker_id()
+    # The run is bounded below the lock TTL, so the lock can't expire under a run still in progress
+    lock = SingletonLock(f"receive_message:{worker_id}", timeout=int(setting.IOT_POLL_TIMEOUT) + 15)
+    if not lock.acquire():
+        logger.info(f"Skipping receive_message on {worker_id}: previous run still in progress")
+        return
+    try:
+        # Runs on the worker's long-lived loop
+        run_async(receive_message_async(worker_id), timeout=setting.IOT_POLL_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        logger.warning(f"receive_message on {worker_id} cut off after {setting.IOT_POLL_TIMEOUT}s")
+    finally:
+        lock.release()
 
-async def receive_message_async():
-    """ Asynchronously fetches messages from IoT Hub for multiple devices """
+async def receive_message_async(worker_id: Optional[str] = None):
+    """ Asynchronously fetches messages from IoT Hub for the devices this worker owns """
     try:
-        plcs = await iothub_device_collection.find().to_list(length=100)
-        if not plcs:
-            logger.info("No IoT devices found in the database.")
+        partitions = coordinator.owned_partitions(worker_id or default_worker_id())
+        if not partitions:
+            logger.info(f"No partitions assigned to {worker_id}.")
+            return
+        # Devices written before partitions existed have no field; hash those here
+        cursor = iothub_device_collection.find({"$or": [
+            {"partition": {"$in": sorted(partitions)}},
+            {"partition": {"$exists": False}},
+        ]})
+        semaphore = asyncio.Semaphore(setting.SHARD_MAX_CONCURRENCY)
+
+        async def bounded(item):
+            async with semaphore:
+                await handle_iot_message(item)
+
+        pending = []
+        async for item in cursor:
+            if "partition" not in item and partition_for(item["device_id"]) not in partitions:
+                continue
+            pending.append(asyncio.create_task(bounded(item)))
+        if not pending:
+            logger.info("No IoT devices found for this shard.")
             return
-        await asyncio.gather(*[handle_iot_message(item) for item in plcs])
+        await asyncio.gather(*pending)
     except Exception as e:
         logger.error(f"Error fetching IoT device list: {e}")
 
 async def handle_iot_message(item):
     """Handles receiving messages from an IoT Hub device"""
+    from azure.iot.device.aio import IoTHubDeviceClient
+
     client = None
     try:
         logger.info(f"Connecting to IoT device: {item['device_id']}")
         client = IoTHubDeviceClient.create_from_connection_string(item["conn_str"])
-        await client.connect()
-        message = await client.receive_message()
+        await asyncio.wait_for(client.connect(), setting.IOT_RECEIVE_TIMEOUT)
+        try:
+            message = await asyncio.wait_for(client.receive_message(), setting.IOT_RECEIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            message = None
         if message:
             message_data = message.data.decode("utf-8")
             logger.info(f"Received from {item['device_id']}: {message_data}")
-            await message_collection.insert_one({
-                "device_id": item["device_id"],
+            # IoT Hub retries redeliver the same message_id; fall back to ids in the payload
+            message_id, seq = message_identity(parse_payload(message_data))
+            message_id = message.message_id or message_id
+            if deduplicator.is_duplicate(item["device_id"], message_id, seq, source="iothub"):
+                logger.info(f"Dropped duplicate message {message_id or seq} from {item['device_id']}")
+                return
+            now = datetime.utcnow()
+            await ingest_messages([{
+                "plc_id": item["device_id"],
                 "message": message_data,
-                "timestamp": datetime.utcnow()
-            })
-    
+                "received_at": now,
+                "message_id": message_id,
+                "seq": seq,
+                "device_id": item["device_id"],
+                "timestamp": now,
+            }])
+
     except Exception as e:
         logger.error(f"Error receiving message from {item['device_id']}: {e}")
 
@@ -50,3 +105,44 @@ async def handle_iot_message(item):
         if client:
             await client.disconnect()
             logger.info(f"Disconnected from IoT device: {item['device_id']}")
+
+# ---------------------- TELEMETRY INGEST ----------------------
+@celery_app.task(bind=True)
+def process_plc_messages(self, samples: List[Dict]):
+    """Stores a batch of telemetry samples published by a TaskBatcher"""
+    # Late acks redeliver the same task id; it keys the batch so a redelivery is stored once
+    return run_async(ingest_messages(samples, batch_id=self.request.id))
+
+@celery_app.task(bind=True)
+def process_plc_message(self, plc_id: str, payload: str):
+    """Stores a single telemetry sample; prefer batching through process_plc_messages"""
+    return run_async(ingest_messages([{"plc_id": plc_id, "message": payload}], batch_id=self.request.id))
+
+# ---------------------- SEARCH BACKFILL ----------------------
+@celery_app.task
+@singleton(timeout=3600)
+def backfill_search():
+    """Derives search fields on a bounded chunk of documents written before they existed"""
+    return run_async(backfill_search_async(setting.SEARCH_BACKFILL_BATCH))
+
+async def backfill_search_async(limit: int) -> Dict[str, int]:
+    from src.core.search import backfill_search_fields
+
+    updated = {}
+    for collection, field, ngram in (
+        (plc_collection, "plc_id", True),
+        (iothub_device_collection, "device_id", True),
+        (message_collection, "plc_id", False),
+    ):
+        updated[collection.name] = await backfill_search_fields(collection, field, ngram, limit=limit)
+        if updated[collection.name]:
+            logger.info(f"Backfilled search fields on {updated[collection.name]} {collection.name} documents")
+    return updated
+
+# ---------------------- PLC COMMANDS ----------------------
+@celery_app.task
+def send_plc_command(plc_id: str, register_address: int, value: int):
+    """Writes a register on a PLC from the commands queue"""
+    from src.app.plc_module.controller import send_command_to_plc
+
+    return run_async(send_command_to_plc(plc_id, register_address, value))
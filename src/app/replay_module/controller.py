@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+from pymongo import ASCENDING
+from src.config.mongo_db import archive_manifest_collection, message_collection, replay_checkpoint_collection
+from src.config.settings import setting
+from src.core.archive import decode_documents, get_archive_store
+from src.app.alarm_module.controller import load_rule_documents, store_alarm_events
+from src.app.alarm_module.engine import AlarmEngine, decode_tags
+from src.app.plc_module.pipeline import ROLLUP_SECONDS, accumulate_rollups, bucket_start, write_rollups
+from src.app.replay_module.schema import ReplayPartitionResultSchema, ReplaySource
+
+logger = logging.getLogger(__name__)
+
+REPLAY_PROJECTION = {"plc_id": 1, "message": 1, "created_at": 1}
+
+
+def replay_window(start: datetime, end: datetime, now: Optional[datetime] = None):
+    """
+    Widen [start, end) to whole rollup buckets so every rewritten bucket is
+    complete, and stop before buckets live ingest may still be adding to: a
+    replay overwrites its buckets ($set) while live ingest increments them.
+    """
+    start = bucket_start(start)
+    if bucket_start(end) != end:
+        end = bucket_start(end) + timedelta(seconds=ROLLUP_SECONDS)
+    settled = bucket_start((now or datetime.utcnow()) - timedelta(seconds=setting.REPLAY_SETTLE_SECONDS))
+    return start, min(end, settled)
+
+
+async def iter_mongo_batches(plc_id: str, start: datetime, end: datetime, batch_size: int) -> AsyncIterator[List[Dict]]:
+    """Raw messages of one device in time order, keyset-paginated on (created_at, _id)."""
+    query = {"plc_id": plc_id, "created_at": {"$gte": start, "$lt": end}}
+    while True:
+        documents = await message_collection.find(query, REPLAY_PROJECTION).sort(
+            [("created_at", ASCENDING), ("_id", ASCENDING)]
+        ).limit(batch_size).to_list(length=batch_size)
+        if not documents:
+            return
+        yield documents
+        if len(documents) < batch_size:
+            return
+        last = documents[-1]
+        query = {
+            "plc_id": plc_id,
+            "created_at": {"$lt": end},
+            "$or": [
+                {"created_at": {"$gt": last["created_at"]}},
+                {"created_at": last["created_at"], "_id": {"$gt": last["_id"]}},
+            ],
+        }
+
+
+async def iter_archive_batches(plc_id: str, start: datetime, end: datetime, batch_size: int) -> AsyncIterator[List[Dict]]:
+    """Archived messages of one device in time order, one archive file at a time."""
+    manifests = await archive_manifest_collection.find(
+        {"plc_id": plc_id, "from": {"$lt": end}, "to": {"$gte": start}}
+    ).sort([("from", ASCENDING), ("to", ASCENDING)]).to_list(length=None)
+    store = get_archive_store()
+    for manifest in manifests:
+        data = await asyncio.to_thread(store.read, manifest["path"])
+        documents = [
+            doc for doc in await asyncio.to_thread(decode_documents, data, manifest["format"])
+            if start <= doc["created_at"] < end
+        ]
+        documents.sort(key=lambda doc: (doc["created_at"], doc["_id"]))
+        for i in range(0, len(documents), batch_size):
+            yield documents[i:i + batch_size]
+
+
+def iter_batches(source: ReplaySource, plc_id: str, start: datetime, end: datetime, batch_size: int):
+    if source == "archive":
+        return iter_archive_batches(plc_id, start, end, batch_size)
+    return iter_mongo_batches(plc_id, start, end, batch_size)
+
+
+async def plan_partitions(start: datetime, end: datetime, source: ReplaySource = "mongo") -> List[str]:
+    """Devices with data in [start, end); each is replayed as an independent partition."""
+    if source == "archive":
+        plc_ids = await archive_manifest_collection.distinct("plc_id", {"from": {"$lt": end}, "to": {"$gte": start}})
+    else:
+        plc_ids = await message_collection.distinct("plc_id", {"created_at": {"$gte": start, "$lt": end}})
+    return sorted(plc_id for plc_id in plc_ids if plc_id)
+
+
+def _flush_closed(partials: Dict, before: datetime) -> Dict:
+    """Split off the buckets that start before `before`; no later message can still land in them."""
+    closed = {key: value for key, value in partials.items() if key[2] < before}
+    for key in closed:
+        del partials[key]
+    return closed
+
+
+async def replay_partition(
+        job_id: str,
+        plc_id: str,
+        start: datetime,
+        end: datetime,
+        source: ReplaySource = "mongo",
+        batch_size: Optional[int] = None,
+    ) -> ReplayPartitionResultSchema:
+    """
+    Re-run one device's history through decode -> alarms -> rollups.
+
+    Writes are idempotent: finished rollup buckets are overwritten ($set) and
+    alarm events are upserted on their natural key. The checkpoint only ever
+    advances to the start of the bucket still being aggregated, together with
+    the alarm engine's state as of that point, so a crashed or redelivered
+    partition resumes there without double-counting or re-raising alarms.
+    """
+    start, end = replay_window(start, end)
+    batch_size = batch_size or setting.REPLAY_BATCH_SIZE
+    checkpoint_id = f"{job_id}:{plc_id}"
+    result = ReplayPartitionResultSchema(job_id=job_id, plc_id=plc_id)
+    if start >= end:
+        return result
+
+    checkpoint = await replay_checkpoint_collection.find_one({"_id": checkpoint_id})
+    if checkpoint and checkpoint.get("done"):
+        result.processed = checkpoint.get("processed", 0)
+        result.resumed = True
+        return result
+    resume_at = start
+    if checkpoint:
+        resume_at = checkpoint["resume_at"]
+        result.processed = checkpoint.get("processed", 0)
+        result.resumed = True
+
+    # A private engine: replayed state must not leak into the live one, and transitions are not published
+    replay_engine = AlarmEngine()
+    replay_engine.load_rules(await load_rule_documents())
+    if checkpoint and checkpoint.get("alarm_state"):
+        replay_engine.restore_state(plc_id, dict(checkpoint["alarm_state"]))
+    partials: Dict = {}
+    # Messages already counted in the open bucket; dropped from the checkpoint since they are re-read on resume
+    open_bucket, open_count = None, 0
+    # Engine state before the open bucket's first message: what a resume from open_bucket starts from
+    open_state = replay_engine.snapshot_state(plc_id)
+
+    async for documents in iter_batches(source, plc_id, resume_at, end, batch_size):
+        events = []
+        for doc in documents:
+            at = doc["created_at"]
+            bucket = bucket_start(at)
+            if bucket != open_bucket:
+                result.processed += open_count
+                open_bucket, open_count = bucket, 0
+                open_state = replay_engine.snapshot_state(plc_id)
+            open_count += 1
+            tags = decode_tags(doc.get("message"))
+            events.extend(replay_engine.evaluate(plc_id, tags, at))
+            accumulate_rollups(partials, plc_id, tags, at)
+
+        result.alarms += await store_alarm_events(events, idempotent=True)
+        result.rollups += await write_rollups(_flush_closed(partials, open_bucket), replace=True)
+        await replay_checkpoint_collection.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {
+                "job_id": job_id,
+                "plc_id": plc_id,
+                "source": source,
+                "resume_at": open_bucket,
+                "alarm_state": open_state,
+                "processed": result.processed,
+                "done": False,
+                "updated_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+
+    result.rollups += await write_rollups(partials, replace=True)
+    result.processed += open_count
+    await replay_checkpoint_collection.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {
+            "job_id": job_id,
+            "plc_id": plc_id,
+            "source": source,
+            "resume_at": end,
+            "processed": result.processed,
+            "done": True,
+            "updated_at": datetime.utcnow(),
+        }},
+        upsert=True,
+    )
+    return result
+
+
+async def run_replay(
+        job_id: str,
+        start: datetime,
+        end: datetime,
+        plc_ids: Optional[List[str]] = None,
+        source: ReplaySource = "mongo",
+        concurrency: Optional[int] = None,
+    ) -> List[ReplayPartitionResultSchema]:
+    """Replay every partition in this process, `concurrency` devices at a time."""
+    plc_ids = plc_ids or await plan_partitions(start, end, source)
+    semaphore = asyncio.Semaphore(concurrency or setting.REPLAY_CONCURRENCY)
+
+    async def run(plc_id: str) -> ReplayPartitionResultSchema:
+        async with semaphore:
+            try:
+                result = await replay_partition(job_id, plc_id, start, end, source)
+            except Exception as e:
+                logger.error(f"Replay {job_id} failed for plc_id={plc_id}: {e}")
+                return ReplayPartitionResultSchema(job_id=job_id, plc_id=plc_id, error=str(e))
+            logger.info(f"Replay {job_id} plc_id={plc_id}: processed={result.processed} rollups={result.rollups}")
+            return result
+
+    return await asyncio.gather(*(run(plc_id) for plc_id in plc_ids))
+
+
+async def dispatch_replay(
+        job_id: str,
+        start: datetime,
+        end: datetime,
+        plc_ids: Optional[List[str]] = None,
+        source: ReplaySource = "mongo",
+    ) -> List[str]:
+    """Queue one Celery task per partition so the rollups workers replay them in parallel."""
+    from src.app.replay_module.tasks import replay_partition as replay_partition_task
+
+    plc_ids = plc_ids or await plan_partitions(start, end, source)
+    for plc_id in plc_ids:
+        replay_partition_task.delay(job_id, plc_id, start.isoformat(), end.isoformat(), source)
+    return plc_ids
@@ -0,0 +1,14 @@
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+
+ReplaySource = Literal["mongo", "archive"]
+
+
+class ReplayPartitionResultSchema(BaseModel):
+    job_id: str = Field(title="Job ID", description="Replay job the partition belongs to")
+    plc_id: str = Field(title="PLC ID", description="Device replayed by this partition")
+    processed: int = Field(default=0, title="Processed", description="Raw messages run through the pipeline")
+    rollups: int = Field(default=0, title="Rollups", description="Rollup buckets rewritten")
+    alarms: int = Field(default=0, title="Alarms", description="Alarm events newly recorded")
+    resumed: bool = Field(default=False, title="Resumed", description="Started from an earlier checkpoint")
+    error: Optional[str] = Field(default=None, title="Error", description="Why the partition failed, if it did")
@@ -0,0 +1,17 @@
+import logging
+from datetime import datetime
+from src.worker.celery_worker import celery_app
+from src.worker.runtime import run_async
+from src.app.replay_module import controller as replay_controller
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task
+def replay_partition(job_id: str, plc_id: str, start: str, end: str, source: str = "mongo"):
+    """Replays one device's history; a redelivered task resumes from the partition's checkpoint"""
+    result = run_async(replay_controller.replay_partition(
+        job_id, plc_id, datetime.fromisoformat(start), datetime.fromisoformat(end), source
+    ))
+    logger.info(f"Replay {job_id} plc_id={plc_id}: processed={result.processed} rollups={result.rollups} alarms={result.alarms}")
+    return result.dict()
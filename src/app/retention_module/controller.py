@@ -0,0 +1,242 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi.encoders import jsonable_encoder
+from pymongo import ASCENDING, DESCENDING, ReadPreference, ReturnDocument, WriteConcern
+from src.config.mongo_db import message_collection, retention_policy_collection, archive_manifest_collection
+from src.config.settings import setting
+from src.core.archive import decode_documents, encode_documents, get_archive_store
+from src.core.search import matches_search
+from src.app.retention_module.schema import (
+    RetentionPolicySchema,
+    RetentionPolicyDeviceSchema,
+    RetentionRunResultSchema,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _raw_messages():
+    # Retention must see its own deletes: read from and acknowledge on the primary
+    return message_collection.with_options(
+        read_preference=ReadPreference.PRIMARY, write_concern=WriteConcern(w=1)
+    )
+
+
+async def ensure_retention_indexes():
+    await message_collection.create_index([("created_at", ASCENDING)])
+    await message_collection.create_index([("plc_id", ASCENDING), ("created_at", ASCENDING)])
+    await drop_tag_scoped_policies()
+    await retention_policy_collection.create_index("plc_id", unique=True)
+    await archive_manifest_collection.create_index("path", unique=True)
+    await archive_manifest_collection.create_index([("plc_id", ASCENDING), ("from", ASCENDING), ("to", ASCENDING)])
+
+
+async def drop_tag_scoped_policies():
+    """Remove what's left of tag-scoped policies: they never selected any documents."""
+    existing = await retention_policy_collection.index_information()
+    if "plc_id_1_tag_1" in existing:
+        await retention_policy_collection.drop_index("plc_id_1_tag_1")
+    result = await retention_policy_collection.delete_many({"tag": {"$ne": None}})
+    if result.deleted_count:
+        logger.warning(f"Deleted {result.deleted_count} tag-scoped retention policies")
+    await retention_policy_collection.update_many({"tag": {"$exists": True}}, {"$unset": {"tag": ""}})
+
+
+async def upsert_policy(payload: RetentionPolicySchema) -> Tuple[Optional[RetentionPolicyDeviceSchema], str]:
+    try:
+        policy = await retention_policy_collection.find_one_and_update(
+            {"plc_id": payload.plc_id},
+            {"$set": jsonable_encoder(payload)},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        policy["id"] = str(policy.pop("_id"))
+        return RetentionPolicyDeviceSchema(**policy), "Retention policy saved successfully"
+    except Exception as e:
+        logger.error(f"Error in upsert_policy: {e}")
+        return None, "An error occurred"
+
+
+async def get_policies() -> Tuple[List[RetentionPolicyDeviceSchema], str]:
+    policies = []
+    async for policy in retention_policy_collection.find():
+        policy["id"] = str(policy.pop("_id"))
+        policies.append(RetentionPolicyDeviceSchema(**policy))
+    return policies, "Retention policies fetched successfully"
+
+
+async def delete_policy(policy_id: str) -> Tuple[int, str]:
+    try:
+        result = await retention_policy_collection.delete_one({"_id": ObjectId(policy_id)})
+    except InvalidId:
+        return 0, "Invalid policy id"
+    if not result.deleted_count:
+        return 0, "Retention policy not found"
+    return result.deleted_count, "Retention policy deleted successfully"
+
+
+async def resolve_policies() -> List[Dict]:
+    """
+    Policies ordered most specific first (device, then default). A
+    settings-level default applies when no catch-all policy is stored.
+    """
+    policies = []
+    async for policy in retention_policy_collection.find({}, {"_id": 0}):
+        policies.append(policy)
+    if setting.RETENTION_DEFAULT_DAYS and not any(p.get("plc_id") is None for p in policies):
+        policies.append({
+            "plc_id": None,
+            "retain_days": setting.RETENTION_DEFAULT_DAYS,
+            "archive": True,
+            "format": setting.ARCHIVE_FORMAT,
+        })
+    return sorted(policies, key=_rank)
+
+
+def _rank(policy: Dict) -> bool:
+    # Device scope beats the catch-all
+    return policy.get("plc_id") is None
+
+
+def _scope(policy: Dict) -> Dict:
+    return {"plc_id": policy["plc_id"]} if policy.get("plc_id") is not None else {}
+
+
+def _overlaps(a: Dict, b: Dict) -> bool:
+    return a.get("plc_id") is None or b.get("plc_id") is None or a["plc_id"] == b["plc_id"]
+
+
+def policy_filter(policy: Dict, policies: List[Dict], cutoff: datetime) -> Dict:
+    """Mongo filter for documents governed by `policy` and not by a more specific one."""
+    query: Dict = {"created_at": {"$lt": cutoff}, **_scope(policy)}
+    overridden = [
+        _scope(other) for other in policies
+        if other is not policy and _rank(other) < _rank(policy) and _overlaps(other, policy)
+    ]
+    if overridden:
+        query["$nor"] = overridden
+    return query
+
+
+def archive_path(plc_id: str, day: str, first_id, last_id, fmt: str) -> str:
+    return f"plc_message/plc_id={plc_id}/date={day}/{first_id}-{last_id}.{fmt}"
+
+
+async def archive_documents(documents: List[Dict], fmt: str) -> int:
+    """Write documents to the archive grouped per device and day, and record them in the manifest."""
+    groups: Dict[Tuple[str, str], List[Dict]] = {}
+    for doc in documents:
+        day = doc["created_at"].strftime("%Y-%m-%d")
+        groups.setdefault((doc.get("plc_id") or "unknown", day), []).append(doc)
+
+    store = get_archive_store()
+    for (plc_id, day), group in groups.items():
+        # Deterministic name: a batch re-archived after a crash overwrites the same file
+        path = archive_path(plc_id, day, group[0]["_id"], group[-1]["_id"], fmt)
+        data = await asyncio.to_thread(encode_documents, group, fmt)
+        await asyncio.to_thread(store.write, path, data)
+        await archive_manifest_collection.update_one(
+            {"path": path},
+            {"$set": {
+                "plc_id": plc_id,
+                "from": group[0]["created_at"],
+                "to": group[-1]["created_at"],
+                "count": len(group),
+                "format": fmt,
+                "bytes": len(data),
+                "archived_at": datetime.utcnow(),
+            }},
+            upsert=True,
+        )
+    return len(groups)
+
+
+async def apply_policy(policy: Dict, policies: List[Dict], now: Optional[datetime] = None) -> RetentionRunResultSchema:
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=policy["retain_days"])
+    query = policy_filter(policy, policies, cutoff)
+    result = RetentionRunResultSchema(plc_id=policy.get("plc_id"))
+    collection = _raw_messages()
+    batch_size = setting.RETENTION_BATCH_SIZE
+
+    while True:
+        # Oldest first along the created_at index; each batch is archived, then deleted by _id
+        documents = await collection.find(query).sort(
+            [("created_at", ASCENDING), ("_id", ASCENDING)]
+        ).limit(batch_size).to_list(length=batch_size)
+        if not documents:
+            break
+        if policy.get("archive", True):
+            result.files += await archive_documents(documents, policy.get("format", setting.ARCHIVE_FORMAT))
+            result.archived += len(documents)
+        deleted = await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in documents]}})
+        result.deleted += deleted.deleted_count
+        if len(documents) < batch_size:
+            break
+    return result
+
+
+async def apply_retention(now: Optional[datetime] = None) -> List[RetentionRunResultSchema]:
+    policies = await resolve_policies()
+    results = []
+    for policy in policies:
+        try:
+            results.append(await apply_policy(policy, policies, now))
+        except Exception as e:
+            logger.error(f"Retention failed for plc_id={policy.get('plc_id')}: {e}")
+    return results
+
+
+async def load_archived_page(
+        from_date: datetime,
+        to_date: datetime,
+        skip: int,
+        limit: int,
+        search: Optional[str] = None,
+        search_mode: Optional[str] = None,
+    ) -> Tuple[List[Dict], int]:
+    """
+    One page of archived documents in [from_date, to_date] plus the total.
+
+    Files are walked newest first and counted from their manifest; only the
+    files the page falls in, and files straddling the range edges (whose
+    in-range count isn't in the manifest), are downloaded. Within the page,
+    documents are ordered by file, newest file first, then newest first.
+    """
+    manifests = await archive_manifest_collection.find(
+        {"from": {"$lte": to_date}, "to": {"$gte": from_date}}
+    ).sort([("to", DESCENDING), ("from", DESCENDING), ("path", ASCENDING)]).to_list(length=None)
+    if search:
+        manifests = [m for m in manifests if matches_search(m["plc_id"], search, search_mode)]
+
+    store = get_archive_store()
+
+    async def read(manifest: Dict) -> List[Dict]:
+        data = await asyncio.to_thread(store.read, manifest["path"])
+        documents = [
+            doc for doc in await asyncio.to_thread(decode_documents, data, manifest["format"])
+            if from_date <= doc["created_at"] <= to_date
+        ]
+        documents.sort(key=lambda doc: doc["created_at"], reverse=True)
+        return documents
+
+    end = skip + limit
+    page: List[Dict] = []
+    total = 0
+    for manifest in manifests:
+        documents = None
+        if from_date <= manifest["from"] and manifest["to"] <= to_date:
+            count = manifest["count"]
+        else:
+            documents = await read(manifest)
+            count = len(documents)
+        if count and total < end and total + count > skip:
+            if documents is None:
+                documents = await read(manifest)
+            page.extend(documents[max(0, skip - total):end - total])
+        total += count
+    return page, total
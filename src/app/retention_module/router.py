@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException
+from src.app.retention_module import controller as retention_controller
+from src.app.retention_module.schema import RetentionPolicySchema
+from src.config.response import ResponseModel
+
+router = APIRouter()
+
+
+@router.post('/policies')
+async def save_policy(payload: RetentionPolicySchema):
+    result, message = await retention_controller.upsert_policy(payload)
+    if not result:
+        raise HTTPException(status_code=400, detail=message)
+    return ResponseModel(data=result, message=message)
+
+
+@router.get('/policies')
+async def get_policies():
+    result, message = await retention_controller.get_policies()
+    return ResponseModel(data=result, message=message)
+
+
+@router.delete('/policies/{policy_id}')
+async def delete_policy(policy_id: str):
+    result, message = await retention_controller.delete_policy(policy_id)
+    if not result:
+        raise HTTPException(status_code=404, detail=message)
+    return ResponseModel(data=result, message=message)
+
+
+@router.post('/run')
+async def run_retention():
+    from src.app.retention_module.tasks import apply_retention
+
+    task = apply_retention.delay()
+    return ResponseModel(data={"task_id": task.id}, message="Retention run queued")
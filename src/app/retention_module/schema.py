@@ -0,0 +1,31 @@
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class RetentionPolicySchema(BaseModel):
+    plc_id: Optional[str] = Field(default=None, title="PLC ID", description="Device the policy applies to; empty for all devices")
+    retain_days: int = Field(default=90, ge=1, title="Retain Days", description="Raw data older than this is archived / deleted")
+    archive: bool = Field(default=True, title="Archive", description="Write expired data to the archive before deleting it")
+    format: Literal["ndjson.gz", "parquet"] = Field(default="ndjson.gz", title="Format", description="Archive file format")
+
+    class Config:
+        form_model = True
+        json_schema_extra = {
+            "example": {
+                "plc_id": "PLC1",
+                "retain_days": 30,
+                "archive": True,
+                "format": "ndjson.gz"
+            }
+        }
+
+
+class RetentionPolicyDeviceSchema(RetentionPolicySchema):
+    id: str = Field(default="", title="ID", description="ID of the policy")
+
+
+class RetentionRunResultSchema(BaseModel):
+    plc_id: Optional[str] = Field(default=None, title="PLC ID", description="Device scope of the policy")
+    archived: int = Field(default=0, title="Archived", description="Documents written to the archive")
+    deleted: int = Field(default=0, title="Deleted", description="Documents removed from plc_message")
+    files: int = Field(default=0, title="Files", description="Archive files written")
@@ -0,0 +1,20 @@
+import logging
+from src.worker.celery_worker import celery_app
+from src.worker.locks import singleton
+from src.worker.runtime import run_async
+from src.app.retention_module import controller as retention_controller
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task
+@singleton(timeout=6 * 3600)
+def apply_retention():
+    """Archives and deletes raw telemetry that has outlived its retention policy"""
+    results = run_async(retention_controller.apply_retention())
+    for result in results:
+        logger.info(
+            f"Retention plc_id={result.plc_id}: "
+            f"archived={result.archived} deleted={result.deleted} files={result.files}"
+        )
+    return [result.dict() for result in results]
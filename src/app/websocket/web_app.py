@@ -0,0 +1,78 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from src.app.alarm_module.engine import ALARM_CHANNEL
+from src.config.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Seconds a client gets to take a message before it is dropped as stale
+SEND_TIMEOUT = 5.0
+
+
+class ConnectionManager:
+    """Open WebSocket connections, each optionally subscribed to a single plc_id."""
+
+    def __init__(self):
+        self.connections: Dict[WebSocket, Optional[str]] = {}
+
+    async def connect(self, websocket: WebSocket, plc_id: Optional[str] = None):
+        await websocket.accept()
+        self.connections[websocket] = plc_id
+
+    def disconnect(self, websocket: WebSocket):
+        self.connections.pop(websocket, None)
+
+    async def broadcast(self, payload: str, plc_id: Optional[str] = None):
+        """Send to all subscribers concurrently; one slow client can't hold up the others."""
+        targets = [
+            websocket for websocket, subscribed in list(self.connections.items())
+            if not subscribed or subscribed == plc_id
+        ]
+        results = await asyncio.gather(
+            *(asyncio.wait_for(websocket.send_text(payload), SEND_TIMEOUT) for websocket in targets),
+            return_exceptions=True,
+        )
+        for websocket, result in zip(targets, results):
+            if isinstance(result, Exception):
+                self.disconnect(websocket)
+
+
+alarm_manager = ConnectionManager()
+
+
+@router.websocket("/alarms")
+async def alarm_socket(websocket: WebSocket, plc_id: Optional[str] = None):
+    await alarm_manager.connect(websocket, plc_id)
+    try:
+        while True:
+            # Keep the connection open; clients don't need to send anything
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Alarm socket closed with an error: {e}")
+    finally:
+        alarm_manager.disconnect(websocket)
+
+
+async def relay_alarms():
+    """Forward alarm events published by any ingest process to this process' sockets."""
+    while True:
+        try:
+            pubsub = get_async_redis().pubsub()
+            await pubsub.subscribe(ALARM_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                payload = message["data"].decode() if isinstance(message["data"], bytes) else message["data"]
+                await alarm_manager.broadcast(payload, json.loads(payload).get("plc_id"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Alarm relay lost its Redis subscription: {e}, retrying in 5 seconds...")
+            await asyncio.sleep(5)
@@ -1,19 +1,186 @@
+from typing import TYPE_CHECKING, Dict, Optional
+from pymongo import WriteConcern, monitoring
 from pymongo.errors import PyMongoError
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
 from src.config.settings import setting
+from src.core.metrics import metrics
 
-client = AsyncIOMotorClient('mongodb://mongodb:27017')
-db = client[setting.DATABASE_NAME]
+if TYPE_CHECKING:
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
-message_collection = db["plc_message"]
-plc_collection = db["plc_device"]
-iothub_device_collection = db["plc_iot_hub"]
+_client: Optional["AsyncIOMotorClient"] = None
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Feeds connection pool usage per server into the metrics registry."""
+
+    def pool_created(self, event):
+        # The event only carries options that differ from pymongo's defaults
+        max_size = event.options.get("maxPoolSize", setting.MONGO_MAX_POOL_SIZE)
+        metrics.set("mongo_pool_max_size", max_size, address=_address(event))
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        metrics.inc("mongo_pool_cleared_total", address=_address(event))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        metrics.add("mongo_pool_connections", 1, address=_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        metrics.add("mongo_pool_connections", -1, address=_address(event))
+
+    def connection_check_out_started(self, event):
+        metrics.add("mongo_pool_waiting", 1, address=_address(event))
+
+    def connection_check_out_failed(self, event):
+        metrics.add("mongo_pool_waiting", -1, address=_address(event))
+        metrics.inc("mongo_pool_checkout_failed_total", address=_address(event), reason=event.reason)
+
+    def connection_checked_out(self, event):
+        metrics.add("mongo_pool_waiting", -1, address=_address(event))
+        metrics.add("mongo_pool_checked_out", 1, address=_address(event))
+        metrics.inc("mongo_pool_checkouts_total", address=_address(event))
+
+    def connection_checked_in(self, event):
+        metrics.add("mongo_pool_checked_out", -1, address=_address(event))
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+def parse_write_concern(value: Optional[str]) -> Optional[WriteConcern]:
+    """Parse "0", "1", "majority", optionally suffixed ":j" for journaled acknowledgement."""
+    if not value:
+        return None
+    w, _, journal = value.partition(":")
+    w = int(w) if w.isdigit() else w
+    if w == 0:
+        return WriteConcern(w=0)
+    return WriteConcern(w=w, j=True if journal == "j" else None)
+
+
+def parse_read_preference(value: Optional[str]):
+    if not value:
+        return None
+    return make_read_preference(read_pref_mode_from_name(value), None)
+
+
+def create_client() -> "AsyncIOMotorClient":
+    """Build a Motor client from settings."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    options: Dict = {
+        "maxPoolSize": setting.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": setting.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": setting.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": setting.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": [PoolMetricsListener()],
+    }
+    if setting.DEBUG or setting.PROFILING_ENABLED:
+        from src.core.profiling import CommandTimingListener
+
+        options["event_listeners"].append(CommandTimingListener())
+    if setting.MONGO_COMPRESSORS:
+        options["compressors"] = setting.MONGO_COMPRESSORS
+    if setting.MONGO_WRITE_CONCERN:
+        write_concern = parse_write_concern(setting.MONGO_WRITE_CONCERN).document
+        options["w"] = write_concern["w"]
+        if write_concern.get("j"):
+            options["journal"] = True
+    if setting.MONGO_READ_PREFERENCE:
+        options["readPreference"] = setting.MONGO_READ_PREFERENCE
+    return AsyncIOMotorClient(setting.DATABASE_URL, **options)
+
+
+def get_client() -> "AsyncIOMotorClient":
+    """Process-wide Motor client, created on first use so it binds to the running loop."""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def get_database() -> "AsyncIOMotorDatabase":
+    return get_client()[setting.DATABASE_NAME]
+
+
+def reset_client():
+    """Forget the current client (e.g. one inherited across fork) without closing its sockets."""
+    global _client
+    _client = None
+
+
+async def connect():
+    """Create the client on the current loop and open the pool."""
+    await get_client().admin.command("ping")
+
+
+async def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+class LazyCollection:
+    """
+    Module-level handle that resolves to the collection of the current client
+    on use, with optional per-collection write concern / read preference.
+    """
+
+    def __init__(self, name: str, write_concern: Optional[str] = None, read_preference: Optional[str] = None):
+        self.name = name
+        self.options = {
+            "write_concern": parse_write_concern(write_concern),
+            "read_preference": parse_read_preference(read_preference),
+        }
+        self._resolved = None
+        self._resolved_for = None
+
+    def resolve(self):
+        client = get_client()
+        if self._resolved_for is not client:
+            self._resolved = get_database().get_collection(self.name, **self.options)
+            self._resolved_for = client
+        return self._resolved
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self.name!r})"
+
+
+# Raw telemetry: cheap writes, history reads may go to secondaries
+message_collection = LazyCollection(
+    "plc_message",
+    write_concern=setting.MONGO_TELEMETRY_WRITE_CONCERN,
+    read_preference=setting.MONGO_HISTORY_READ_PREFERENCE,
+)
+plc_collection = LazyCollection("plc_device")
+iothub_device_collection = LazyCollection("plc_iot_hub")
+retention_policy_collection = LazyCollection("retention_policy")
+archive_manifest_collection = LazyCollection("plc_message_archive")
+alarm_rule_collection = LazyCollection("plc_alarm_rule")
+alarm_event_collection = LazyCollection("plc_alarm")
+rollup_collection = LazyCollection("plc_rollup_1m")
+replay_checkpoint_collection = LazyCollection("replay_checkpoint")
 
 
 async def get_session():
     """Provide a transactional scope around a series of operations with MongoDB, using motor's async session support."""
     try:
-        async with await client.start_session() as session:
+        async with await get_client().start_session() as session:
             try:
                 # Starting the transaction
                 async with session.start_transaction():
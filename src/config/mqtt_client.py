@@ -1,14 +1,35 @@
 import paho.mqtt.client as mqtt
 import time
 import json
-from src.config.mongo_db import message_collection
+from datetime import datetime
+from fastapi.encoders import jsonable_encoder
 from src.config.settings import setting
-from src.app.plc_module.tasks import process_plc_message
+from src.app.alarm_module.controller import evaluate_sample
+from src.app.alarm_module.engine import decode_tags
+from src.app.plc_module.tasks import process_plc_messages
+from src.core.dedup import deduplicator, message_identity, parse_payload
+from src.core.recent_store import recent_store
+from src.core.shared_state import publish_latest
+from src.worker.batching import TaskBatcher
 
 MQTT_BROKER = setting.MQTT_BROKER or "mqtt"
 MQTT_PORT = int(setting.MQTT_PORT or 1883)
 MQTT_TOPIC = setting.MQTT_TOPIC or "plc/"
 
+def forget_dropped(samples):
+    # Samples that never reached the broker must not shadow their redelivery
+    for sample in samples:
+        deduplicator.forget(sample["plc_id"], sample["message_id"], sample["seq"])
+
+
+# One Celery message per TELEMETRY_BATCH_SIZE samples instead of one per sample
+telemetry_batcher = TaskBatcher(
+    process_plc_messages,
+    max_size=setting.TELEMETRY_BATCH_SIZE,
+    max_wait=setting.TELEMETRY_BATCH_WAIT,
+    on_dropped=forget_dropped,
+)
+
 # MQTT Connect Callback
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
@@ -23,12 +44,33 @@ def on_message(client, userdata, msg):
         payload = msg.payload.decode()
         plc_id = msg.topic.split("/")[-1]
 
-        # Store in MongoDB
-        message_data = {"plc_id": plc_id, "message": payload}
-        message_collection.insert_one(message_data)
+        received_at = datetime.utcnow()
+
+        # QoS 1 redeliveries: drop anything already seen before it is evaluated or batched
+        data = parse_payload(payload)
+        message_id, seq = message_identity(data)
+        if deduplicator.is_duplicate(plc_id, message_id, seq, source="mqtt"):
+            return
+
+        # Alarms are evaluated here, where samples arrive in order, and published immediately
+        tags = decode_tags(data)
+        alarms = evaluate_sample(plc_id, payload, received_at, tags)
 
-        # Send message for background processing
-        process_plc_message.delay(plc_id, payload)
+        # Recent history for short-window trend queries served from memory
+        recent_store.record(plc_id, tags, received_at)
+
+        # Latest value for the API workers' live reads (no-op unless this process owns the table)
+        publish_latest(plc_id, payload, received_at)
+
+        # Queue for batched storage / processing in the ingest workers
+        telemetry_batcher.add({
+            "plc_id": plc_id,
+            "message": payload,
+            "received_at": received_at.isoformat(),
+            "message_id": message_id,
+            "seq": seq,
+            "alarms": jsonable_encoder(alarms),
+        })
 
         print(f"📩 Received from {msg.topic}: {payload}")
 
@@ -40,15 +82,23 @@ mqtt_client = mqtt.Client()
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 
-# Retry MQTT connection
-while True:
-    try:
-        print(f"🔄 Connecting to MQTT Broker at {MQTT_BROKER}:{MQTT_PORT}...")
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        break
-    except Exception as e:
-        print(f"🚨 MQTT Connection Failed: {e}, retrying in 5 seconds...")
-        time.sleep(5)
+def connect_mqtt():
+    """Retry MQTT connection until the broker accepts it (blocking; run off the event loop)"""
+    while True:
+        try:
+            print(f"🔄 Connecting to MQTT Broker at {MQTT_BROKER}:{MQTT_PORT}...")
+            mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+            break
+        except Exception as e:
+            print(f"🚨 MQTT Connection Failed: {e}, retrying in 5 seconds...")
+            time.sleep(5)
 
 def start_mqtt():
+    connect_mqtt()
+    telemetry_batcher.start()
     mqtt_client.loop_start()
+
+def stop_mqtt():
+    mqtt_client.loop_stop()
+    mqtt_client.disconnect()
+    telemetry_batcher.stop()
@@ -0,0 +1,24 @@
+from src.config.settings import setting
+
+_redis = None
+_async_redis = None
+
+
+def get_redis():
+    """Process-wide synchronous Redis client (locks, pub/sub publishing from threads)."""
+    global _redis
+    if _redis is None:
+        import redis
+
+        _redis = redis.Redis.from_url(setting.REDIS_URL)
+    return _redis
+
+
+def get_async_redis():
+    """Process-wide asyncio Redis client; create it from within the loop that will use it."""
+    global _async_redis
+    if _async_redis is None:
+        from redis import asyncio as redis_asyncio
+
+        _async_redis = redis_asyncio.from_url(setting.REDIS_URL)
+    return _async_redis
@@ -1,38 +1,134 @@
-import os
 import pathlib
-from pathlib import Path
-from dotenv import load_dotenv
 from functools import lru_cache
+from typing import Annotated, Any, Dict, List, Literal, Optional
+from pydantic import field_validator, model_validator
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
 
-load_dotenv()
 
+class Settings(BaseSettings):
+    """Validated once from the environment / .env; unset optional values fall back to defaults."""
 
-# @lru_cache()
-class Settings:
-    TAGS = [
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    TAGS: List[Dict[str, Any]] = [
         {"name": "Auth", "description": "This is Authentication Routes"},
     ]
-    DEBUG = os.getenv("DEBUG")
-    PASS = os.getenv("PASS")
-    TITLE = "Plc Application"
-    NAME = "Dipu Kumar Sharma"
-    ALGORITHM = os.getenv("ALGO")
+    DEBUG: bool = False
+    PASS: Optional[str] = None
+    TITLE: str = "Plc Application"
+    NAME: str = "Dipu Kumar Sharma"
+    ALGORITHM: Optional[str] = None
     PROJECT_VERSION: str = "1.0.0"
-    HOST_URL = os.getenv("HOST_URL")
-    HOST_PORT = os.getenv("HOST_PORT")
-    SECRET_KEY = os.getenv("SECRET_KEY")
-    ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS").split(",")
-    HOST_MAIN_URL = f"{HOST_URL}:{HOST_PORT}"
-    BASE_DIR = Path(__file__).resolve().parent
-    CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
-    CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
+    HOST_URL: Optional[str] = None
+    HOST_PORT: int = 8000
+    SECRET_KEY: Optional[str] = None
+    ALLOWED_ORIGINS: Annotated[List[str], NoDecode] = []
+    HOST_MAIN_URL: str = ""
     BASE_DIR: pathlib.Path = pathlib.Path(__file__).resolve().parent.parent
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "mongodb://mongodb:27018")
-    DATABASE_NAME: str = os.getenv("DATABASE_NAME", "plc_data")
+    # Deployment: uvicorn worker processes, and whether this process owns MQTT ingest
+    WEB_CONCURRENCY: int = 1
+    MQTT_ENABLED: bool = False
+    # Set for API workers when a separate ingest process owns MQTT (python -m src.worker.ingest_process)
+    INGEST_PROCESS: bool = False
+    # Local HTTP port where the ingest process serves its metrics and ring buffer trends
+    INGEST_HTTP_HOST: str = "127.0.0.1"
+    INGEST_HTTP_PORT: int = 8099
+    # Shared memory table of the latest value per device, written by the ingest owner
+    HOT_STATE_NAME: str = "plc_hot_state"
+    HOT_STATE_SLOTS: int = 16384
+    HOT_STATE_VALUE_BYTES: int = 1024
+    CELERY_BROKER_URL: Optional[str] = None
+    CELERY_RESULT_BACKEND: Optional[str] = None
+    CELERY_PREFETCH_MULTIPLIER: int = 1
+    REDIS_URL: Optional[str] = None
+    TELEMETRY_BATCH_SIZE: int = 500
+    TELEMETRY_BATCH_WAIT: float = 1.0
+    DATABASE_URL: str = "mongodb://mongodb:27017"
+    DATABASE_NAME: str = "plc_data"
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 10000
+    # e.g. "zstd,snappy,zlib"; zstd/snappy need the zstandard/python-snappy packages
+    MONGO_COMPRESSORS: str = ""
+    MONGO_WRITE_CONCERN: Optional[str] = None
+    MONGO_READ_PREFERENCE: Optional[str] = None
+    # "0" = unacknowledged, "1" = primary ack, "majority[:j]"
+    MONGO_TELEMETRY_WRITE_CONCERN: str = "1"
+    MONGO_HISTORY_READ_PREFERENCE: str = "secondaryPreferred"
+    # Raw plc_message retention; 0 disables the catch-all policy
+    RETENTION_DEFAULT_DAYS: int = 0
+    RETENTION_BATCH_SIZE: int = 5000
+    ARCHIVE_BACKEND: Literal["local", "s3"] = "local"
+    ARCHIVE_FORMAT: Literal["ndjson.gz", "parquet"] = "ndjson.gz"
+    ARCHIVE_DIR: str = "/data/archive"
+    ARCHIVE_S3_BUCKET: Optional[str] = None
+    ARCHIVE_S3_PREFIX: str = ""
+    ARCHIVE_S3_ENDPOINT_URL: Optional[str] = None
+    # Most messages an unpaginated message list returns, live and archived together
+    MESSAGE_LIST_MAX_ITEMS: int = 10000
+    # Ingest deduplication: message keys remembered per process, and how far a
+    # sequence number may drop before it counts as a device counter reset
+    DEDUP_MAX_KEYS: int = 200000
+    DEDUP_SEQUENCE_RESET: int = 1000
+    # Payload fields holding a per-message id, comma separated; never a device-level field such as "id"
+    DEDUP_MESSAGE_ID_FIELDS: Annotated[List[str], NoDecode] = ["message_id", "msg_id"]
+    # In-memory recent history per device tag (ring buffers of 16 bytes a point)
+    RECENT_STORE_POINTS: int = 3600
+    RECENT_STORE_MAX_BYTES: int = 256 * 1024 * 1024
+    # History replay: documents per read batch, partitions (devices) processed in parallel
+    REPLAY_BATCH_SIZE: int = 5000
+    REPLAY_CONCURRENCY: int = 8
+    # Buckets this recent may still receive live samples (batching, queue lag) and are not replayed
+    REPLAY_SETTLE_SECONDS: int = 300
+    # Device polling is split into fixed partitions spread over live workers by consistent hashing
+    SHARD_PARTITIONS: int = 1024
+    SHARD_MEMBER_TTL: float = 20
+    SHARD_MAX_CONCURRENCY: int = 100
+    # A receive_message run is cut off after IOT_POLL_TIMEOUT seconds, and each device
+    # receive after IOT_RECEIVE_TIMEOUT, so a run never outlives its lock
+    IOT_POLL_TIMEOUT: float = 45
+    IOT_RECEIVE_TIMEOUT: float = 10
+    ALARM_RULES_REFRESH: float = 30
+    SEARCH_MODE: Literal["prefix", "ngram", "trie"] = "prefix"
+    # Most items accepted by one bulk add / update request
+    BULK_MAX_ITEMS: int = 1000
+    # Documents per collection a backfill_search run derives search fields for
+    SEARCH_BACKFILL_BATCH: int = 10000
+    # Server-Timing headers and per-command Mongo timing; always on with DEBUG
+    PROFILING_ENABLED: bool = False
+    RUNTIME_METRICS_INTERVAL: float = 5
+    # Required as X-Admin-Token for /admin endpoints; without it they only work with DEBUG
+    ADMIN_TOKEN: Optional[str] = None
+    RESPONSE_CACHE_TTL: int = 30
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_REDIS_URL: Optional[str] = None
+
+    MQTT_BROKER: Optional[str] = None
+    MQTT_PORT: Optional[int] = None
+    MQTT_TOPIC: Optional[str] = None
+
+    @field_validator("ALLOWED_ORIGINS", "DEDUP_MESSAGE_ID_FIELDS", mode="before")
+    @classmethod
+    def split_origins(cls, value):
+        if isinstance(value, str):
+            return [origin.strip() for origin in value.split(",") if origin.strip()]
+        return value or []
+
+    @model_validator(mode="after")
+    def derive_defaults(self):
+        if not self.HOST_MAIN_URL:
+            self.HOST_MAIN_URL = f"{self.HOST_URL}:{self.HOST_PORT}"
+        if not self.REDIS_URL:
+            self.REDIS_URL = self.CELERY_RESULT_BACKEND
+        if self.ARCHIVE_BACKEND == "s3" and not self.ARCHIVE_S3_BUCKET:
+            raise ValueError("ARCHIVE_S3_BUCKET is required when ARCHIVE_BACKEND is s3")
+        return self
+
 
-    MQTT_BROKER = os.getenv("MQTT_BROKER")
-    MQTT_PORT: int = os.getenv("MQTT_PORT")
-    MQTT_TOPIC = os.getenv("MQTT_TOPIC")
+@lru_cache()
+def get_settings() -> Settings:
+    return Settings()
 
 
-setting = Settings()
+setting = get_settings()
@@ -0,0 +1,89 @@
+import gzip
+import io
+import os
+from pathlib import Path
+from typing import Dict, List
+from bson import json_util
+from src.config.settings import setting
+
+ARCHIVE_FORMATS = ("ndjson.gz", "parquet")
+
+
+def encode_documents(documents: List[Dict], fmt: str) -> bytes:
+    """Serialize documents to a compressed archive payload."""
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = [{**doc, "_id": str(doc["_id"])} if "_id" in doc else doc for doc in documents]
+        # One column per key of any row, typed from all its values: from_pylist would take
+        # the schema from the first row and drop optional fields the others carry
+        keys = list(dict.fromkeys(key for row in rows for key in row))
+        table = pa.table({key: pa.array([row.get(key) for row in rows]) for key in keys})
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression="zstd")
+        return buffer.getvalue()
+    lines = "\n".join(json_util.dumps(doc) for doc in documents)
+    return gzip.compress(lines.encode("utf-8"), compresslevel=6)
+
+
+def decode_documents(data: bytes, fmt: str) -> List[Dict]:
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(io.BytesIO(data)).to_pylist()
+    text = gzip.decompress(data).decode("utf-8")
+    return [json_util.loads(line) for line in text.splitlines() if line]
+
+
+class LocalArchiveStore:
+    def __init__(self, base_dir: str):
+        self.base_dir = Path(base_dir)
+
+    def write(self, path: str, data: bytes):
+        target = self.base_dir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see a partial file
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+
+    def read(self, path: str) -> bytes:
+        return (self.base_dir / path).read_bytes()
+
+
+class S3ArchiveStore:
+    """Any S3-compatible object store (AWS, MinIO, Ceph...). Requires boto3."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str = None):
+        import boto3
+
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, path: str) -> str:
+        return f"{self.prefix}/{path}" if self.prefix else path
+
+    def write(self, path: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(path), Body=data)
+
+    def read(self, path: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(path))["Body"].read()
+
+
+_store = None
+
+
+def get_archive_store():
+    global _store
+    if _store is None:
+        if setting.ARCHIVE_BACKEND == "s3":
+            _store = S3ArchiveStore(
+                setting.ARCHIVE_S3_BUCKET,
+                setting.ARCHIVE_S3_PREFIX,
+                setting.ARCHIVE_S3_ENDPOINT_URL,
+            )
+        else:
+            _store = LocalArchiveStore(setting.ARCHIVE_DIR)
+    return _store
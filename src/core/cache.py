@@ -0,0 +1,159 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from src.config.settings import setting
+from src.core.profiling import timed
+
+
+class CachedResponse:
+    __slots__ = ("etag", "body")
+
+    def __init__(self, etag: str, body: bytes):
+        self.etag = etag
+        self.body = body
+
+
+class MemoryCacheBackend:
+    """Process-local LRU with per-entry TTL."""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, CachedResponse]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, cached = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return cached
+
+    async def set(self, key: str, cached: CachedResponse):
+        self._entries[key] = (time.monotonic() + self.ttl, cached)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def clear(self):
+        self._entries.clear()
+
+
+class RedisCacheBackend:
+    """
+    Shared cache for multiple API replicas. Invalidation bumps a generation
+    counter so stale keys are never read again and simply expire; size is
+    bounded by the TTL and the server's maxmemory/LRU policy.
+    """
+
+    def __init__(self, url: str, namespace: str, ttl: int):
+        self.url = url
+        self.namespace = namespace
+        self.ttl = ttl
+        self._redis = None
+
+    @property
+    def redis(self):
+        # Connect on first use, inside the serving event loop rather than at import
+        if self._redis is None:
+            from redis import asyncio as redis_asyncio
+
+            self._redis = redis_asyncio.from_url(self.url)
+        return self._redis
+
+    async def _generation(self) -> int:
+        return int(await self.redis.get(f"{self.namespace}:generation") or 0)
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        raw = await self.redis.hgetall(f"{self.namespace}:{await self._generation()}:{key}")
+        if not raw:
+            return None
+        return CachedResponse(raw[b"etag"].decode(), raw[b"body"])
+
+    async def set(self, key: str, cached: CachedResponse):
+        redis_key = f"{self.namespace}:{await self._generation()}:{key}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hset(redis_key, mapping={"etag": cached.etag, "body": cached.body})
+            pipe.expire(redis_key, self.ttl)
+            await pipe.execute()
+
+    async def clear(self):
+        await self.redis.incr(f"{self.namespace}:generation")
+
+
+class ResponseCache:
+    """Cache of serialized list responses keyed on the request path and normalized filter."""
+
+    def __init__(self, namespace: str, ttl: int = None, max_entries: int = None, redis_url: str = None):
+        ttl = ttl or setting.RESPONSE_CACHE_TTL
+        redis_url = redis_url or setting.RESPONSE_CACHE_REDIS_URL
+        if not redis_url and setting.WEB_CONCURRENCY > 1:
+            # A per-worker memory cache can't be invalidated from the worker handling the write
+            redis_url = setting.REDIS_URL
+        if redis_url:
+            self.backend = RedisCacheBackend(redis_url, f"response-cache:{namespace}", ttl)
+        elif setting.WEB_CONCURRENCY > 1:
+            # Several workers and no Redis at all: a zero-size LRU, i.e. caching disabled
+            self.backend = MemoryCacheBackend(ttl, 0)
+        else:
+            self.backend = MemoryCacheBackend(ttl, max_entries or setting.RESPONSE_CACHE_MAX_ENTRIES)
+
+    @staticmethod
+    def make_key(path: str, params: Dict) -> str:
+        normalized = json.dumps(jsonable_encoder(params), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(f"{path}?{normalized}".encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        return await self.backend.get(key)
+
+    async def set(self, key: str, body: bytes) -> CachedResponse:
+        cached = CachedResponse(f'"{hashlib.sha1(body).hexdigest()}"', body)
+        await self.backend.set(key, cached)
+        return cached
+
+    async def invalidate(self):
+        await self.backend.clear()
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def cached_json_response(
+        request: Request,
+        cache: ResponseCache,
+        params: Any,
+        build: Callable[[], Awaitable[BaseModel]],
+    ) -> Response:
+    """
+    Serve `build()` through `cache`. A matching If-None-Match gets a 304 and a
+    cache hit is returned as stored bytes, so neither touches Mongo or Pydantic.
+    """
+    if isinstance(params, BaseModel):
+        params = params.dict()
+    key = cache.make_key(request.url.path, params)
+    # Server-Timing shows "cache" on every request and "serialization" only on misses
+    with timed("cache"):
+        cached = await cache.get(key)
+    if cached is None:
+        model = await build()
+        with timed("serialization"):
+            body = json.dumps(jsonable_encoder(model), separators=(",", ":")).encode()
+        with timed("cache"):
+            cached = await cache.set(key, body)
+    headers = {"ETag": cached.etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+    if etag_matches(request, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
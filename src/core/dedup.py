@@ -0,0 +1,114 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from src.config.settings import setting
+from src.core.metrics import metrics
+
+# PLC payloads carry the device in "id", so only explicitly per-message fields identify a message
+MESSAGE_ID_FIELDS = tuple(setting.DEDUP_MESSAGE_ID_FIELDS)
+SEQUENCE_FIELDS = ("seq", "sequence", "seq_no")
+
+
+def parse_payload(payload) -> Any:
+    """JSON-decode a raw payload once so identity and tag decoding can share it."""
+    if isinstance(payload, (str, bytes)):
+        try:
+            return json.loads(payload)
+        except ValueError:
+            return payload
+    return payload
+
+
+def message_identity(data) -> Tuple[Optional[str], Optional[int]]:
+    """(message id, sequence number) carried in a decoded payload, either may be None."""
+    if not isinstance(data, dict):
+        return None, None
+    message_id = next((data[f] for f in MESSAGE_ID_FIELDS if data.get(f) not in (None, "")), None)
+    seq = next((data[f] for f in SEQUENCE_FIELDS if isinstance(data.get(f), int) and not isinstance(data.get(f), bool)), None)
+    return (str(message_id) if message_id is not None else None), seq
+
+
+def dedup_key(plc_id: str, message_id: Optional[str]) -> Optional[str]:
+    """
+    Key for the unique index on plc_message. Only message ids qualify:
+    sequence numbers restart with the device, so they are deduplicated in
+    memory only (see Deduplicator).
+    """
+    return f"{plc_id}|{message_id}" if message_id is not None else None
+
+
+class Deduplicator:
+    """
+    Drops redelivered messages before they are batched for storage.
+
+    Remembers the last DEDUP_MAX_KEYS message keys (message id, or sequence
+    number when there is no id) in an LRU, and the highest sequence number per
+    device. A sequence number below the highest seen that isn't a remembered
+    key is counted as out of order but kept; one more than DEDUP_SEQUENCE_RESET
+    below it means the device restarted its counter, which starts a new
+    sequence epoch so old keys can't shadow new messages.
+    """
+
+    def __init__(self, max_keys: int = None, reset_gap: int = None):
+        self.max_keys = max_keys or setting.DEDUP_MAX_KEYS
+        self.reset_gap = reset_gap or setting.DEDUP_SEQUENCE_RESET
+        self._seen: "OrderedDict[tuple, None]" = OrderedDict()
+        # plc_id -> [highest sequence, epoch]
+        self._devices: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_duplicate(
+            self,
+            plc_id: str,
+            message_id: Optional[str] = None,
+            seq: Optional[int] = None,
+            source: str = "mqtt",
+        ) -> bool:
+        metrics.inc("ingest_messages_total", source=source)
+        if message_id is None and seq is None:
+            return False
+        with self._lock:
+            device = self._devices.get(plc_id)
+            if device is None:
+                device = self._devices[plc_id] = [seq, 0]
+                if len(self._devices) > self.max_keys:
+                    self._devices.popitem(last=False)
+            else:
+                self._devices.move_to_end(plc_id)
+            highest, epoch = device
+            if seq is not None and highest is not None and highest - seq > self.reset_gap:
+                epoch = device[1] = epoch + 1
+                device[0] = highest = None
+                metrics.inc("ingest_sequence_resets_total", source=source)
+
+            key = (plc_id, "id", message_id) if message_id is not None else (plc_id, "seq", epoch, seq)
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                metrics.inc("ingest_duplicates_total", source=source)
+                return True
+            self._seen[key] = None
+            if len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+
+            if seq is not None:
+                if highest is None or seq > highest:
+                    if highest is not None and seq > highest + 1:
+                        metrics.inc("ingest_sequence_gaps_total", seq - highest - 1, source=source)
+                    device[0] = seq
+                elif seq < highest:
+                    metrics.inc("ingest_out_of_order_total", source=source)
+        return False
+
+    def forget(self, plc_id: str, message_id: Optional[str] = None, seq: Optional[int] = None):
+        """Undo is_duplicate's record of a message that was never delivered, so a redelivery is accepted."""
+        with self._lock:
+            if message_id is not None:
+                self._seen.pop((plc_id, "id", message_id), None)
+            elif seq is not None:
+                device = self._devices.get(plc_id)
+                if device is not None:
+                    self._seen.pop((plc_id, "seq", device[1], seq), None)
+
+
+deduplicator = Deduplicator()
@@ -0,0 +1,33 @@
+import asyncio
+import json
+import logging
+import urllib.error
+import urllib.request
+from typing import Any, Optional
+from src.config.settings import setting
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 2.0
+
+
+def _get(path: str) -> Optional[Any]:
+    url = f"http://{setting.INGEST_HTTP_HOST}:{setting.INGEST_HTTP_PORT}{path}"
+    try:
+        with urllib.request.urlopen(url, timeout=TIMEOUT) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        if e.code != 404:
+            logger.warning(f"Ingest process returned {e.code} for {path}")
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ingest process unreachable at {url}: {e}")
+    return None
+
+
+async def fetch_ingest(path: str) -> Optional[Any]:
+    """
+    JSON from the ingest process's local HTTP port (see
+    src.worker.ingest_process), or None when it has nothing for `path` or
+    isn't reachable.
+    """
+    return await asyncio.to_thread(_get, path)
@@ -0,0 +1,86 @@
+import threading
+from typing import Dict, List, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Minimal thread-safe counters and gauges, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+
+    @staticmethod
+    def _labels(labels: Dict) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[self._labels(labels)] = value
+
+    def add(self, name: str, value: float, **labels):
+        """Move a gauge up or down."""
+        key = self._labels(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def get(self, name: str, **labels) -> float:
+        key = self._labels(labels)
+        with self._lock:
+            for store in (self._counters, self._gauges):
+                if name in store and key in store[name]:
+                    return store[name][key]
+        return 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                name: {",".join(f"{k}={v}" for k, v in key): value for key, value in series.items()}
+                for store in (self._counters, self._gauges)
+                for name, series in store.items()
+            }
+
+    def export(self, **labels) -> Dict[str, Dict[str, List]]:
+        """
+        Every series as {kind: {name: [[labels, value], ...]}}, JSON-serializable,
+        with `labels` (e.g. the process) added to each series.
+        """
+        with self._lock:
+            return {
+                kind: {
+                    name: [[{**dict(key), **labels}, value] for key, value in series.items()]
+                    for name, series in store.items()
+                }
+                for kind, store in (("counter", self._counters), ("gauge", self._gauges))
+            }
+
+    def render_text(self, **labels) -> str:
+        return render_exports(self.export(**labels))
+
+
+def render_exports(*exports: Dict) -> str:
+    """Prometheus text for registries of several processes, each family's series grouped together."""
+    families: Dict[Tuple[str, str], List] = {}
+    for export in exports:
+        for kind in ("counter", "gauge"):
+            for name, series in export.get(kind, {}).items():
+                families.setdefault((kind, name), []).extend(series)
+    lines = []
+    for (kind, name), series in sorted(families.items(), key=lambda item: (item[0][0] != "counter", item[0][1])):
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            rendered = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+            lines.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -2,6 +2,7 @@ from typing import Dict, List, Type, TypeVar, Generic, Optional
 from pydantic import BaseModel
 from pymongo.collection import Collection
 import math
+from urllib.parse import urlencode
 from fastapi import Request
 
 ResponseSchemaType = TypeVar("ResponseSchemaType", bound=BaseModel)
@@ -93,9 +94,8 @@ class AsyncPaginator(Generic[ResponseSchemaType]):
     def build_pagination_url(self, page: int) -> str:
         """Build pagination URL."""
         url = str(self.request.url).split("?")[0]
-        query_params = self.filter.copy()
+        # Unset filters are left out: "search_mode=None" would fail validation on the next request
+        query_params = {key: value for key, value in self.filter.items() if value is not None}
         query_params["page"] = page
         query_params["limit"] = self.limit
-        return (
-            f"{url}?{'&'.join(f'{key}={value}' for key, value in query_params.items())}"
-        )
\ No newline at end of file
+        return f"{url}?{urlencode(query_params)}"
\ No newline at end of file
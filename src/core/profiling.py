@@ -0,0 +1,198 @@
+import asyncio
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from fastapi.responses import JSONResponse
+from pymongo import monitoring
+from src.config.settings import setting
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Per-request category -> seconds; the dict is shared with threads that copy the context (Motor's executor)
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_timing(category: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings[category] = timings.get(category, 0.0) + seconds
+
+
+@contextmanager
+def timed(category: str):
+    """Add the block's wall time to the current request's Server-Timing `category`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(category, time.perf_counter() - started)
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """Attributes MongoDB command time to the request that issued it."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_timing("db", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record_timing("db", event.duration_micros / 1e6)
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        with timed("serialization"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a `Server-Timing` header (db, serialization, device and total
+    milliseconds) to every HTTP response. Pure ASGI so the timings context is
+    the one the endpoint runs in.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: Dict[str, float] = {}
+        token = _timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in sorted(timings.items())]
+                parts.append(f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(parts).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> str:
+    """
+    Sample every thread's Python stack for `seconds` and return the counts in
+    collapsed format ("thread;outer;...;inner count" per line), as consumed by
+    flamegraph.pl, speedscope and similar tools. Blocking; run it on a thread.
+    """
+    me = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+async def trace_allocations(seconds: float, frames: int = 25) -> str:
+    """
+    Memory allocated and still live after `seconds` of tracing, by allocation
+    stack, in collapsed format weighted by bytes.
+    """
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        await asyncio.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+    lines = []
+    for stat in after.compare_to(before, "traceback"):
+        if stat.size_diff <= 0:
+            continue
+        stack = ";".join(f"{os.path.basename(f.filename)}:{f.lineno}" for f in stat.traceback)
+        lines.append(f"{stack} {stat.size_diff}")
+    return "\n".join(lines) + "\n"
+
+
+class _GCTimer:
+    """gc.callbacks hook: collection pauses per generation."""
+
+    def __init__(self):
+        self._started = 0.0
+
+    def __call__(self, phase, info):
+        if phase == "start":
+            self._started = time.perf_counter()
+        else:
+            generation = info["generation"]
+            metrics.inc("gc_collections_total", generation=generation)
+            metrics.inc("gc_pause_seconds_total", time.perf_counter() - self._started, generation=generation)
+            metrics.inc("gc_collected_total", info.get("collected", 0), generation=generation)
+
+
+_gc_timer: Optional[_GCTimer] = None
+
+
+def install_gc_timer():
+    global _gc_timer
+    if _gc_timer is None:
+        _gc_timer = _GCTimer()
+        gc.callbacks.append(_gc_timer)
+
+
+async def collect_runtime_metrics(interval: Optional[float] = None):
+    """Export process RSS/CPU, event-loop lag and GC state every `interval` seconds."""
+    interval = interval or setting.RUNTIME_METRICS_INTERVAL
+    install_gc_timer()
+    try:
+        import psutil
+
+        process = psutil.Process()
+    except ImportError:
+        process = None
+        logger.warning("psutil is not installed; process RSS/CPU metrics are disabled")
+
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        # How much later than asked the loop got back to us: time other callbacks held it
+        metrics.set("event_loop_lag_seconds", max(0.0, time.perf_counter() - started - interval))
+        try:
+            if process is not None:
+                with process.oneshot():
+                    metrics.set("process_resident_memory_bytes", process.memory_info().rss)
+                    metrics.set("process_cpu_percent", process.cpu_percent())
+                    metrics.set("process_threads", process.num_threads())
+            for generation, count in enumerate(gc.get_count()):
+                metrics.set("gc_pending_objects", count, generation=generation)
+            for generation, stats in enumerate(gc.get_stats()):
+                metrics.set("gc_uncollectable_objects", stats["uncollectable"], generation=generation)
+        except Exception as e:
+            logger.error(f"Runtime metrics collection failed: {e}")
@@ -0,0 +1,165 @@
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from src.config.settings import setting
+from src.core.metrics import metrics
+
+EPOCH = datetime(1970, 1, 1)
+POINT_BYTES = 16  # one float64 timestamp + one float64 value
+
+
+def to_epoch(at: datetime) -> float:
+    """Seconds since the epoch for the app's naive-UTC datetimes."""
+    return (at - EPOCH).total_seconds()
+
+
+def from_epoch(ts: float) -> datetime:
+    return EPOCH + timedelta(seconds=ts)
+
+
+class _Logical:
+    """Sequence view over a ring's timestamps in insertion order, for bisect."""
+
+    __slots__ = ("ring",)
+
+    def __init__(self, ring: "TagRing"):
+        self.ring = ring
+
+    def __len__(self):
+        return self.ring.size
+
+    def __getitem__(self, i):
+        ring = self.ring
+        return ring.times[(ring.start + i) % ring.capacity]
+
+
+class TagRing:
+    """
+    Fixed-capacity ring of (timestamp, value) for one device tag, stored in two
+    preallocated `array('d')` buffers: 16 bytes a point, no per-sample objects.
+    """
+
+    __slots__ = ("times", "values", "capacity", "start", "size", "covered_from")
+
+    def __init__(self, capacity: int, covered_from: float):
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        # Every sample at or after this time is in the ring
+        self.covered_from = covered_from
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * POINT_BYTES
+
+    def append(self, ts: float, value: float):
+        if self.size and ts < self.times[(self.start + self.size - 1) % self.capacity]:
+            # Late sample: keep the ring sorted; windows reaching back to it are answered from Mongo
+            self.covered_from = max(self.covered_from, math.nextafter(ts, math.inf))
+            return
+        index = (self.start + self.size) % self.capacity
+        self.times[index] = ts
+        self.values[index] = value
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+            self.covered_from = self.times[self.start]
+
+    def _slice(self, buffer: array, lo: int, hi: int) -> array:
+        """Logical [lo, hi) as one contiguous array; at most two C-level slice copies."""
+        first, last = (self.start + lo) % self.capacity, (self.start + hi) % self.capacity
+        if hi - lo <= 0:
+            return array("d")
+        if first < last or last == 0:
+            return buffer[first:last or self.capacity]
+        return buffer[first:] + buffer[:last]
+
+    def range(self, since: float, until: float) -> Tuple[array, array]:
+        view = _Logical(self)
+        lo = bisect_left(view, since)
+        hi = bisect_right(view, until)
+        return self._slice(self.times, lo, hi), self._slice(self.values, lo, hi)
+
+
+class RecentStore:
+    """
+    Recent history per (plc_id, tag) for short-window trend queries, fed by
+    the process that receives telemetry. Total buffer memory is capped at
+    RECENT_STORE_MAX_BYTES; devices whose tags were least recently written
+    or read are evicted first. A query is only answered from memory when the
+    rings cover the whole window, otherwise the caller falls back to Mongo.
+    """
+
+    def __init__(self, points_per_tag: int = None, max_bytes: int = None):
+        self.points_per_tag = points_per_tag or setting.RECENT_STORE_POINTS
+        self.max_bytes = max_bytes or setting.RECENT_STORE_MAX_BYTES
+        self._rings: "OrderedDict[Tuple[str, str], TagRing]" = OrderedDict()
+        self._device_tags: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, plc_id: str, tags: Dict[str, float], at: datetime):
+        if not tags:
+            return
+        ts = to_epoch(at)
+        with self._lock:
+            for tag, value in tags.items():
+                key = (plc_id, tag)
+                ring = self._rings.get(key)
+                if ring is None:
+                    ring = self._create(key, ts)
+                else:
+                    self._rings.move_to_end(key)
+                ring.append(ts, value)
+
+    def _create(self, key: Tuple[str, str], ts: float) -> TagRing:
+        ring = TagRing(self.points_per_tag, ts)
+        self._rings[key] = ring
+        self._device_tags.setdefault(key[0], set()).add(key[1])
+        self._bytes += ring.nbytes
+        while self._bytes > self.max_bytes:
+            # Evict the coldest tag's whole device, so a device is either fully in memory or not at all
+            plc_id = next((cold for cold, _ in self._rings if cold != key[0]), None)
+            if plc_id is None:
+                break
+            for name in self._device_tags.pop(plc_id, ()):
+                self._bytes -= self._rings.pop((plc_id, name)).nbytes
+            metrics.inc("recent_store_evictions_total")
+        metrics.set("recent_store_bytes", self._bytes)
+        metrics.set("recent_store_tags", len(self._rings))
+        return ring
+
+    def query(
+            self,
+            plc_id: str,
+            since: datetime,
+            until: Optional[datetime] = None,
+            tag: Optional[str] = None,
+        ) -> Optional[Dict[str, Tuple[array, array]]]:
+        """tag -> (timestamps, values) in [since, until], or None when memory doesn't cover the window."""
+        since_ts = to_epoch(since)
+        until_ts = to_epoch(until) if until else float("inf")
+        with self._lock:
+            tags: List[str] = [tag] if tag else sorted(self._device_tags.get(plc_id, ()))
+            if not tags:
+                return None
+            result = {}
+            for name in tags:
+                ring = self._rings.get((plc_id, name))
+                if ring is None or ring.covered_from > since_ts:
+                    metrics.inc("recent_store_misses_total")
+                    return None
+                self._rings.move_to_end((plc_id, name))
+                result[name] = ring.range(since_ts, until_ts)
+        metrics.inc("recent_store_hits_total")
+        return result
+
+
+recent_store = RecentStore()
@@ -0,0 +1,242 @@
+import re
+import time
+from typing import Dict, List, Optional, Set
+from pymongo import ASCENDING, UpdateOne
+from pymongo.collection import Collection
+
+SEARCH_MODES = ("prefix", "ngram", "trie")
+NGRAM_SIZE = 3
+# Seconds before a process reloads its trie, picking up devices registered through other processes
+TRIE_TTL = 60.0
+# Above this many matching ids a trie search becomes an indexed prefix query instead of a huge $in
+TRIE_MAX_IDS = 1000
+
+
+def normalize(value: Optional[str]) -> str:
+    """Normalize a search term / device id the same way on write and on read."""
+    return (value or "").strip().casefold()
+
+
+def lower_field(field: str) -> str:
+    return f"{field}_lower"
+
+
+def ngram_field(field: str) -> str:
+    return f"{field}_ngrams"
+
+
+def ngrams(value: Optional[str], size: int = NGRAM_SIZE) -> List[str]:
+    """Distinct n-grams of the normalized value, used for substring search."""
+    value = normalize(value)
+    if len(value) < size:
+        return [value] if value else []
+    return sorted({value[i:i + size] for i in range(len(value) - size + 1)})
+
+
+def search_fields(field: str, value: Optional[str], ngram: bool = True) -> Dict:
+    """Derived fields to store next to `field` so searches can use an index."""
+    fields = {lower_field(field): normalize(value)}
+    if ngram:
+        fields[ngram_field(field)] = ngrams(value)
+    return fields
+
+
+async def ensure_search_indexes(collection: Collection, field: str, ngram: bool = True):
+    """
+    Create the indexes backing prefix and (optionally) n-gram search. High
+    write-rate collections skip the n-gram multikey index; stale n-gram / text
+    indexes left on them by older releases are dropped.
+    """
+    await collection.create_index([(lower_field(field), ASCENDING)])
+    existing = await collection.index_information()
+    if ngram:
+        await collection.create_index([(ngram_field(field), ASCENDING)])
+    elif f"{ngram_field(field)}_1" in existing:
+        await collection.drop_index(f"{ngram_field(field)}_1")
+    if f"{field}_text" in existing:
+        await collection.drop_index(f"{field}_text")
+
+
+async def backfill_search_fields(
+        collection: Collection,
+        field: str,
+        ngram: bool = True,
+        limit: int = 10000,
+        batch_size: int = 1000,
+    ) -> int:
+    """
+    Populate derived search fields on up to `limit` documents written before
+    they existed; returns how many were updated, so callers can run it again
+    until it reaches 0.
+    """
+    updated = 0
+    operations = []
+    cursor = collection.find(
+        {lower_field(field): {"$exists": False}, field: {"$type": "string"}},
+        {field: 1},
+    ).limit(limit)
+    async for doc in cursor:
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": search_fields(field, doc[field], ngram)}))
+        if len(operations) >= batch_size:
+            result = await collection.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+    if operations:
+        result = await collection.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+    return updated
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_query(field: str, search: str) -> Dict:
+    """Anchored prefix match expressed as an index range on the lowercase field."""
+    term = normalize(search)
+    if not term:
+        return {}
+    return {lower_field(field): {"$gte": term, "$lt": _prefix_upper_bound(term)}}
+
+
+def ngram_query(field: str, search: str) -> Dict:
+    """
+    Substring match: every n-gram must be present (n-gram multikey index),
+    then verify on the lowercase field.
+    """
+    term = normalize(search)
+    if len(term) < NGRAM_SIZE:
+        return prefix_query(field, search)
+    return {
+        ngram_field(field): {"$all": ngrams(term)},
+        lower_field(field): {"$regex": re.escape(term)},
+    }
+
+
+def matches_search(value: Optional[str], search: Optional[str], mode: Optional[str] = "prefix") -> bool:
+    """In-process equivalent of build_search_query for data that is not in Mongo (e.g. archives)."""
+    if not search:
+        return True
+    value, term = normalize(value), normalize(search)
+    if mode == "ngram":
+        return term in value
+    return value.startswith(term)
+
+
+class DeviceIdTrie:
+    """In-memory prefix tree of device ids, keyed by their normalized form."""
+
+    __slots__ = ("_root", "_size", "loaded_at")
+
+    def __init__(self):
+        self._root: Dict = {}
+        self._size = 0
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def insert(self, device_id: str):
+        node = self._root
+        for char in normalize(device_id):
+            node = node.setdefault(char, {})
+        ids: Set[str] = node.setdefault(None, set())
+        if device_id not in ids:
+            ids.add(device_id)
+            self._size += 1
+
+    def remove(self, device_id: str):
+        node = self._root
+        for char in normalize(device_id):
+            node = node.get(char)
+            if node is None:
+                return
+        ids = node.get(None)
+        if ids and device_id in ids:
+            ids.discard(device_id)
+            self._size -= 1
+
+    def starts_with(self, prefix: str, limit: int = TRIE_MAX_IDS) -> List[str]:
+        """
+        Sorted ids under `prefix`. Stops collecting once `limit` are found, so
+        a result of `limit` ids may be incomplete: ask for one more than you
+        can use to tell.
+        """
+        node = self._root
+        for char in normalize(prefix):
+            node = node.get(char)
+            if node is None:
+                return []
+        found: List[str] = []
+        stack = [node]
+        while stack and len(found) < limit:
+            current = stack.pop()
+            for key, child in current.items():
+                if key is None:
+                    found.extend(child)
+                else:
+                    stack.append(child)
+        return sorted(found[:limit])
+
+
+_tries: Dict[str, DeviceIdTrie] = {}
+
+
+async def get_trie(source: Collection, field: str) -> DeviceIdTrie:
+    """
+    Trie of all `field` values in the (small) device registry collection.
+    Writes through this process update it in place; it is reloaded every
+    TRIE_TTL seconds to pick up writes made by other processes.
+    """
+    key = f"{source.name}.{field}"
+    trie = _tries.get(key)
+    if trie is None or time.monotonic() - trie.loaded_at > TRIE_TTL:
+        trie = DeviceIdTrie()
+        for value in await source.distinct(field):
+            if isinstance(value, str) and value:
+                trie.insert(value)
+        _tries[key] = trie
+    return trie
+
+
+def trie_insert(source: Collection, field: str, value: Optional[str]):
+    trie = _tries.get(f"{source.name}.{field}")
+    if trie is not None and value:
+        trie.insert(value)
+
+
+def trie_remove(source: Collection, field: str, value: Optional[str]):
+    trie = _tries.get(f"{source.name}.{field}")
+    if trie is not None and value:
+        trie.remove(value)
+
+
+async def build_search_query(
+        field: str,
+        search: Optional[str],
+        mode: Optional[str] = "prefix",
+        trie_source: Optional[Collection] = None,
+        substring: bool = True,
+    ) -> Dict:
+    """
+    Build an index-friendly filter for `search` on `field`.
+
+    - prefix: anchored, case-insensitive prefix on the normalized field
+    - ngram: case-insensitive substring via the n-gram multikey index; on
+      collections without one (`substring=False`) this is a prefix search
+    - trie: resolve matching ids from the in-memory trie, then an `$in` on
+      `field`; prefixes matching more than TRIE_MAX_IDS ids use prefix instead
+    """
+    if not search:
+        return {}
+    mode = mode or "prefix"
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unsupported search mode '{mode}', expected one of {SEARCH_MODES}.")
+    if mode == "ngram" and substring:
+        return ngram_query(field, search)
+    if mode == "trie" and trie_source is not None:
+        trie = await get_trie(trie_source, field)
+        ids = trie.starts_with(search, TRIE_MAX_IDS + 1)
+        if len(ids) <= TRIE_MAX_IDS:
+            return {field: {"$in": ids}}
+    return prefix_query(field, search)
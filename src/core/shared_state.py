@@ -0,0 +1,242 @@
+import logging
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterator, Optional, Tuple
+from src.config.settings import setting
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PLCHOT01"
+# magic, slot count, key bytes, value bytes, live flag
+TABLE_HEADER = struct.Struct("<8sIIII")
+LIVE = struct.Struct("<I")
+LIVE_OFFSET = TABLE_HEADER.size - LIVE.size
+# seq, key length, value length, updated_at (epoch seconds)
+SLOT_HEADER = struct.Struct("<IHId")
+SEQ = struct.Struct("<I")
+# Reads give up on a slot whose writer never finished (the ingest process died mid-update)
+READ_RETRIES = 10000
+# Timestamps are naive UTC throughout the app; store them as seconds since this epoch
+EPOCH = datetime(1970, 1, 1)
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach without registering the segment with the resource tracker, as
+    track=False does on Python 3.13+. Before 3.13 attaching registers it, and
+    the tracker unlinks the owner's table when this process exits. Undoing
+    that with unregister is not safe either: processes spawned from the same
+    parent share one tracker, so it would drop the owner's own registration.
+    """
+    register = resource_tracker.register
+
+    def register_except_shared_memory(resource: str, rtype: str):
+        if rtype != "shared_memory":
+            register(resource, rtype)
+
+    resource_tracker.register = register_except_shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class HotStateTable:
+    """
+    Latest telemetry value per device in a fixed-size shared memory table.
+
+    One process (the ingest owner) writes; any number of API workers attach
+    and read in place. Slots are found by open addressing on crc32(plc_id)
+    and guarded by a seqlock: the writer makes the sequence odd while it
+    updates a slot and even again afterwards, and readers retry when the
+    sequence was odd or changed under them. Readers never take a lock, so
+    reads scale with the number of workers. Devices are never removed; values
+    longer than the slot are truncated.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.buf = shm.buf
+        magic, self.slots, self.key_size, self.value_size, _ = TABLE_HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Shared memory {shm.name!r} is not a hot state table")
+        self.slot_size = SLOT_HEADER.size + self.key_size + self.value_size
+        # Writer-side index of assigned slots; readers probe the table itself
+        self._index: Dict[str, int] = {}
+
+    @classmethod
+    def create(cls, name: str, slots: int, key_size: int = 64, value_size: int = 1024) -> "HotStateTable":
+        size = TABLE_HEADER.size + slots * (SLOT_HEADER.size + key_size + value_size)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by an ingest process that didn't shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            # Readers still attached to it only re-attach once they see it retired
+            if stale.size >= TABLE_HEADER.size:
+                LIVE.pack_into(stale.buf, LIVE_OFFSET, 0)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        TABLE_HEADER.pack_into(shm.buf, 0, MAGIC, slots, key_size, value_size, 1)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "HotStateTable":
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            shm = _attach_untracked(name)
+        return cls(shm, owner=False)
+
+    def _offset(self, slot: int) -> int:
+        return TABLE_HEADER.size + slot * self.slot_size
+
+    def _probe(self, key: bytes) -> Iterator[int]:
+        start = zlib.crc32(key) % self.slots
+        for i in range(self.slots):
+            yield (start + i) % self.slots
+
+    def put(self, plc_id: str, message: str, at: Optional[datetime] = None):
+        if not self.owner:
+            raise PermissionError("Only the process that created the hot state table may write to it")
+        key = plc_id.encode("utf-8")[:self.key_size]
+        value = message.encode("utf-8") if isinstance(message, str) else bytes(message)
+        value = value[:self.value_size]
+        slot = self._index.get(plc_id)
+        if slot is None:
+            slot = self._assign(key)
+            if slot is None:
+                logger.warning(f"Hot state table full, dropping latest value for {plc_id}")
+                return
+            self._index[plc_id] = slot
+
+        offset = self._offset(slot)
+        buf = self.buf
+        seq = SEQ.unpack_from(buf, offset)[0]
+        SEQ.pack_into(buf, offset, seq + 1)
+        updated_at = ((at or datetime.utcnow()) - EPOCH).total_seconds()
+        SLOT_HEADER.pack_into(buf, offset, seq + 1, len(key), len(value), updated_at)
+        key_at = offset + SLOT_HEADER.size
+        buf[key_at:key_at + len(key)] = key
+        value_at = key_at + self.key_size
+        buf[value_at:value_at + len(value)] = value
+        SEQ.pack_into(buf, offset, seq + 2)
+
+    def _assign(self, key: bytes) -> Optional[int]:
+        for slot in self._probe(key):
+            offset = self._offset(slot)
+            key_len = SLOT_HEADER.unpack_from(self.buf, offset)[1]
+            if key_len == 0:
+                return slot
+        return None
+
+    def _read(self, slot: int, key: Optional[bytes] = None):
+        """
+        (key, value, updated_at) of a slot, None if empty; "miss" when `key` is
+        given and differs, "busy" when no consistent read was possible.
+        """
+        offset = self._offset(slot)
+        buf = self.buf
+        for _ in range(READ_RETRIES):
+            seq, key_len, value_len, ts = SLOT_HEADER.unpack_from(buf, offset)
+            if seq & 1:
+                time.sleep(0)
+                continue
+            if key_len == 0:
+                result = None
+            else:
+                key_at = offset + SLOT_HEADER.size
+                stored = buf[key_at:key_at + key_len]
+                if key is not None and stored != key:
+                    result = "miss"
+                else:
+                    value_at = key_at + self.key_size
+                    result = (bytes(stored), bytes(buf[value_at:value_at + value_len]), ts)
+            if SEQ.unpack_from(buf, offset)[0] == seq:
+                return result
+        return "busy"
+
+    def get(self, plc_id: str) -> Optional[Tuple[str, datetime]]:
+        key = plc_id.encode("utf-8")[:self.key_size]
+        for slot in self._probe(key):
+            found = self._read(slot, key)
+            if found is None or found == "busy":
+                return None
+            if found != "miss":
+                return found[1].decode("utf-8", "replace"), EPOCH + timedelta(seconds=found[2])
+        return None
+
+    def items(self) -> Iterator[Tuple[str, str, datetime]]:
+        for slot in range(self.slots):
+            found = self._read(slot)
+            if found and found != "busy":
+                yield found[0].decode("utf-8", "replace"), found[1].decode("utf-8", "replace"), EPOCH + timedelta(seconds=found[2])
+
+    @property
+    def live(self) -> bool:
+        """False once the owner has retired this segment; readers should re-attach."""
+        return bool(LIVE.unpack_from(self.buf, LIVE_OFFSET)[0])
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+    def retire(self):
+        """Mark the segment dead for attached readers, then release and remove it."""
+        LIVE.pack_into(self.buf, LIVE_OFFSET, 0)
+        self.close()
+        self.unlink()
+
+
+_table: Optional[HotStateTable] = None
+
+
+def create_hot_state() -> HotStateTable:
+    """Called by the process that owns ingest; its MQTT callback publishes into the table."""
+    global _table
+    _table = HotStateTable.create(
+        setting.HOT_STATE_NAME, setting.HOT_STATE_SLOTS, value_size=setting.HOT_STATE_VALUE_BYTES
+    )
+    return _table
+
+
+def get_hot_state() -> Optional[HotStateTable]:
+    """
+    The table, attached on first use; None until the ingest process has created
+    it. A table retired by a restarted ingest process is swapped for the new one.
+    """
+    global _table
+    if _table is not None and not _table.owner and not _table.live:
+        _table.close()
+        _table = None
+    if _table is None:
+        try:
+            _table = HotStateTable.attach(setting.HOT_STATE_NAME)
+        except FileNotFoundError:
+            return None
+    return _table
+
+
+def publish_latest(plc_id: str, message: str, at: Optional[datetime] = None):
+    if _table is not None and _table.owner:
+        _table.put(plc_id, message, at)
+
+
+def close_hot_state():
+    global _table
+    if _table is not None:
+        table, _table = _table, None
+        if table.owner:
+            table.retire()
+        else:
+            table.close()
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional
+from src.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TaskBatcher:
+    """
+    Bundle many small items into one Celery message.
+
+    Items are buffered in the producer process and sent as a single
+    `task.apply_async(args=[items])` when `max_size` items are queued or
+    `max_wait` seconds have passed since the first one, whichever is first.
+
+    A batch the broker didn't accept is kept and retried, in order, every
+    `retry_interval` seconds; while any are waiting, new batches queue behind
+    them. Only when more than `max_pending` items are waiting is the oldest
+    batch dropped, and handed to `on_dropped`.
+    """
+
+    def __init__(
+            self,
+            task,
+            max_size: int = 500,
+            max_wait: float = 1.0,
+            max_pending: int = 100000,
+            retry_interval: float = 2.0,
+            on_dropped: Optional[Callable[[List[Any]], None]] = None,
+        ):
+        self.task = task
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.retry_interval = retry_interval
+        self.on_dropped = on_dropped
+        self._items: List[Any] = []
+        self._first_at = 0.0
+        self._pending: Deque[List[Any]] = deque()
+        self._pending_items = 0
+        self._next_retry = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._flusher = None
+
+    def start(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name="task-batcher", daemon=True)
+            self._flusher.start()
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+        self.retry_pending()
+        if self._pending:
+            logger.error(f"Stopping with {self._pending_items} unpublished items for {self.task.name}")
+
+    def add(self, item: Any):
+        with self._lock:
+            if not self._items:
+                self._first_at = time.monotonic()
+            self._items.append(item)
+            if len(self._items) < self.max_size:
+                return
+            batch, self._items = self._items, []
+        self._send(batch)
+
+    def flush(self):
+        with self._lock:
+            batch, self._items = self._items, []
+        if batch:
+            self._send(batch)
+
+    def _run(self):
+        while not self._stopped.wait(self.max_wait / 4):
+            with self._lock:
+                due = self._items and time.monotonic() - self._first_at >= self.max_wait
+                retry = self._pending and time.monotonic() >= self._next_retry
+            if due:
+                self.flush()
+            if retry:
+                self.retry_pending()
+
+    def _publish(self, batch: List[Any]) -> bool:
+        try:
+            self.task.apply_async(args=[batch])
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to publish batch of {len(batch)} items to {self.task.name}: {e}")
+            return False
+
+    def _send(self, batch: List[Any]):
+        with self._lock:
+            # Keep order: while earlier batches wait for the broker, queue behind them
+            waiting = bool(self._pending)
+        if waiting or not self._publish(batch):
+            self._hold(batch)
+
+    def _hold(self, batch: List[Any]):
+        dropped = []
+        with self._lock:
+            if not self._pending:
+                self._next_retry = time.monotonic() + self.retry_interval
+            self._pending.append(batch)
+            self._pending_items += len(batch)
+            while self._pending_items > self.max_pending and len(self._pending) > 1:
+                oldest = self._pending.popleft()
+                self._pending_items -= len(oldest)
+                dropped.append(oldest)
+            metrics.set("task_batcher_pending_items", self._pending_items, task=self.task.name)
+        for oldest in dropped:
+            logger.error(f"Dropping batch of {len(oldest)} items for {self.task.name}: broker unavailable")
+            metrics.inc("task_batcher_dropped_items_total", len(oldest), task=self.task.name)
+            if self.on_dropped is not None:
+                self.on_dropped(oldest)
+
+    def retry_pending(self):
+        """Publish waiting batches oldest first; stop at the first one the broker still refuses."""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch = self._pending[0]
+            if not self._publish(batch):
+                with self._lock:
+                    self._next_retry = time.monotonic() + self.retry_interval
+                return
+            with self._lock:
+                if self._pending and self._pending[0] is batch:
+                    self._pending.popleft()
+                    self._pending_items -= len(batch)
+                metrics.set("task_batcher_pending_items", self._pending_items, task=self.task.name)
@@ -1,4 +1,7 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown, worker_ready, worker_shutdown
+from kombu import Queue
+from kombu.common import Broadcast
 from src.config.settings import setting
 
 # Initialize Celery app
@@ -18,14 +21,92 @@ celery_app.conf.update(
     broker_connection_retry_on_startup=True
 )
 
+# Queues and routing
+# Run one worker pool per queue so each can be sized independently, e.g.
+#   celery -A src.worker.celery_worker worker -Q ingest,ingest_broadcast -n ingest@%h --concurrency=8
+#   celery -A src.worker.celery_worker worker -Q commands --concurrency=2 --prefetch-multiplier=1
+#   celery -A src.worker.celery_worker worker -Q rollups  --concurrency=2
+celery_app.conf.update(
+    task_queues=(
+        Queue("ingest"),
+        # Fan-out: every ingest node gets the polling tick and handles its own shard
+        Broadcast("ingest_broadcast"),
+        Queue("commands"),
+        Queue("rollups"),
+    ),
+    task_default_queue="ingest",
+    task_routes={
+        "src.app.plc_module.tasks.receive_message": {"queue": "ingest_broadcast", "exchange": "ingest_broadcast"},
+        "src.app.plc_module.tasks.process_plc_message*": {"queue": "ingest"},
+        "src.app.plc_module.tasks.send_plc_command": {"queue": "commands"},
+        # Background data maintenance shares the low-priority rollups workers
+        "src.app.plc_module.tasks.backfill_search": {"queue": "rollups"},
+        "src.app.retention_module.tasks.*": {"queue": "rollups"},
+        "src.app.replay_module.tasks.*": {"queue": "rollups"},
+    },
+    # Ack after the task finishes so a crashed worker's batch is redelivered
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # Batches are large; don't let one process hoard more than it can work on
+    worker_prefetch_multiplier=setting.CELERY_PREFETCH_MULTIPLIER,
+    task_ignore_result=True,
+)
+
+# One event loop and Motor client per worker process, shared by all its tasks
+@worker_process_init.connect
+def start_async_runtime(**kwargs):
+    from src.worker.runtime import runtime
+    runtime.start()
+
+
+@worker_process_shutdown.connect
+def stop_async_runtime(**kwargs):
+    from src.worker.runtime import runtime
+    runtime.stop()
+
+
+@worker_ready.connect
+def join_shard_ring(sender=None, **kwargs):
+    # Heartbeat from the main worker process, independent of how long polls take.
+    # Only nodes that get the polling tick may own partitions.
+    from src.worker.sharding import start_heartbeat
+    consumed = {queue.alias or queue.name for queue in sender.task_consumer.queues}
+    if "ingest_broadcast" in consumed:
+        start_heartbeat(sender.hostname)
+
+
+@worker_shutdown.connect
+def leave_shard_ring(sender=None, **kwargs):
+    # Hand our partitions over now instead of after SHARD_MEMBER_TTL
+    from src.worker.sharding import coordinator, stop_heartbeat
+    stop_heartbeat()
+    try:
+        coordinator.leave(sender.hostname)
+    except Exception:
+        pass
+
+
 # Auto-discover tasks from modules
-celery_app.autodiscover_tasks(["src.app.plc_module.tasks"])
+celery_app.autodiscover_tasks(["src.app.plc_module.tasks", "src.app.retention_module.tasks", "src.app.replay_module.tasks"])
 
 # Celery Beat (Periodic Tasks)
 celery_app.conf.beat_schedule = {
     "fetch-plc-messages-every-5-seconds": {
         "task": "src.app.plc_module.tasks.receive_message",
         "schedule": 5.0,
+        # Drop ticks nobody picked up in time instead of running a backlog of them
+        "options": {"expires": 5.0},
+    },
+    "apply-retention-hourly": {
+        "task": "src.app.retention_module.tasks.apply_retention",
+        "schedule": 3600.0,
+        "options": {"expires": 3600.0},
+    },
+    # Catches up documents written before search fields existed; a no-op once done
+    "backfill-search-fields-every-10-minutes": {
+        "task": "src.app.plc_module.tasks.backfill_search",
+        "schedule": 600.0,
+        "options": {"expires": 600.0},
     },
     # "fetch-multiple-plcs-every-second": {
     #     "task": "src.app.plc_module.tasks.fetch_all_plc_messages",
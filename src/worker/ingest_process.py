@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from src.config import mongo_db
+from src.config.settings import setting
+from src.core.metrics import metrics
+from src.core.recent_store import from_epoch, recent_store
+from src.core.shared_state import close_hot_state, create_hot_state
+
+logger = logging.getLogger(__name__)
+
+PROCESS_LABEL = "ingest"
+
+
+class IngestRequestHandler(BaseHTTPRequestHandler):
+    """
+    Read-only view of state that lives only in the ingest process, for the API
+    workers on the same host: GET /metrics (Prometheus text), /metrics.json
+    (the registry export) and /trend/{plc_id}?since=&tag= (ring buffer
+    columns, 404 when the rings don't cover the window).
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path
+        if path.startswith("/trend/"):
+            self._trend(unquote(path[len("/trend/"):]), parse_qs(url.query))
+        elif path == "/metrics":
+            self._send(200, metrics.render_text(process=PROCESS_LABEL).encode("utf-8"), "text/plain; version=0.0.4")
+        elif path == "/metrics.json":
+            self._send(200, json.dumps(metrics.export(process=PROCESS_LABEL)).encode("utf-8"))
+        else:
+            self._send(404, b"null")
+
+    def _trend(self, plc_id: str, query: dict):
+        try:
+            since = from_epoch(float(query["since"][0]))
+        except (KeyError, ValueError):
+            return self._send(400, b"null")
+        columns = recent_store.query(plc_id, since, tag=query.get("tag", [None])[0])
+        if columns is None:
+            return self._send(404, b"null")
+        body = {name: [times.tolist(), values.tolist()] for name, (times, values) in columns.items()}
+        self._send(200, json.dumps(body).encode("utf-8"))
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((setting.INGEST_HTTP_HOST, setting.INGEST_HTTP_PORT), IngestRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ingest-http", daemon=True).start()
+    return server
+
+
+async def run_ingest():
+    """
+    Own the MQTT connection for a multi-worker deployment: evaluate alarms,
+    batch samples to Celery and publish the latest value per device into the
+    shared memory table the API workers read from. Metrics and trends from
+    the ring buffers are served on INGEST_HTTP_PORT.
+    """
+    from src.config.mqtt_client import start_mqtt, stop_mqtt
+    from src.app.alarm_module.controller import refresh_rules_periodically
+    from src.core.profiling import collect_runtime_metrics
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    create_hot_state()
+    server = start_http_server()
+    background_tasks = [
+        asyncio.create_task(refresh_rules_periodically()),
+        asyncio.create_task(collect_runtime_metrics()),
+    ]
+    await asyncio.to_thread(start_mqtt)
+    logger.info("Ingest process started")
+    try:
+        await stop.wait()
+    finally:
+        stop_mqtt()
+        server.shutdown()
+        server.server_close()
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        close_hot_state()
+        await mongo_db.close()
+        logger.info("Ingest process stopped")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_ingest())
+
+
+def start_ingest_process() -> multiprocessing.Process:
+    # spawn: a fresh interpreter rather than a fork of the supervisor's state
+    process = multiprocessing.get_context("spawn").Process(target=main, name="plc-ingest")
+    process.start()
+    return process
+
+
+class IngestSupervisor:
+    """
+    Keeps the ingest process running for the lifetime of the server: a
+    watchdog thread restarts it whenever it exits, backing off up to
+    MAX_BACKOFF seconds while it keeps dying early.
+    """
+
+    CHECK_INTERVAL = 1.0
+    MAX_BACKOFF = 60.0
+
+    def __init__(self):
+        self.process = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name="ingest-watchdog", daemon=True)
+
+    def start(self):
+        self.process = start_ingest_process()
+        self._thread.start()
+
+    def _watch(self):
+        delay = self.CHECK_INTERVAL
+        started = time.monotonic()
+        while not self._stop.wait(self.CHECK_INTERVAL):
+            if self.process.is_alive():
+                continue
+            # One that ran a while crashed for a new reason; restart it straight away
+            if time.monotonic() - started > self.MAX_BACKOFF:
+                delay = self.CHECK_INTERVAL
+            logger.error(f"Ingest process exited with code {self.process.exitcode}, restarting in {delay:.0f}s")
+            if self._stop.wait(delay):
+                return
+            self.process = start_ingest_process()
+            started = time.monotonic()
+            delay = min(delay * 2, self.MAX_BACKOFF)
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(timeout=timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import functools
+import logging
+import uuid
+from typing import Optional
+from src.config.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Delete the key only if it still holds our token, so an expired lock that was
+# re-acquired by another worker is never released by the previous holder.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingletonLock:
+    """Redis `SET NX EX` lock guarding a task against overlapping runs."""
+
+    def __init__(self, name: str, timeout: int):
+        self.key = f"celery-lock:{name}"
+        self.timeout = timeout
+        self.token: Optional[str] = None
+
+    def acquire(self) -> bool:
+        token = uuid.uuid4().hex
+        if get_redis().set(self.key, token, nx=True, ex=self.timeout):
+            self.token = token
+            return True
+        return False
+
+    def release(self):
+        if self.token:
+            get_redis().eval(_RELEASE_SCRIPT, 1, self.key, self.token)
+            self.token = None
+
+
+def singleton(timeout: int = 60, key: Optional[str] = None):
+    """
+    Skip a task run while a previous run of the same task still holds the lock.
+    `timeout` bounds how long a crashed run can block the next one.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            lock = SingletonLock(key or f"{func.__module__}.{func.__name__}", timeout)
+            if not lock.acquire():
+                logger.info(f"Skipping {lock.key}: previous run still in progress")
+                return None
+            try:
+                return func(*args, **kwargs)
+            finally:
+                lock.release()
+        return wrapper
+    return decorator
@@ -0,0 +1,87 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Awaitable, Optional, TypeVar
+from src.config import mongo_db
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncRuntime:
+    """
+    One long-lived event loop per worker process, run on a daemon thread.
+
+    Celery tasks are synchronous; instead of `asyncio.run()` per task (a new
+    loop each time, and a Motor client bound to whichever loop used it first)
+    they submit coroutines here, so the loop and Motor's connection pool
+    persist across tasks.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.loop is not None and self.loop.is_running()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            # A client inherited through fork belongs to the parent; build a fresh one on our loop
+            mongo_db.reset_client()
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="async-runtime", daemon=True)
+            self._thread.start()
+            started.wait()
+            self.loop = loop
+        try:
+            self.run(mongo_db.connect())
+        except Exception as e:
+            logger.error(f"Could not warm up MongoDB connection pool: {e}")
+        logger.info("Async runtime started")
+
+    def stop(self, timeout: float = 10.0):
+        with self._lock:
+            if not self.running:
+                return
+            loop, self.loop = self.loop, None
+            asyncio.run_coroutine_threadsafe(mongo_db.close(), loop).result(timeout)
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout)
+            loop.close()
+            self._thread = None
+        logger.info("Async runtime stopped")
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Run `coro` on the runtime loop and block until it finishes. On
+        `timeout` the coroutine is cancelled, not left running on the loop.
+        """
+        if not self.running:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+runtime = AsyncRuntime()
+
+
+def run_async(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    return runtime.run(coro, timeout)
@@ -0,0 +1,140 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from typing import Iterable, List, Optional, Set
+from src.config.redis_client import get_redis
+from src.config.settings import setting
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_KEY = "plc:shard:members"
+
+
+def partition_for(key: str) -> int:
+    """Stable partition of a device id; stored on the device so owners can query by it."""
+    return zlib.crc32(key.encode("utf-8")) % setting.SHARD_PARTITIONS
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes; adding or removing a member moves ~1/N of the keys."""
+
+    def __init__(self, members: Iterable[str], vnodes: int = 64):
+        self.members = sorted(set(members))
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        ring = sorted(
+            (self._hash(f"{member}#{i}"), member)
+            for member in self.members
+            for i in range(vnodes)
+        )
+        for point, member in ring:
+            self._points.append(point)
+            self._owners.append(member)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class ShardCoordinator:
+    """
+    Membership through Redis heartbeats (a sorted set scored by last-seen
+    time). Members that miss SHARD_MEMBER_TTL seconds of heartbeats drop out
+    and the ring is rebuilt, so partitions rebalance without coordination.
+    """
+
+    def __init__(self, ttl: float = None, vnodes: int = 64):
+        self.ttl = ttl or setting.SHARD_MEMBER_TTL
+        self.vnodes = vnodes
+        self._ring = HashRing([], vnodes)
+
+    def heartbeat(self, worker_id: str):
+        get_redis().zadd(MEMBERS_KEY, {worker_id: time.time()})
+
+    def leave(self, worker_id: str):
+        get_redis().zrem(MEMBERS_KEY, worker_id)
+
+    def live_members(self) -> List[str]:
+        redis = get_redis()
+        redis.zremrangebyscore(MEMBERS_KEY, "-inf", time.time() - self.ttl)
+        return [member.decode() if isinstance(member, bytes) else member for member in redis.zrange(MEMBERS_KEY, 0, -1)]
+
+    def ring(self) -> HashRing:
+        members = self.live_members()
+        if members != self._ring.members:
+            logger.info(f"Shard membership changed: {self._ring.members} -> {members}")
+            self._ring = HashRing(members, self.vnodes)
+        return self._ring
+
+    def owned_partitions(self, worker_id: str) -> Set[int]:
+        """
+        Heartbeat, then return the partitions this worker currently owns. The
+        Heartbeat thread keeps the membership alive between calls.
+        """
+        self.heartbeat(worker_id)
+        ring = self.ring()
+        return {p for p in range(setting.SHARD_PARTITIONS) if ring.owner(str(p)) == worker_id}
+
+
+class Heartbeat:
+    """
+    Renews a member's heartbeat every third of SHARD_MEMBER_TTL from a daemon
+    thread, so a long poll can't make the node drop out of the ring.
+    """
+
+    def __init__(self, worker_id: str, shards: ShardCoordinator):
+        self.worker_id = worker_id
+        self.shards = shards
+        self.interval = shards.ttl / 3
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shard-heartbeat", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.shards.heartbeat(self.worker_id)
+            except Exception as e:
+                logger.warning(f"Shard heartbeat for {self.worker_id} failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=self.interval)
+
+
+coordinator = ShardCoordinator()
+_heartbeat: Optional[Heartbeat] = None
+
+
+def start_heartbeat(worker_id: str):
+    global _heartbeat
+    if _heartbeat is None:
+        _heartbeat = Heartbeat(worker_id, coordinator)
+        _heartbeat.start()
+
+
+def stop_heartbeat():
+    global _heartbeat
+    if _heartbeat is not None:
+        _heartbeat.stop()
+        _heartbeat = None
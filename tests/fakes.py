@@ -0,0 +1,69 @@
+"""In-memory stand-ins for the Motor collections and cursors the controllers use."""
+from types import SimpleNamespace
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = [dict(doc) for doc in documents]
+
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        for field, order in reversed(keys):
+            self.documents.sort(key=lambda doc: doc[field], reverse=order < 0)
+        return self
+
+    def skip(self, count):
+        self.documents = self.documents[count:]
+        return self
+
+    def limit(self, count):
+        if count:
+            self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self.documents[:length] if length else self.documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection:
+    """Filters are ignored: tests hand in exactly the documents a query would match."""
+
+    def __init__(self, documents=(), name="fake"):
+        self.documents = list(documents)
+        self.name = name
+        self.writes = []
+
+    def find(self, *args, **kwargs):
+        return FakeCursor(self.documents)
+
+    async def find_one(self, *args, **kwargs):
+        return dict(self.documents[0]) if self.documents else None
+
+    async def count_documents(self, *args, **kwargs):
+        return len(self.documents)
+
+    async def distinct(self, field, *args, **kwargs):
+        return list(dict.fromkeys(doc[field] for doc in self.documents if field in doc))
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes.append(operations)
+        return SimpleNamespace(modified_count=len(operations))
+
+
+class FakeArchiveStore:
+    """Returns the path as the file's data and records what was read."""
+
+    def __init__(self):
+        self.reads = []
+
+    def read(self, path):
+        self.reads.append(path)
+        return path
@@ -0,0 +1,174 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from redis.exceptions import WatchError
+from src.app.alarm_module import controller as alarm_controller
+from src.app.alarm_module.engine import AlarmEngine, decode_tags
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def engine_with(*rules) -> AlarmEngine:
+    engine = AlarmEngine()
+    engine.load_rules(rules)
+    return engine
+
+
+def states(engine: AlarmEngine, plc_id: str, values, tag: str = "temp", step: float = 1.0):
+    """Transition per sample ("raised", "cleared" or None) for a series of values `step` seconds apart."""
+    result = []
+    for i, value in enumerate(values):
+        events = engine.evaluate(plc_id, {tag: value}, T0 + timedelta(seconds=i * step))
+        result.append(events[0]["state"] if events else None)
+    return result
+
+
+def test_decode_tags():
+    assert decode_tags('{"temp": 20, "ok": true, "name": "x"}') == {"temp": 20.0}
+    assert decode_tags('{"tags": {"p": 1.5}}') == {"p": 1.5}
+    assert decode_tags("42") == {"value": 42.0}
+    assert decode_tags("garbage") == {}
+
+
+def test_threshold_hysteresis():
+    engine = engine_with({"id": "hi", "tag": "temp", "kind": "threshold", "high": 80, "deadband": 5})
+    # Raised above 80, held while inside the deadband, cleared only at or below 75
+    assert states(engine, "plc-1", [70, 81, 78, 76, 75, 79, 81]) == [
+        None, "raised", None, None, "cleared", None, "raised",
+    ]
+
+
+def test_low_threshold_with_deadband():
+    engine = engine_with({"id": "lo", "tag": "temp", "kind": "threshold", "low": 10, "deadband": 2})
+    assert states(engine, "plc-1", [9, 11, 12]) == ["raised", None, "cleared"]
+
+
+def test_rate_rule():
+    engine = engine_with({"id": "rate", "tag": "temp", "kind": "rate", "max_rate": 5, "deadband": 1})
+    assert states(engine, "plc-1", [0, 10, 14.5, 18]) == [None, "raised", None, "cleared"]
+
+
+def test_stuck_rule():
+    engine = engine_with({"id": "stuck", "tag": "temp", "kind": "stuck", "stuck_seconds": 3})
+    assert states(engine, "plc-1", [5, 5, 5, 5, 6]) == [None, None, None, "raised", "cleared"]
+
+
+def test_rules_match_device_and_wildcard():
+    engine = engine_with(
+        {"id": "all", "tag": "temp", "kind": "threshold", "high": 50},
+        {"id": "one", "plc_id": "plc-1", "tag": "temp", "kind": "threshold", "high": 40},
+    )
+    assert {e["rule_id"] for e in engine.evaluate("plc-1", {"temp": 60}, T0)} == {"all", "one"}
+    assert {e["rule_id"] for e in engine.evaluate("plc-2", {"temp": 60}, T0)} == {"all"}
+    assert engine.evaluate("plc-1", {"other": 60}, T0) == []
+
+
+def test_state_survives_moving_between_engines():
+    rule = {"id": "hi", "tag": "temp", "kind": "threshold", "high": 80, "deadband": 5}
+    first, second = engine_with(rule), engine_with(rule)
+    assert first.evaluate("plc-1", {"temp": 90}, T0)[0]["state"] == "raised"
+    second.restore_state("plc-1", first.pop_state("plc-1", ["temp"]))
+    # Still inside the deadband: no second "raised", and no "cleared"
+    assert second.evaluate("plc-1", {"temp": 78}, T0 + timedelta(seconds=1)) == []
+    assert second.evaluate("plc-1", {"temp": 70}, T0 + timedelta(seconds=2))[0]["state"] == "cleared"
+    assert first.pop_state("plc-1", ["temp"]) == {}
+
+
+class FakeRedis:
+    """Async client whose transactions fail while a watched key was written by someone else."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.published = []
+        self.versions = {}
+        # Called between a batch's reads and its EXEC, to simulate another process
+        self.interfere = None
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.watched = {}
+        self.queued = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def watch(self, *keys):
+        self.watched = {key: self.redis.versions.get(key, 0) for key in keys}
+
+    async def hmget(self, key, names):
+        stored = self.redis.hashes.get(key, {})
+        return [stored.get(name) for name in names]
+
+    def multi(self):
+        pass
+
+    def hset(self, key, mapping):
+        self.queued.append((key, mapping))
+
+    def expire(self, key, seconds):
+        pass
+
+    def publish(self, channel, message):
+        self.redis.published.append(message)
+
+    async def execute(self):
+        if self.redis.interfere:
+            interfere, self.redis.interfere = self.redis.interfere, None
+            await interfere()
+        if any(self.redis.versions.get(key, 0) != version for key, version in self.watched.items()):
+            raise WatchError()
+        for key, mapping in self.queued:
+            self.redis.hashes.setdefault(key, {}).update(mapping)
+            self.redis.versions[key] = self.redis.versions.get(key, 0) + 1
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(alarm_controller, "get_async_redis", lambda: redis)
+    rule = {"id": "hi", "tag": "temp", "kind": "threshold", "high": 80, "deadband": 5}
+    engines = [engine_with(rule), engine_with(rule)]
+    return redis, engines
+
+
+def evaluate(values, start=0):
+    samples = [("plc-1", T0 + timedelta(seconds=start + i), {"temp": value}) for i, value in enumerate(values)]
+    return [events[0]["state"] if events else None for events in asyncio.run(alarm_controller.evaluate_shared_samples(samples))]
+
+
+def test_shared_evaluation_keeps_state_across_processes(shared, monkeypatch):
+    redis, engines = shared
+    transitions = []
+    # Each batch lands in a different worker process, as with a prefork pool
+    for i, values in enumerate([[90], [85, 78], [70]]):
+        monkeypatch.setattr(alarm_controller, "engine", engines[i % 2])
+        transitions.extend(evaluate(values, start=i * 2))
+    assert transitions == ["raised", None, None, "cleared"]
+    assert len(redis.published) == 2
+    assert all(engine.snapshot_state("plc-1") == [] for engine in engines)
+
+
+def test_shared_evaluation_retries_a_batch_that_raced_another_process(shared, monkeypatch):
+    redis, engines = shared
+    monkeypatch.setattr(alarm_controller, "engine", engines[0])
+
+    async def concurrent_batch():
+        # Another worker raises the alarm while this batch is being evaluated
+        monkeypatch.setattr(alarm_controller, "engine", engines[1])
+        events = await alarm_controller.evaluate_shared_samples([("plc-1", T0, {"temp": 90})])
+        assert events[0][0]["state"] == "raised"
+        monkeypatch.setattr(alarm_controller, "engine", engines[0])
+
+    redis.interfere = concurrent_batch
+    # Re-evaluated from the other worker's state: already raised, so no second event
+    assert evaluate([95], start=1) == [None]
+    assert len(redis.published) == 1
+    assert evaluate([70], start=2) == ["cleared"]
@@ -0,0 +1,32 @@
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from src.core.archive import LocalArchiveStore, decode_documents, encode_documents
+
+DOCUMENTS = [
+    {"_id": ObjectId(), "plc_id": "plc-1", "message": '{"t": 1}', "created_at": datetime(2024, 5, 1, 12, 0)},
+    # Optional fields only some documents carry
+    {"_id": ObjectId(), "plc_id": "plc-1", "message": '{"t": 2}', "created_at": datetime(2024, 5, 1, 12, 1),
+     "message_id": "m2", "dedup_key": "plc-1|m2", "seq": 7},
+]
+
+
+def test_ndjson_round_trip():
+    assert decode_documents(encode_documents(DOCUMENTS, "ndjson.gz"), "ndjson.gz") == DOCUMENTS
+
+
+def test_parquet_keeps_fields_missing_from_the_first_row():
+    pytest.importorskip("pyarrow")
+    decoded = decode_documents(encode_documents(DOCUMENTS, "parquet"), "parquet")
+    assert [doc["_id"] for doc in decoded] == [str(doc["_id"]) for doc in DOCUMENTS]
+    assert decoded[0]["message_id"] is None
+    assert {k: decoded[1][k] for k in ("message_id", "dedup_key", "seq", "created_at")} == {
+        "message_id": "m2", "dedup_key": "plc-1|m2", "seq": 7, "created_at": datetime(2024, 5, 1, 12, 1),
+    }
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalArchiveStore(str(tmp_path))
+    store.write("plc_id=plc-1/date=2024-05-01/a.ndjson.gz", b"data")
+    assert store.read("plc_id=plc-1/date=2024-05-01/a.ndjson.gz") == b"data"
+    assert not list(tmp_path.rglob("*.tmp"))
@@ -0,0 +1,130 @@
+import asyncio
+import pytest
+from pymongo.errors import BulkWriteError
+from src.app.plc_module import pipeline
+from src.core.dedup import Deduplicator
+from src.worker.batching import TaskBatcher
+
+
+class FlakyTask:
+    name = "test.task"
+
+    def __init__(self):
+        self.up = True
+        self.sent = []
+
+    def apply_async(self, args):
+        if not self.up:
+            raise ConnectionError("broker down")
+        self.sent.append(args[0])
+
+
+def test_batches_are_sent_when_full_and_on_flush():
+    task = FlakyTask()
+    batcher = TaskBatcher(task, max_size=2)
+    for i in range(3):
+        batcher.add(i)
+    batcher.flush()
+    assert task.sent == [[0, 1], [2]]
+
+
+def test_refused_batches_are_retried_in_order():
+    task = FlakyTask()
+    batcher = TaskBatcher(task, max_size=2)
+    task.up = False
+    for i in range(4):
+        batcher.add(i)
+    assert task.sent == []
+    batcher.retry_pending()
+    assert task.sent == []
+    task.up = True
+    # New batches wait behind the refused ones
+    batcher.add(4)
+    batcher.add(5)
+    assert task.sent == []
+    batcher.retry_pending()
+    assert task.sent == [[0, 1], [2, 3], [4, 5]]
+
+
+def test_oldest_batch_is_dropped_past_the_pending_limit():
+    task = FlakyTask()
+    dropped = []
+    batcher = TaskBatcher(task, max_size=2, max_pending=4, on_dropped=dropped.append)
+    task.up = False
+    for i in range(6):
+        batcher.add(i)
+    assert dropped == [[0, 1]]
+    task.up = True
+    batcher.retry_pending()
+    assert task.sent == [[2, 3], [4, 5]]
+
+
+def test_forgotten_messages_are_accepted_again():
+    dedup = Deduplicator(max_keys=100, reset_gap=10)
+    assert not dedup.is_duplicate("plc-1", "m1")
+    assert not dedup.is_duplicate("plc-1", seq=5)
+    dedup.forget("plc-1", "m1")
+    dedup.forget("plc-1", seq=5)
+    assert not dedup.is_duplicate("plc-1", "m1")
+    assert not dedup.is_duplicate("plc-1", seq=5)
+    assert dedup.is_duplicate("plc-1", seq=5)
+
+
+class UniqueMessages:
+    """insert_many that enforces the unique dedup_key index."""
+
+    def __init__(self):
+        self.keys = set()
+        self.documents = []
+
+    async def insert_many(self, documents, ordered=True):
+        errors = []
+        for index, document in enumerate(documents):
+            key = document.get("dedup_key")
+            if key is not None and key in self.keys:
+                errors.append({"index": index, "code": 11000})
+                continue
+            if key is not None:
+                self.keys.add(key)
+            self.documents.append(document)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    stored = {"alarms": [], "rollups": []}
+
+    async def nothing():
+        pass
+
+    async def store_alarm_events(events, idempotent=False):
+        stored["alarms"].extend(events)
+        return len(events)
+
+    async def write_rollups(partials, replace=False):
+        stored["rollups"].append(dict(partials))
+        return len(partials)
+
+    monkeypatch.setattr(pipeline, "message_collection", UniqueMessages())
+    monkeypatch.setattr(pipeline, "ensure_fresh_rules", nothing)
+    monkeypatch.setattr(pipeline, "store_alarm_events", store_alarm_events)
+    monkeypatch.setattr(pipeline, "write_rollups", write_rollups)
+    return stored
+
+
+SAMPLES = [
+    {"plc_id": "plc-1", "message": '{"temp": 90}', "received_at": "2024-05-01T12:00:00", "alarms": [{"rule_id": "hot"}]},
+    {"plc_id": "plc-1", "message": '{"temp": 91}', "received_at": "2024-05-01T12:00:10", "message_id": "m2", "alarms": []},
+]
+
+
+def test_redelivered_batch_is_stored_once(ingest):
+    assert asyncio.run(pipeline.ingest_messages(SAMPLES, batch_id="task-1")) == 2
+    # Late-ack redelivery of the same task
+    assert asyncio.run(pipeline.ingest_messages(SAMPLES, batch_id="task-1")) == 0
+    assert len(pipeline.message_collection.documents) == 2
+    assert ingest["alarms"] == [{"rule_id": "hot"}]
+    assert [sum(count for count, *_ in partials.values()) for partials in ingest["rollups"]] == [2, 0]
+    # A different batch with the same content is new data
+    assert asyncio.run(pipeline.ingest_messages(SAMPLES[:1], batch_id="task-2")) == 1
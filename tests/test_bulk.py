@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from src.app.plc_module import controller
+from src.app.plc_module.schema import PlcIotHubCreateSchema, PlcUpdateSchema
+
+
+class KeyedCollection:
+    """Applies upserts keyed on a single field, like a unique index would."""
+
+    name = "devices"
+
+    def __init__(self, key_field, documents=()):
+        self.key_field = key_field
+        self.documents = {doc[key_field]: dict(doc) for doc in documents}
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def index_information(self):
+        return {}
+
+    async def bulk_write(self, operations, ordered=True):
+        upserted_ids = {}
+        for index, operation in enumerate(operations):
+            key = operation._filter[self.key_field]
+            update = operation._doc
+            if key in self.documents:
+                self.documents[key].update(update.get("$set", {}))
+            else:
+                self.documents[key] = {self.key_field: key, **update.get("$setOnInsert", {}), **update.get("$set", {})}
+                upserted_ids[index] = f"oid-{key}"
+        return SimpleNamespace(upserted_ids=upserted_ids)
+
+
+@pytest.fixture(autouse=True)
+def no_trie(monkeypatch):
+    monkeypatch.setattr(controller, "trie_insert", lambda *args: None)
+
+
+def test_items_without_a_key_are_per_item_errors():
+    devices = KeyedCollection("plc_id")
+    payload = [PlcUpdateSchema(plc_id=None), PlcUpdateSchema(plc_id="plc-1", port=502)]
+    results, message = asyncio.run(controller.bulk_upsert(devices, "plc_id", payload))
+    assert (results[0].key, results[0].status, results[0].error) == ("", "error", "plc_id is required")
+    assert (results[1].key, results[1].status, results[1].id) == ("plc-1", "inserted", "oid-plc-1")
+    assert message == "Processed 2 items, 1 failed"
+
+
+def test_bulk_update_only_overwrites_provided_fields():
+    devices = KeyedCollection("plc_id", [{"plc_id": "plc-1", "port": 502, "ip_address": "10.0.0.1"}])
+    results, _ = asyncio.run(controller.bulk_upsert(devices, "plc_id", [PlcUpdateSchema(plc_id="plc-1", port=503)]))
+    assert results[0].status == "updated"
+    assert devices.documents["plc-1"]["port"] == 503
+    assert devices.documents["plc-1"]["ip_address"] == "10.0.0.1"
+
+
+def test_bulk_add_reports_existing_devices_as_conflicts():
+    devices = KeyedCollection("device_id", [{"device_id": "dev-1", "iot_hub_primary_access": "secret"}])
+    payload = [
+        PlcIotHubCreateSchema(device_id="dev-1", iot_hub_primary_access="other"),
+        PlcIotHubCreateSchema(device_id="dev-2", iot_hub_primary_access="new"),
+    ]
+    results, message = asyncio.run(controller.bulk_upsert(devices, "device_id", payload, insert_only=True))
+    assert [result.status for result in results] == ["conflict", "inserted"]
+    assert devices.documents["dev-1"]["iot_hub_primary_access"] == "secret"
+    assert devices.documents["dev-2"]["iot_hub_primary_access"] == "new"
+    assert "partition" in devices.documents["dev-2"]
+    assert message == "Processed 2 items, 1 failed"
@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+from starlette.requests import Request
+from src.config.response import ResponseModel
+from src.core import cache as cache_module
+from src.core import profiling
+from src.core.cache import CachedResponse, MemoryCacheBackend, RedisCacheBackend, ResponseCache, cached_json_response
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    backend = MemoryCacheBackend(ttl=30, max_entries=2)
+
+    async def run():
+        await backend.set("a", CachedResponse('"a"', b"a"))
+        await backend.set("b", CachedResponse('"b"', b"b"))
+        # Reading "a" makes "b" the least recently used
+        assert (await backend.get("a")).body == b"a"
+        await backend.set("c", CachedResponse('"c"', b"c"))
+        return [await backend.get(key) is not None for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [True, False, True]
+
+
+def test_memory_backend_expires_entries(clock):
+    backend = MemoryCacheBackend(ttl=30, max_entries=10)
+
+    async def run():
+        await backend.set("a", CachedResponse('"a"', b"a"))
+        clock.now += 29
+        fresh = await backend.get("a")
+        clock.now += 2
+        return fresh, await backend.get("a")
+
+    fresh, expired = asyncio.run(run())
+    assert fresh.body == b"a"
+    assert expired is None
+    assert "a" not in backend._entries
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key) or 0) + 1
+
+    async def hgetall(self, key):
+        return {name.encode(): value for name, value in self.values.get(key, {}).items()}
+
+    def hset(self, key, mapping):
+        self.values[key] = {name: value.encode() if isinstance(value, str) else value for name, value in mapping.items()}
+
+    def expire(self, key, seconds):
+        pass
+
+    def pipeline(self, transaction=True):
+        return self
+
+    async def execute(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+
+def test_redis_backend_invalidates_by_generation():
+    redis = FakeRedis()
+    writer = RedisCacheBackend("redis://test", "response-cache:test", 30)
+    reader = RedisCacheBackend("redis://test", "response-cache:test", 30)
+    # Two API workers sharing one Redis
+    writer._redis = reader._redis = redis
+
+    async def run():
+        await writer.set("key", CachedResponse('"v1"', b"[1]"))
+        before = await reader.get("key")
+        await writer.clear()
+        after = await reader.get("key")
+        await reader.set("key", CachedResponse('"v2"', b"[2]"))
+        return before, after, await writer.get("key")
+
+    before, after, refilled = asyncio.run(run())
+    assert (before.etag, before.body) == ('"v1"', b"[1]")
+    assert after is None
+    assert refilled.body == b"[2]"
+    assert "response-cache:test:0:key" in redis.values
+
+
+def make_request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/get-all-plcs", "query_string": b"", "headers": headers})
+
+
+def test_cached_response_serves_304_and_hits_without_rebuilding(monkeypatch):
+    monkeypatch.setattr(cache_module.setting, "WEB_CONCURRENCY", 1)
+    cache = ResponseCache("test", ttl=30, max_entries=10, redis_url=None)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return ResponseModel(data=[{"plc_id": "plc-1"}], message="ok")
+
+    async def serve(request):
+        timings = {}
+        token = profiling._timings.set(timings)
+        try:
+            return await cached_json_response(request, cache, {"page": 1}, build), timings
+        finally:
+            profiling._timings.reset(token)
+
+    first, miss_timings = asyncio.run(serve(make_request()))
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert set(miss_timings) == {"cache", "serialization"}
+
+    hit, hit_timings = asyncio.run(serve(make_request()))
+    assert hit.body == first.body
+    assert set(hit_timings) == {"cache"}
+
+    not_modified, _ = asyncio.run(serve(make_request(etag)))
+    assert not_modified.status_code == 304
+    assert not_modified.body == b""
+    assert not_modified.headers["etag"] == etag
+    assert len(builds) == 1
+
+    asyncio.run(cache.invalidate())
+    rebuilt, _ = asyncio.run(serve(make_request(etag)))
+    assert len(builds) == 2
+    # Same data, same ETag: still a 304 after the rebuild
+    assert rebuilt.status_code == 304
@@ -0,0 +1,73 @@
+from src.core.dedup import Deduplicator, dedup_key, message_identity, parse_payload
+from src.core.metrics import metrics
+
+
+def test_message_identity_reads_ids_and_sequences():
+    assert message_identity(parse_payload('{"message_id": 7, "seq": 3}')) == ("7", 3)
+    assert message_identity({"msg_id": "a"}) == ("a", None)
+    assert message_identity({"seq": True}) == (None, None)
+    assert message_identity("not json") == (None, None)
+
+
+def test_device_id_field_is_not_a_message_id():
+    assert message_identity({"id": "plc-1", "temp": 20}) == (None, None)
+    dedup = Deduplicator(max_keys=100, reset_gap=10)
+    identity = message_identity({"id": "plc-1", "temp": 20})
+    assert not dedup.is_duplicate("plc-1", *identity)
+    assert not dedup.is_duplicate("plc-1", *identity)
+
+
+def test_dedup_key_only_for_message_ids():
+    assert dedup_key("plc-1", "m1") == "plc-1|m1"
+    assert dedup_key("plc-1", None) is None
+
+
+def test_repeated_message_id_is_a_duplicate_per_device():
+    dedup = Deduplicator(max_keys=100, reset_gap=10)
+    assert not dedup.is_duplicate("plc-1", "m1")
+    assert dedup.is_duplicate("plc-1", "m1")
+    assert not dedup.is_duplicate("plc-2", "m1")
+
+
+def test_repeated_sequence_is_a_duplicate():
+    dedup = Deduplicator(max_keys=100, reset_gap=10)
+    assert not dedup.is_duplicate("plc-1", seq=1)
+    assert not dedup.is_duplicate("plc-1", seq=2)
+    assert dedup.is_duplicate("plc-1", seq=1)
+
+
+def test_small_step_back_is_out_of_order_not_a_reset():
+    dedup = Deduplicator(max_keys=100, reset_gap=10)
+    before = metrics.get("ingest_out_of_order_total", source="test")
+    for seq in (1, 5, 3):
+        assert not dedup.is_duplicate("plc-1", seq=seq, source="test")
+    assert metrics.get("ingest_out_of_order_total", source="test") == before + 1
+    assert dedup.is_duplicate("plc-1", seq=5, source="test")
+
+
+def test_device_restart_starts_a_new_sequence_epoch():
+    dedup = Deduplicator(max_keys=100, reset_gap=10)
+    before = metrics.get("ingest_sequence_resets_total", source="test")
+    for seq in range(1, 51):
+        assert not dedup.is_duplicate("plc-1", seq=seq, source="test")
+    # Counter restarted: 1, 2, 3 are new messages even though they were seen before the restart
+    for seq in (1, 2, 3):
+        assert not dedup.is_duplicate("plc-1", seq=seq, source="test")
+    assert metrics.get("ingest_sequence_resets_total", source="test") == before + 1
+    assert dedup.is_duplicate("plc-1", seq=2, source="test")
+
+
+def test_remembered_keys_are_bounded():
+    dedup = Deduplicator(max_keys=3, reset_gap=10)
+    for message_id in ("a", "b", "c", "d"):
+        assert not dedup.is_duplicate("plc-1", message_id)
+    assert len(dedup._seen) == 3
+    # "a" was the least recently seen and is forgotten
+    assert not dedup.is_duplicate("plc-1", "a")
+    assert dedup.is_duplicate("plc-1", "d")
+
+
+def test_messages_without_identity_are_never_duplicates():
+    dedup = Deduplicator(max_keys=100, reset_gap=10)
+    assert not dedup.is_duplicate("plc-1")
+    assert not dedup.is_duplicate("plc-1")
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from src.app.plc_module import controller as plc_controller
+from src.app.retention_module import controller as retention
+from fakes import FakeArchiveStore, FakeCollection
+
+T0 = datetime(2024, 5, 1, 12, 0)
+FROM, TO = T0 - timedelta(days=30), T0 + timedelta(days=1)
+
+
+class FakeRequest:
+    url = "http://testserver/plc/get-all-iot-plcs_message?page=1"
+
+
+def message(minute, **extra):
+    return {"_id": ObjectId(), "plc_id": "plc-1", "message": f'{{"t": {minute}}}',
+            "created_at": T0 + timedelta(minutes=minute), **extra}
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """Three live messages and two archive files of three messages each, all older than the live ones."""
+    live = FakeCollection(sorted((message(m, message_id=f"m{m}") for m in (50, 51, 52)),
+                                 key=lambda d: d["created_at"], reverse=True))
+    files = {"a": [message(m) for m in (0, 1, 2)], "b": [message(m, seq=m) for m in (10, 11, 12)]}
+    manifests = [
+        {"path": path, "plc_id": "plc-1", "format": "ndjson.gz", "count": len(docs),
+         "from": docs[0]["created_at"], "to": docs[-1]["created_at"]}
+        for path, docs in files.items()
+    ]
+    store = FakeArchiveStore()
+    monkeypatch.setattr(retention, "archive_manifest_collection", FakeCollection(manifests))
+    monkeypatch.setattr(retention, "get_archive_store", lambda: store)
+    monkeypatch.setattr(retention, "decode_documents", lambda data, fmt: [dict(doc) for doc in files[data]])
+    return live, store
+
+
+def minutes(records):
+    return [int((record.created_at - T0).total_seconds() // 60) for record in records]
+
+
+def test_unpaginated_list_appends_archived_messages(history):
+    live, _ = history
+    records, _ = asyncio.run(plc_controller.get_message_list(
+        collection=live, from_date=FROM, to_date=TO, is_pagination=None,
+    ))
+    assert minutes(records) == [52, 51, 50, 12, 11, 10, 2, 1, 0]
+    assert {record.plc_id for record in records} == {"plc-1"}
+    assert records[0].message_id == "m52" and records[0].id
+    assert records[3].message_id == "" and records[3].message == '{"t": 12}'
+
+
+def test_unpaginated_list_is_capped(history, monkeypatch):
+    live, store = history
+    monkeypatch.setattr(plc_controller.setting, "MESSAGE_LIST_MAX_ITEMS", 5)
+    records, _ = asyncio.run(plc_controller.get_message_list(
+        collection=live, from_date=FROM, to_date=TO, is_pagination=False,
+    ))
+    assert minutes(records) == [52, 51, 50, 12, 11]
+    assert store.reads == ["b"]
+
+
+def test_paginated_list_continues_into_the_archive(history):
+    live, store = history
+    result, _ = asyncio.run(plc_controller.get_message_list(
+        collection=live, from_date=FROM, to_date=TO, is_pagination=True, page=2, limit=4, request=FakeRequest(),
+    ))
+    assert minutes(result["result"]) == [11, 10, 2, 1]
+    assert result["total_items"] == 9
+    assert result["total_pages"] == 3
+    assert result["next_page_url"].endswith("page=3&limit=4")
+    assert sorted(store.reads) == ["a", "b"]
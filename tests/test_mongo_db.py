@@ -0,0 +1,83 @@
+import pytest
+from pymongo import ReadPreference, monitoring
+from src.config import mongo_db
+from src.config.settings import setting
+from src.core.metrics import metrics
+
+ADDRESS = ("db-test", 27017)
+
+
+def test_pool_max_size_falls_back_to_the_configured_size():
+    listener = mongo_db.PoolMetricsListener()
+    listener.pool_created(monitoring.PoolCreatedEvent(ADDRESS, {}))
+    assert metrics.get("mongo_pool_max_size", address="db-test:27017") == setting.MONGO_MAX_POOL_SIZE
+    listener.pool_created(monitoring.PoolCreatedEvent(ADDRESS, {"maxPoolSize": 7}))
+    assert metrics.get("mongo_pool_max_size", address="db-test:27017") == 7
+
+
+def test_pool_gauges_follow_checkouts():
+    listener = mongo_db.PoolMetricsListener()
+    labels = {"address": "db-gauges:27017"}
+    address = ("db-gauges", 27017)
+    listener.connection_created(monitoring.ConnectionCreatedEvent(address, 1))
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(address))
+    assert metrics.get("mongo_pool_waiting", **labels) == 1
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(address, 1, 0.01))
+    assert metrics.get("mongo_pool_waiting", **labels) == 0
+    assert metrics.get("mongo_pool_checked_out", **labels) == 1
+    listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(address, 1))
+    assert metrics.get("mongo_pool_checked_out", **labels) == 0
+    assert metrics.get("mongo_pool_connections", **labels) == 1
+
+
+@pytest.fixture
+def client_factory(monkeypatch):
+    """Real Motor clients that never connect (connect=False), recreated on every reset."""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    created = []
+
+    def create_client():
+        client = AsyncIOMotorClient("mongodb://db-test:27017", connect=False)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(mongo_db, "create_client", create_client)
+    mongo_db.reset_client()
+    yield created
+    mongo_db.reset_client()
+    for client in created:
+        client.close()
+
+
+def test_lazy_collection_follows_the_current_client(client_factory):
+    collection = mongo_db.LazyCollection("plc_device")
+    first = collection.resolve()
+    assert collection.resolve() is first
+    assert first.database.client is client_factory[0]
+    assert (first.database.name, first.name) == (setting.DATABASE_NAME, "plc_device")
+    # After a fork the inherited client is dropped and the next use builds a new one
+    mongo_db.reset_client()
+    second = collection.resolve()
+    assert second is not first
+    assert second.database.client is client_factory[1]
+    assert collection.name == "plc_device"
+
+
+def test_per_collection_write_concern_and_read_preference(client_factory):
+    telemetry = mongo_db.LazyCollection("plc_message", write_concern="0", read_preference="secondaryPreferred")
+    registry = mongo_db.LazyCollection("plc_device", write_concern="majority:j")
+    plain = mongo_db.LazyCollection("plc_alarm")
+    assert telemetry.write_concern.document == {"w": 0}
+    assert telemetry.read_preference.mode == ReadPreference.SECONDARY_PREFERRED.mode
+    assert registry.write_concern.document == {"w": "majority", "j": True}
+    assert registry.read_preference == ReadPreference.PRIMARY
+    # Unset options inherit the client's
+    assert plain.write_concern == client_factory[0].write_concern
+    # Telemetry is configured from settings
+    assert mongo_db.message_collection.options == {
+        "write_concern": mongo_db.parse_write_concern(setting.MONGO_TELEMETRY_WRITE_CONCERN),
+        "read_preference": mongo_db.parse_read_preference(setting.MONGO_HISTORY_READ_PREFERENCE),
+    }
+    assert mongo_db.parse_write_concern("1").document == {"w": 1}
+    assert mongo_db.parse_write_concern(None) is None
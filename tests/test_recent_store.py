@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+from src.core.recent_store import POINT_BYTES, RecentStore, TagRing, from_epoch, to_epoch
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def filled(capacity: int, count: int) -> TagRing:
+    ring = TagRing(capacity, 0.0)
+    for i in range(count):
+        ring.append(float(i), float(i) * 10)
+    return ring
+
+
+def test_epoch_round_trip():
+    assert from_epoch(to_epoch(T0)) == T0
+
+
+def test_range_before_wrap():
+    times, values = filled(8, 5).range(1, 3)
+    assert list(times) == [1, 2, 3]
+    assert list(values) == [10, 20, 30]
+
+
+def test_range_across_the_wrap_point():
+    ring = filled(5, 8)  # holds 3..7, physically [5, 6, 7, 3, 4]
+    assert ring.start == 3
+    times, values = ring.range(3, 7)
+    assert list(times) == [3, 4, 5, 6, 7]
+    assert list(values) == [30, 40, 50, 60, 70]
+    assert list(ring.range(4, 5)[0]) == [4, 5]
+    assert list(ring.range(6, 100)[0]) == [6, 7]
+
+
+def test_range_ending_at_the_physical_end():
+    ring = filled(5, 7)  # physically [5, 6, 2, 3, 4]
+    assert list(ring.range(2, 4)[0]) == [2, 3, 4]
+
+
+def test_empty_range():
+    ring = filled(5, 3)
+    assert list(ring.range(10, 20)[0]) == []
+    assert list(ring.range(1.5, 1.7)[0]) == []
+
+
+def test_overwriting_advances_coverage():
+    ring = filled(4, 6)
+    assert ring.covered_from == 2.0
+
+
+def test_late_sample_is_dropped_and_narrows_coverage():
+    ring = filled(8, 5)
+    ring.append(2.5, 99)
+    assert list(ring.range(0, 10)[0]) == [0, 1, 2, 3, 4]
+    assert ring.covered_from > 2.5
+
+
+def test_query_serves_covered_windows_only():
+    store = RecentStore(points_per_tag=4, max_bytes=1 << 20)
+    for i in range(6):
+        store.record("plc-1", {"a": i, "b": -i}, T0 + timedelta(seconds=i))
+    # Oldest two samples were overwritten
+    assert store.query("plc-1", T0 + timedelta(seconds=1)) is None
+    columns = store.query("plc-1", T0 + timedelta(seconds=2))
+    assert sorted(columns) == ["a", "b"]
+    assert list(columns["a"][1]) == [2, 3, 4, 5]
+    assert list(store.query("plc-1", T0 + timedelta(seconds=4), tag="b")["b"][1]) == [-4, -5]
+    assert store.query("plc-2", T0) is None
+    assert store.query("plc-1", T0 + timedelta(seconds=4), tag="missing") is None
+
+
+def test_eviction_drops_whole_coldest_device():
+    ring_bytes = 4 * POINT_BYTES
+    store = RecentStore(points_per_tag=4, max_bytes=4 * ring_bytes)
+    store.record("cold", {"a": 1, "b": 2}, T0)
+    store.record("warm", {"a": 1}, T0)
+    store.record("cold", {"a": 3}, T0 + timedelta(seconds=1))  # "cold"/a is now warmer than "warm"/a
+    store.record("new", {"a": 1, "b": 2}, T0)
+    # "cold"/b was the least recently used ring, so all of "cold" went, not just that tag
+    assert store.query("cold", T0) is None
+    assert store.query("warm", T0) is not None
+    assert store.query("new", T0) is not None
+
+
+def test_eviction_never_drops_the_device_being_written():
+    ring_bytes = 4 * POINT_BYTES
+    store = RecentStore(points_per_tag=4, max_bytes=2 * ring_bytes)
+    store.record("big", {f"t{i}": i for i in range(4)}, T0)
+    assert sorted(store.query("big", T0)) == ["t0", "t1", "t2", "t3"]
@@ -0,0 +1,147 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from src.app.replay_module import controller as replay
+from src.app.replay_module.controller import _flush_closed, replay_window
+
+T0 = datetime(2024, 5, 1, 12, 0, 0)
+# One sample every 10 s over four minutes, a sawtooth of 0..11: batches of five end mid-bucket
+MESSAGES = [
+    {"_id": i, "plc_id": "plc-1", "created_at": T0 + timedelta(seconds=10 * i), "message": f'{{"temp": {i % 12}}}'}
+    for i in range(24)
+]
+RULES = [
+    {"id": "hot", "tag": "temp", "kind": "threshold", "high": 4, "deadband": 3},
+    {"id": "drop", "tag": "temp", "kind": "rate", "max_rate": 0.5},
+]
+
+
+def test_replay_window_widens_to_whole_buckets():
+    assert replay_window(T0 + timedelta(seconds=5), T0 + timedelta(seconds=65)) == (T0, T0 + timedelta(minutes=2))
+    assert replay_window(T0, T0 + timedelta(minutes=1)) == (T0, T0 + timedelta(minutes=1))
+
+
+def test_replay_window_stops_before_unsettled_buckets(monkeypatch):
+    monkeypatch.setattr(replay.setting, "REPLAY_SETTLE_SECONDS", 300)
+    now = T0 + timedelta(minutes=10, seconds=30)
+    assert replay_window(T0, T0 + timedelta(hours=1), now=now) == (T0, T0 + timedelta(minutes=5))
+
+
+def test_flush_closed_keeps_open_buckets():
+    partials = {("p", "t", T0): 1, ("p", "t", T0 + timedelta(minutes=1)): 2}
+    assert _flush_closed(partials, T0 + timedelta(minutes=1)) == {("p", "t", T0): 1}
+    assert list(partials) == [("p", "t", T0 + timedelta(minutes=1))]
+
+
+class Checkpoints:
+    def __init__(self):
+        self.documents = {}
+
+    async def find_one(self, query):
+        return self.documents.get(query["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents.setdefault(query["_id"], {}).update(update["$set"])
+
+
+class FakeBackend:
+    """Rollup buckets as $set leaves them, plus a crash after `crash_after` batches."""
+
+    def __init__(self, crash_after=None):
+        self.rollups = {}
+        self.alarms = {}
+        self.batches = 0
+        self.crash_after = crash_after
+
+    async def store_alarm_events(self, events, idempotent=False):
+        assert idempotent
+        self.batches += 1
+        if self.crash_after is not None and self.batches > self.crash_after:
+            raise RuntimeError("worker lost")
+        # Upserted on the natural key, like the real store
+        for event in events:
+            self.alarms.setdefault((event["rule_id"], event["tag"], event["created_at"], event["state"]), event)
+        return len(events)
+
+    async def write_rollups(self, partials, replace=False):
+        assert replace
+        self.rollups.update({key: list(value) for key, value in partials.items()})
+        return len(partials)
+
+
+async def iter_batches(source, plc_id, start, end, batch_size):
+    documents = [doc for doc in MESSAGES if start <= doc["created_at"] < end]
+    for i in range(0, len(documents), batch_size):
+        yield documents[i:i + batch_size]
+
+
+@pytest.fixture
+def checkpoints(monkeypatch):
+    checkpoints = Checkpoints()
+    monkeypatch.setattr(replay, "replay_checkpoint_collection", checkpoints)
+    monkeypatch.setattr(replay, "iter_batches", iter_batches)
+
+    async def rules():
+        return RULES
+
+    monkeypatch.setattr(replay, "load_rule_documents", rules)
+    return checkpoints
+
+
+def run(monkeypatch, backend, job_id):
+    monkeypatch.setattr(replay, "store_alarm_events", backend.store_alarm_events)
+    monkeypatch.setattr(replay, "write_rollups", backend.write_rollups)
+    return asyncio.run(replay.replay_partition(job_id, "plc-1", T0, T0 + timedelta(minutes=4), batch_size=5))
+
+
+def alarm_log(backend):
+    return sorted((at, rule, state) for rule, _, at, state in backend.alarms)
+
+
+def test_resumed_replay_matches_an_uninterrupted_one(checkpoints, monkeypatch):
+    clean = FakeBackend()
+    result = run(monkeypatch, clean, "clean")
+    assert result.processed == len(MESSAGES)
+    assert sum(count for count, *_ in clean.rollups.values()) == len(MESSAGES)
+
+    crashed = FakeBackend(crash_after=2)
+    with pytest.raises(RuntimeError):
+        run(monkeypatch, crashed, "job")
+    checkpoint = checkpoints.documents["job:plc-1"]
+    assert not checkpoint["done"]
+    # Only whole buckets are checkpointed: the resume point is a bucket start, not the last message
+    assert checkpoint["resume_at"] == T0 + timedelta(minutes=1)
+    assert checkpoint["processed"] == 6
+    # ... with the alarm raised in the bucket before still active, so resuming doesn't raise it again
+    assert dict(checkpoint["alarm_state"])["temp"][3] == ["hot"]
+
+    crashed.crash_after = None
+    resumed = run(monkeypatch, crashed, "job")
+    assert resumed.resumed
+    assert resumed.processed == len(MESSAGES)
+    assert crashed.rollups == clean.rollups
+    assert alarm_log(crashed) == alarm_log(clean)
+    assert checkpoints.documents["job:plc-1"]["done"]
+
+
+def test_clean_run_raises_and_clears_each_alarm_once(checkpoints, monkeypatch):
+    backend = FakeBackend()
+    run(monkeypatch, backend, "job")
+    at = lambda i: T0 + timedelta(seconds=10 * i)
+    assert alarm_log(backend) == [
+        (at(5), "hot", "raised"),
+        (at(12), "drop", "raised"),
+        (at(12), "hot", "cleared"),
+        (at(13), "drop", "cleared"),
+        (at(17), "hot", "raised"),
+    ]
+
+
+def test_finished_partition_is_not_replayed_again(checkpoints, monkeypatch):
+    backend = FakeBackend()
+    run(monkeypatch, backend, "job")
+    batches = backend.batches
+    again = run(monkeypatch, backend, "job")
+    assert again.resumed
+    assert again.processed == len(MESSAGES)
+    assert backend.batches == batches
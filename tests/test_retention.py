@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime, timedelta
+from src.app.retention_module import controller as retention
+from src.app.retention_module.controller import policy_filter
+from fakes import FakeArchiveStore, FakeCollection
+
+CUTOFF = datetime(2024, 5, 1)
+T0 = datetime(2024, 1, 1)
+
+
+def test_device_policy_governs_only_its_device():
+    device = {"plc_id": "plc-1", "retain_days": 7}
+    default = {"plc_id": None, "retain_days": 30}
+    assert policy_filter(device, [device, default], CUTOFF) == {"created_at": {"$lt": CUTOFF}, "plc_id": "plc-1"}
+
+
+def test_default_policy_excludes_devices_with_their_own():
+    first = {"plc_id": "plc-1", "retain_days": 7}
+    second = {"plc_id": "plc-2", "retain_days": 90}
+    default = {"plc_id": None, "retain_days": 30}
+    assert policy_filter(default, [first, second, default], CUTOFF) == {
+        "created_at": {"$lt": CUTOFF},
+        "$nor": [{"plc_id": "plc-1"}, {"plc_id": "plc-2"}],
+    }
+
+
+def test_default_alone_has_no_exclusions():
+    default = {"plc_id": None, "retain_days": 30}
+    assert policy_filter(default, [default], CUTOFF) == {"created_at": {"$lt": CUTOFF}}
+
+
+def test_resolve_policies_adds_settings_default_last(monkeypatch):
+    monkeypatch.setattr(retention, "retention_policy_collection", FakeCollection([
+        {"plc_id": "plc-2", "retain_days": 7},
+    ]))
+    monkeypatch.setattr(retention.setting, "RETENTION_DEFAULT_DAYS", 30)
+    policies = asyncio.run(retention.resolve_policies())
+    assert [p["plc_id"] for p in policies] == ["plc-2", None]
+    assert policies[1]["retain_days"] == 30
+
+
+def test_stored_default_replaces_settings_default(monkeypatch):
+    monkeypatch.setattr(retention, "retention_policy_collection", FakeCollection([
+        {"plc_id": None, "retain_days": 60},
+        {"plc_id": "plc-2", "retain_days": 7},
+    ]))
+    monkeypatch.setattr(retention.setting, "RETENTION_DEFAULT_DAYS", 30)
+    policies = asyncio.run(retention.resolve_policies())
+    assert [(p["plc_id"], p["retain_days"]) for p in policies] == [("plc-2", 7), (None, 60)]
+
+
+def archive(monkeypatch, files):
+    """Manifests (and their documents) for archive files given as (path, [minutes after T0, ...])."""
+    manifests, contents = [], {}
+    for path, minutes in files:
+        documents = [{"_id": f"{path}-{m}", "plc_id": "plc-1", "created_at": T0 + timedelta(minutes=m)} for m in minutes]
+        contents[path] = documents
+        manifests.append({
+            "path": path, "plc_id": "plc-1", "format": "jsonl", "count": len(documents),
+            "from": documents[0]["created_at"], "to": documents[-1]["created_at"],
+        })
+    store = FakeArchiveStore()
+    monkeypatch.setattr(retention, "archive_manifest_collection", FakeCollection(manifests))
+    monkeypatch.setattr(retention, "get_archive_store", lambda: store)
+    monkeypatch.setattr(retention, "decode_documents", lambda data, fmt: list(contents[data]))
+    return store
+
+
+def minutes(documents):
+    return [int((doc["created_at"] - T0).total_seconds() // 60) for doc in documents]
+
+
+def test_archived_page_reads_only_the_files_it_needs(monkeypatch):
+    store = archive(monkeypatch, [("a", [0, 1, 2]), ("b", [10, 11, 12]), ("c", [20, 21, 22])])
+    page, total = asyncio.run(retention.load_archived_page(T0, T0 + timedelta(days=1), skip=2, limit=2))
+    assert total == 9
+    # Newest first: c = 22, 21, 20; b = 12, 11, 10; ...
+    assert minutes(page) == [20, 12]
+    assert sorted(store.reads) == ["b", "c"]
+
+
+def test_archived_page_counts_edge_files_exactly(monkeypatch):
+    store = archive(monkeypatch, [("a", [0, 1, 2]), ("b", [10, 11, 12]), ("c", [20, 21, 22])])
+    # [1, 21] cuts into a and c, so those are read for their counts; b is skipped on its manifest count
+    page, total = asyncio.run(retention.load_archived_page(
+        T0 + timedelta(minutes=1), T0 + timedelta(minutes=21), skip=0, limit=2,
+    ))
+    assert total == 7
+    assert minutes(page) == [21, 20]
+    assert sorted(store.reads) == ["a", "c"]
+
+
+def test_archived_page_past_the_end_is_empty(monkeypatch):
+    archive(monkeypatch, [("a", [0, 1, 2])])
+    page, total = asyncio.run(retention.load_archived_page(T0, T0 + timedelta(days=1), skip=5, limit=5))
+    assert (page, total) == ([], 3)
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from fakes import FakeCollection
+from src.core import search
+
+
+@pytest.fixture(autouse=True)
+def fresh_tries(monkeypatch):
+    monkeypatch.setattr(search, "_tries", {})
+
+
+def build(*args, **kwargs):
+    return asyncio.run(search.build_search_query(*args, **kwargs))
+
+
+def test_prefix_query_is_an_index_range_on_the_normalized_field():
+    assert build("plc_id", " PLC-1 ") == {"plc_id_lower": {"$gte": "plc-1", "$lt": "plc-2"}}
+    assert build("plc_id", "") == {}
+    assert build("plc_id", "   ") == {}
+
+
+def test_ngram_query_requires_every_ngram_and_verifies_the_substring():
+    assert build("plc_id", "C-1", mode="ngram") == {
+        "plc_id_ngrams": {"$all": ["c-1"]},
+        "plc_id_lower": {"$regex": "c\\-1"},
+    }
+    # Too short for an n-gram: prefix instead
+    assert build("plc_id", "pl", mode="ngram") == search.prefix_query("plc_id", "pl")
+
+
+def test_ngram_mode_is_prefix_where_substring_search_is_not_offered():
+    assert build("plc_id", "lc-1", mode="ngram", substring=False) == search.prefix_query("plc_id", "lc-1")
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        build("plc_id", "plc", mode="regex")
+
+
+def test_trie_mode_resolves_matching_ids():
+    devices = FakeCollection([{"plc_id": "PLC-1"}, {"plc_id": "plc-10"}, {"plc_id": "other"}])
+    assert build("plc_id", "plc-1", mode="trie", trie_source=devices) == {"plc_id": {"$in": ["PLC-1", "plc-10"]}}
+
+
+def test_trie_mode_falls_back_to_prefix_when_too_many_ids_match(monkeypatch):
+    monkeypatch.setattr(search, "TRIE_MAX_IDS", 2)
+    devices = FakeCollection([{"plc_id": f"plc-{i}"} for i in range(3)])
+    assert build("plc_id", "plc", mode="trie", trie_source=devices) == search.prefix_query("plc_id", "plc")
+    assert build("plc_id", "plc-1", mode="trie", trie_source=devices) == {"plc_id": {"$in": ["plc-1"]}}
+
+
+def test_trie_is_reloaded_after_its_ttl(monkeypatch):
+    devices = FakeCollection([{"plc_id": "plc-1"}])
+    assert asyncio.run(search.get_trie(devices, "plc_id")).starts_with("plc") == ["plc-1"]
+    # Registered through another process
+    devices.documents.append({"plc_id": "plc-2"})
+    assert asyncio.run(search.get_trie(devices, "plc_id")).starts_with("plc") == ["plc-1"]
+    monkeypatch.setattr(search, "TRIE_TTL", -1)
+    assert asyncio.run(search.get_trie(devices, "plc_id")).starts_with("plc") == ["plc-1", "plc-2"]
+
+
+def test_starts_with_stops_at_the_limit():
+    trie = search.DeviceIdTrie()
+    for i in range(5):
+        trie.insert(f"plc-{i}")
+    assert len(trie.starts_with("plc", 3)) == 3
+    assert trie.starts_with("plc", 10) == [f"plc-{i}" for i in range(5)]
+    trie.remove("plc-0")
+    assert trie.starts_with("PLC-0") == []
+
+
+def test_backfill_is_bounded_per_run():
+    messages = FakeCollection([{"_id": i, "plc_id": f"PLC-{i}"} for i in range(5)])
+    updated = asyncio.run(search.backfill_search_fields(messages, "plc_id", ngram=False, limit=3, batch_size=2))
+    assert updated == 3
+    assert [len(batch) for batch in messages.writes] == [2, 1]
+    assert messages.writes[0][0]._doc == {"$set": {"plc_id_lower": "plc-0"}}
@@ -0,0 +1,69 @@
+import threading
+from collections import Counter
+from src.worker.sharding import Heartbeat, HashRing, partition_for
+from src.config.settings import setting
+
+KEYS = [str(p) for p in range(2000)]
+
+
+def owners(ring: HashRing):
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([]).owner("1") is None
+
+
+def test_ownership_is_deterministic_and_order_independent():
+    assert owners(HashRing(["a", "b", "c"])) == owners(HashRing(["c", "a", "b", "a"]))
+
+
+def test_keys_are_spread_over_members():
+    counts = Counter(owners(HashRing(["a", "b", "c", "d"])).values())
+    assert set(counts) == {"a", "b", "c", "d"}
+    assert min(counts.values()) > len(KEYS) / 4 * 0.5
+
+
+def test_adding_a_member_only_moves_keys_to_it():
+    before = owners(HashRing(["a", "b", "c"]))
+    after = owners(HashRing(["a", "b", "c", "d"]))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == "d" for key in moved)
+    assert len(moved) < len(KEYS) / 2
+
+
+def test_removing_a_member_only_moves_its_keys():
+    before = owners(HashRing(["a", "b", "c"]))
+    after = owners(HashRing(["a", "c"]))
+    assert all(before[key] == "b" for key in KEYS if before[key] != after[key])
+
+
+def test_partition_is_stable_and_in_range():
+    assert partition_for("plc-1") == partition_for("plc-1")
+    assert all(0 <= partition_for(f"plc-{i}") < setting.SHARD_PARTITIONS for i in range(100))
+
+
+class RecordingCoordinator:
+    ttl = 0.03
+
+    def __init__(self):
+        self.beats = 0
+        self.third = threading.Event()
+
+    def heartbeat(self, worker_id):
+        self.beats += 1
+        if self.beats == 1:
+            raise ConnectionError("redis down")
+        if self.beats == 3:
+            self.third.set()
+
+
+def test_heartbeat_thread_keeps_beating_through_errors_until_stopped():
+    shards = RecordingCoordinator()
+    heartbeat = Heartbeat("node-1", shards)
+    heartbeat.start()
+    assert shards.third.wait(5)
+    heartbeat.stop()
+    beats = shards.beats
+    assert not heartbeat._thread.is_alive()
+    assert shards.beats == beats
@@ -0,0 +1,100 @@
+import uuid
+from datetime import datetime
+from multiprocessing import resource_tracker
+import pytest
+from src.core import shared_state
+from src.core.shared_state import SEQ, HotStateTable
+
+
+@pytest.fixture
+def table():
+    table = HotStateTable.create(f"test_hot_{uuid.uuid4().hex[:12]}", slots=8, key_size=16, value_size=32)
+    yield table
+    if table.buf is not None:
+        table.retire()
+
+
+def test_put_then_get_round_trips_value_and_time(table):
+    at = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    table.put("plc-1", '{"t": 1}', at)
+    assert table.get("plc-1") == ('{"t": 1}', at)
+    assert table.get("plc-2") is None
+
+
+def test_put_overwrites_and_truncates(table):
+    table.put("plc-1", "first")
+    table.put("plc-1", "x" * 100)
+    value, _ = table.get("plc-1")
+    assert value == "x" * 32
+    assert [key for key, _, _ in table.items()] == ["plc-1"]
+
+
+def test_colliding_keys_probe_to_separate_slots(table):
+    for i in range(8):
+        table.put(f"plc-{i}", str(i))
+    assert {key: value for key, value, _ in table.items()} == {f"plc-{i}": str(i) for i in range(8)}
+    # Full: a ninth device is dropped, the others are untouched
+    table.put("plc-8", "8")
+    assert table.get("plc-8") is None
+    assert table.get("plc-3")[0] == "3"
+
+
+def test_attaching_leaves_the_resource_tracker_alone(table, monkeypatch):
+    calls = []
+    monkeypatch.setattr(resource_tracker, "register", lambda name, rtype: calls.append(("register", rtype)))
+    monkeypatch.setattr(resource_tracker, "unregister", lambda name, rtype: calls.append(("unregister", rtype)))
+    register = resource_tracker.register
+    reader = HotStateTable.attach(table.shm.name)
+    reader.close()
+    # Neither registered (the tracker would unlink the owner's table) nor unregistered
+    # (a tracker shared with the owner would lose the owner's registration)
+    assert calls == []
+    assert resource_tracker.register is register
+
+
+def test_reader_sees_writes_and_cannot_write(table):
+    reader = HotStateTable.attach(table.shm.name)
+    try:
+        table.put("plc-1", "v1")
+        assert reader.get("plc-1")[0] == "v1"
+        with pytest.raises(PermissionError):
+            reader.put("plc-1", "v2")
+    finally:
+        reader.close()
+
+
+def test_slot_left_mid_write_is_unavailable(table, monkeypatch):
+    monkeypatch.setattr(shared_state, "READ_RETRIES", 5)
+    table.put("plc-1", "v1")
+    table.put("plc-2", "v2")
+    # A writer that died between the two sequence bumps leaves the sequence odd
+    offset = table._offset(table._index["plc-1"])
+    SEQ.pack_into(table.buf, offset, SEQ.unpack_from(table.buf, offset)[0] + 1)
+    assert table.get("plc-1") is None
+    assert [key for key, _, _ in table.items()] == ["plc-2"]
+
+
+def test_recreating_a_stale_segment_retires_it_for_readers(table):
+    name = table.shm.name
+    reader = HotStateTable.attach(name)
+    try:
+        assert reader.live
+        # The owner crashed without retiring its table; the next one takes the name over
+        replacement = HotStateTable.create(name, slots=8, key_size=16, value_size=32)
+        try:
+            assert not reader.live
+            assert replacement.live
+        finally:
+            replacement.retire()
+    finally:
+        reader.close()
+    table.close()
+
+
+def test_retire_marks_segment_dead(table):
+    reader = HotStateTable.attach(table.shm.name)
+    try:
+        table.retire()
+        assert not reader.live
+    finally:
+        reader.close()
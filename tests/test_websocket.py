@@ -0,0 +1,41 @@
+import asyncio
+from src.app.websocket import web_app
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("connection reset")
+        self.received.append(payload)
+
+
+def test_broadcast_is_concurrent_and_drops_broken_clients(monkeypatch):
+    monkeypatch.setattr(web_app, "SEND_TIMEOUT", 0.2)
+    manager = web_app.ConnectionManager()
+    fast, other, broken, stuck = FakeSocket(0.05), FakeSocket(), FakeSocket(fail=True), FakeSocket(delay=10)
+
+    async def run():
+        await manager.connect(fast)
+        await manager.connect(other, "plc-2")
+        await manager.connect(broken, "plc-1")
+        await manager.connect(stuck)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await manager.broadcast("alarm", "plc-1")
+        return loop.time() - started
+
+    elapsed = asyncio.run(run())
+    # Bounded by the send timeout, not by the stuck client or the sum of the sends
+    assert elapsed < 1
+    assert fast.received == ["alarm"]
+    assert other.received == []
+    assert set(manager.connections) == {fast, other}